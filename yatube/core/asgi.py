@@ -0,0 +1,199 @@
+"""ASGI-приложение поверх WSGI-приложения Django.
+
+Django 2.2 не умеет ASGI, поэтому переходник собирает запрос в environ
+WSGI и выполняет обычный обработчик в пуле потоков. Цикл событий
+сервера (uvicorn, daphne, hypercorn) при этом свободен: медленные
+клиенты и долгие потоковые ответы не занимают поток, пока им нечего
+отдать, а число одновременно выполняемых view ограничено размером пула.
+
+Тело запроса читается целиком до вызова view (большое — во временный
+файл). Ответ отдаётся частями по мере того, как его выдаёт WSGI, с
+ожиданием отправки каждой части: поток не убегает вперёд клиента.
+
+Ответ с атрибутом async_content (функция, возвращающая async-итератор
+частей) после view отдаётся из цикла событий и поток не занимает —
+так устроены живые ленты (posts.live). Отключение клиента прерывает
+такой ответ.
+"""
+import asyncio
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+# Тело запроса больше этого размера уходит из памяти во временный файл.
+BODY_MEMORY_SIZE = 1024 * 1024
+
+
+class WsgiToAsgi:
+    def __init__(self, wsgi_application, max_workers=None):
+        self.wsgi_application = wsgi_application
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix='asgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise ValueError(f'Неподдерживаемый тип ASGI: {scope["type"]}')
+        body = await self.read_body(receive)
+        if body is None:
+            return
+        loop = asyncio.get_running_loop()
+        try:
+            streaming = await loop.run_in_executor(
+                self.executor, self.run, self.environ(scope, body),
+                loop, send,
+            )
+        finally:
+            body.close()
+        if streaming is not None:
+            await self.stream(*streaming, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    @staticmethod
+    async def read_body(receive):
+        """Тело запроса файлом; None, если клиент ушёл раньше."""
+        body = tempfile.SpooledTemporaryFile(max_size=BODY_MEMORY_SIZE)
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return None
+            body.write(message.get('body', b''))
+            if not message.get('more_body', False):
+                break
+        body.seek(0)
+        return body
+
+    @staticmethod
+    def environ(scope, body):
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', ''),
+            # WSGI передаёт путь байтами, прочитанными как latin-1.
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': str(server[0]),
+            'SERVER_PORT': str(server[1] or 80),
+            'REMOTE_ADDR': client[0],
+            'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        for name, value in scope.get('headers', []):
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                name = f'HTTP_{name}'
+            if name in environ:
+                # HTTP/2 присылает каждую cookie отдельным заголовком, а
+                # в одной строке они разделяются '; ', не запятой.
+                separator = '; ' if name == 'HTTP_COOKIE' else ','
+                value = f'{environ[name]}{separator}{value}'
+            environ[name] = value
+        return environ
+
+    async def stream(self, status, headers, result, receive, send):
+        """Отдаёт async_content ответа, пока клиент не отключится."""
+        async def pump():
+            await send({'type': 'http.response.start', 'status': status,
+                        'headers': headers})
+            async for chunk in result.async_content():
+                await send({'type': 'http.response.body', 'body': chunk,
+                            'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+
+        async def disconnected():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+
+        tasks = [asyncio.ensure_future(pump()),
+                 asyncio.ensure_future(disconnected())]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await asyncio.get_running_loop().run_in_executor(
+                self.executor, result.close)
+        if tasks[0].done() and not tasks[0].cancelled():
+            tasks[0].result()
+
+    def run(self, environ, loop, send):
+        """Выполняет WSGI-приложение в потоке пула.
+
+        Для ответа с async_content возвращает (статус, заголовки,
+        ответ), и дальше его отдаёт `stream`; иначе ответ отправлен и
+        результат — None.
+        """
+        response = _Response(loop, send)
+        result = self.wsgi_application(environ, response.start_response)
+        if getattr(result, 'async_content', None) is not None:
+            return response.status, response.headers, result
+        try:
+            for chunk in result:
+                response.write(chunk)
+            response.finish()
+        finally:
+            close = getattr(result, 'close', None)
+            if close is not None:
+                close()
+
+
+class _Response:
+    """Ответ WSGI, отправляемый в ASGI из потока пула."""
+
+    def __init__(self, loop, send):
+        self.loop = loop
+        self.send = send
+        self.status = None
+        self.headers = None
+        self.started = False
+
+    def send_sync(self, message):
+        asyncio.run_coroutine_threadsafe(
+            self.send(message), self.loop).result()
+
+    def start_response(self, status, headers, exc_info=None):
+        if exc_info and self.started:
+            raise exc_info[1].with_traceback(exc_info[2])
+        self.status = int(status.split(' ', 1)[0])
+        self.headers = [
+            (name.lower().encode('latin-1'), value.encode('latin-1'))
+            for name, value in headers
+        ]
+        return self.write
+
+    def start(self):
+        if not self.started:
+            self.started = True
+            self.send_sync({'type': 'http.response.start',
+                            'status': self.status, 'headers': self.headers})
+
+    def write(self, chunk):
+        if chunk:
+            self.start()
+            self.send_sync({'type': 'http.response.body', 'body': chunk,
+                            'more_body': True})
+
+    def finish(self):
+        self.start()
+        self.send_sync({'type': 'http.response.body', 'body': b''})
@@ -0,0 +1,384 @@
+"""Бэкенды кеша, общие для всех процессов сервера.
+
+`SQLiteCache` — общий уровень в файле SQLite: его видят все воркеры
+на машине, поэтому попадания не делятся между процессами, а сброс
+поколения в одном процессе сразу виден остальным. В продакшене на его
+место ставится memcached или Redis — достаточно поменять алиас.
+
+`TwoLevelCache` — небольшой LRU в памяти процесса перед общим уровнем.
+Локально хранятся только ключи с заданными префиксами: ключи страниц и
+фрагментов содержат поколения и дату изменения, поэтому значение под
+таким ключом никогда не меняется. Изменяемые ключи (сами поколения,
+блокировки) всегда читаются из общего уровня, так что локальная копия
+не может устареть.
+"""
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+# SQLite ограничивает число параметров одного запроса.
+MAX_PARAMS = 900
+# UPDATE ... RETURNING появился в SQLite 3.35, а Django 2.2 работает и
+# с более старыми версиями.
+SUPPORTS_RETURNING = sqlite3.sqlite_version_info >= (3, 35)
+
+
+def _dumps(value):
+    # Целые числа храним как есть, чтобы incr был одним UPDATE.
+    if type(value) is int:
+        return value
+    return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+
+def _loads(value):
+    if isinstance(value, int):
+        return value
+    return pickle.loads(value)
+
+
+class SQLiteCache(BaseCache):
+    """Кеш в файле SQLite, LOCATION — путь к файлу."""
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        self._local = threading.local()
+
+    @property
+    def _db(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(
+                self._path, timeout=30, isolation_level=None,
+                check_same_thread=False,
+            )
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value BLOB, expires REAL)'
+            )
+            self._local.db = db
+        return db
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    @staticmethod
+    def _alive(expires):
+        return expires is None or expires > time.time()
+
+    def get(self, key, default=None, version=None):
+        row = self._db.execute(
+            'SELECT value, expires FROM cache WHERE key = ?',
+            (self._key(key, version),),
+        ).fetchone()
+        if row is None or not self._alive(row[1]):
+            return default
+        return _loads(row[0])
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        by_key = {self._key(key, version): key for key in keys}
+        made = list(by_key)
+        found = {}
+        for start in range(0, len(made), MAX_PARAMS):
+            chunk = made[start:start + MAX_PARAMS]
+            rows = self._db.execute(
+                'SELECT key, value, expires FROM cache WHERE key IN (%s)'
+                % ', '.join('?' * len(chunk)),
+                chunk,
+            )
+            for made_key, value, expires in rows:
+                if self._alive(expires):
+                    found[by_key[made_key]] = _loads(value)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._db.execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires) '
+            'VALUES (?, ?, ?)',
+            (self._key(key, version), _dumps(value),
+             self.get_backend_timeout(timeout)),
+        )
+        self._cull()
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        self._db.executemany(
+            'INSERT OR REPLACE INTO cache (key, value, expires) '
+            'VALUES (?, ?, ?)',
+            [(self._key(key, version), _dumps(value), expires)
+             for key, value in data.items()],
+        )
+        self._cull()
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.execute(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                (key, time.time()),
+            )
+            added = db.execute(
+                'INSERT OR IGNORE INTO cache (key, value, expires) '
+                'VALUES (?, ?, ?)',
+                (key, _dumps(value), self.get_backend_timeout(timeout)),
+            ).rowcount == 1
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+        return added
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            row = self._incr(db, key, delta)
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+        if row is None:
+            raise ValueError("Key '%s' not found" % key)
+        return row[0]
+
+    @staticmethod
+    def _incr(db, key, delta):
+        """(новое значение,) или None; вызывается в открытой транзакции."""
+        update = (
+            'UPDATE cache SET value = value + ? '
+            'WHERE key = ? AND typeof(value) = \'integer\' '
+            'AND (expires IS NULL OR expires > ?)'
+        )
+        params = (delta, key, time.time())
+        if SUPPORTS_RETURNING:
+            return db.execute(f'{update} RETURNING value', params).fetchone()
+        # BEGIN IMMEDIATE уже держит запись: между UPDATE и SELECT
+        # значение никто не изменит.
+        if db.execute(update, params).rowcount != 1:
+            return None
+        return db.execute(
+            'SELECT value FROM cache WHERE key = ?', (key,)).fetchone()
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._db.execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), self._key(key, version),
+             time.time()),
+        ).rowcount == 1
+
+    def has_key(self, key, version=None):
+        row = self._db.execute(
+            'SELECT expires FROM cache WHERE key = ?',
+            (self._key(key, version),),
+        ).fetchone()
+        return row is not None and self._alive(row[0])
+
+    def delete(self, key, version=None):
+        self._db.execute(
+            'DELETE FROM cache WHERE key = ?', (self._key(key, version),)
+        )
+
+    def delete_many(self, keys, version=None):
+        self._db.executemany(
+            'DELETE FROM cache WHERE key = ?',
+            [(self._key(key, version),) for key in keys],
+        )
+
+    def clear(self):
+        self._db.execute('DELETE FROM cache')
+
+    def _cull(self):
+        db = self._db
+        count = db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count <= self._max_entries:
+            return
+        db.execute('DELETE FROM cache WHERE expires <= ?', (time.time(),))
+        count = db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count > self._max_entries and self._cull_frequency:
+            # Как в DatabaseCache: выбрасываем каждую N-ю часть, начиная
+            # с самых старых записей.
+            db.execute(
+                'DELETE FROM cache WHERE rowid IN ('
+                'SELECT rowid FROM cache ORDER BY rowid LIMIT ?)',
+                (count // self._cull_frequency,),
+            )
+
+    def close(self, **kwargs):
+        # Соединение живёт всё время работы потока: открывать файл
+        # заново на каждый запрос дороже, чем держать его открытым.
+        pass
+
+
+# LRU процесса для каждого алиаса: объекты кеша в Django создаются
+# заново в каждом потоке, а локальный уровень должен быть общим.
+_local_tiers = {}
+_local_tiers_lock = threading.Lock()
+
+
+class LocalTier:
+    """Потокобезопасный LRU с ограничением по числу записей."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires <= time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key, value, expires):
+        with self.lock:
+            self.entries[key] = (value, expires)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class TwoLevelCache(BaseCache):
+    """LRU процесса перед общим кешем.
+
+    LOCATION — алиас общего уровня в CACHES. OPTIONS:
+    LOCAL_PREFIXES — префиксы неизменяемых ключей, которые можно держать
+    в памяти процесса; LOCAL_MAX_ENTRIES и LOCAL_TIMEOUT ограничивают
+    размер и срок жизни локальных копий.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = location
+        self._prefixes = tuple(options.get('LOCAL_PREFIXES', ()))
+        self._local_timeout = options.get('LOCAL_TIMEOUT', 300)
+        max_entries = options.get('LOCAL_MAX_ENTRIES', 1000)
+        with _local_tiers_lock:
+            self._local = _local_tiers.setdefault(
+                location, LocalTier(max_entries)
+            )
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def _is_local(self, key):
+        return isinstance(key, str) and key.startswith(self._prefixes)
+
+    def _local_key(self, key, version):
+        return self.shared.make_key(key, version=version)
+
+    def _remember(self, key, value, version, timeout=DEFAULT_TIMEOUT):
+        expires = self.get_backend_timeout(
+            self._local_timeout if timeout is DEFAULT_TIMEOUT
+            or timeout is None else min(timeout, self._local_timeout)
+        )
+        self._local.set(self._local_key(key, version), value, expires)
+
+    def get(self, key, default=None, version=None):
+        if not self._is_local(key):
+            return self.shared.get(key, default, version=version)
+        entry = self._local.get(self._local_key(key, version))
+        if entry is not None:
+            return entry[0]
+        value = self.shared.get(key, self, version=version)
+        if value is self:
+            return default
+        self._remember(key, value, version)
+        return value
+
+    def get_many(self, keys, version=None):
+        found = {}
+        remote = []
+        for key in keys:
+            entry = (
+                self._local.get(self._local_key(key, version))
+                if self._is_local(key) else None
+            )
+            if entry is None:
+                remote.append(key)
+            else:
+                found[key] = entry[0]
+        if remote:
+            fetched = self.shared.get_many(remote, version=version)
+            for key, value in fetched.items():
+                if self._is_local(key):
+                    self._remember(key, value, version)
+            found.update(fetched)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version=version)
+        if self._is_local(key):
+            self._remember(key, value, version, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version=version)
+        for key, value in data.items():
+            if self._is_local(key) and key not in failed:
+                self._remember(key, value, version, timeout)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout, version=version)
+        if added and self._is_local(key):
+            self._remember(key, value, version, timeout)
+        return added
+
+    def incr(self, key, delta=1, version=None):
+        self._local.delete(self._local_key(key, version))
+        return self.shared.incr(key, delta, version=version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version=version)
+
+    def has_key(self, key, version=None):
+        if (
+            self._is_local(key)
+            and self._local.get(self._local_key(key, version)) is not None
+        ):
+            return True
+        return self.shared.has_key(key, version=version)
+
+    def delete(self, key, version=None):
+        self._local.delete(self._local_key(key, version))
+        self.shared.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        for key in keys:
+            self._local.delete(self._local_key(key, version))
+        self.shared.delete_many(keys, version=version)
+
+    def clear(self):
+        self._local.clear()
+        self.shared.clear()
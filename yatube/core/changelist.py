@@ -0,0 +1,161 @@
+"""Списки админки для таблиц в миллионы строк.
+
+Стандартный список делает два дорогих запроса на каждый просмотр:
+COUNT(*) для паджинатора и SELECT DISTINCT по усечённой дате для
+`date_hierarchy`. Оба читают всю таблицу, а второй в SQLite ещё и
+вызывает Python-функцию на каждую строку.
+
+`ApproximateCountPaginator` считает строки точно только до
+`exact_limit`; дальше для таблицы без фильтров берётся оценка СУБД, а
+для отфильтрованного списка показывается «exact_limit + 1».
+
+`IndexedChangeList` отдаёт шаблону queryset, у которого `dates()`
+перескакивает по индексу даты: один MIN() на каждый год, месяц или день,
+который действительно есть в данных, а MIN и MAX диапазона дат
+считаются отдельными запросами. Края диапазона запоминаются в queryset,
+поэтому `dates()` не перечитывает первый MIN и не ищет за последним MAX.
+"""
+import datetime
+
+from django.conf import settings
+from django.contrib.admin.views.main import ChangeList
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max, Min
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+
+def estimate_count(queryset):
+    """Оценка числа строк таблицы без фильтров или None.
+
+    SQLite: наибольший первичный ключ (верхняя граница: удалённые
+    строки оставляют дыры). PostgreSQL: reltuples из статистики.
+    """
+    query = queryset.query
+    if query.where or query.distinct or query.low_mark or query.high_mark:
+        return None
+    vendor = connections[queryset.db].vendor
+    if vendor == 'sqlite':
+        return queryset.order_by().aggregate(top=Max('pk'))['top'] or 0
+    if vendor == 'postgresql':
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        return int(row[0]) if row and row[0] > 0 else None
+    return None
+
+
+class ApproximateCountPaginator(Paginator):
+    exact_limit = 10000
+
+    @cached_property
+    def count(self):
+        if not hasattr(self.object_list, 'query'):
+            return len(self.object_list)
+        estimate = estimate_count(self.object_list)
+        if estimate is not None and estimate > self.exact_limit:
+            return estimate
+        # COUNT по подзапросу с LIMIT читает не больше exact_limit + 1
+        # строк.
+        return self.object_list.order_by()[:self.exact_limit + 1].count()
+
+
+def _next_period(day, kind):
+    if kind == 'year':
+        return datetime.date(day.year + 1, 1, 1)
+    if kind == 'month':
+        return (day.replace(day=28) + datetime.timedelta(days=4)).replace(
+            day=1)
+    return day + datetime.timedelta(days=1)
+
+
+def _start_of(day, kind):
+    if kind == 'year':
+        return day.replace(month=1, day=1)
+    if kind == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def _bound_key(value):
+    """('Min' или 'Max', поле) для агрегата по одному полю или None."""
+    if not isinstance(value, (Min, Max)):
+        return None
+    source = value.get_source_expressions()[0]
+    return (type(value).__name__, getattr(source, 'name', None))
+
+
+class IndexedDatesMixin:
+    def aggregate(self, *args, **kwargs):
+        # MIN и MAX в одном запросе SQLite считает проходом по всему
+        # индексу, а по отдельности — двумя переходами к его краям.
+        # Края запоминаются: date_hierarchy сразу за ними зовёт dates()
+        # у того же queryset.
+        keys = {name: _bound_key(value) for name, value in kwargs.items()}
+        if args or not kwargs or None in keys.values():
+            return super().aggregate(*args, **kwargs)
+        if not hasattr(self, '_bounds'):
+            self._bounds = {}
+        result = {}
+        for name, value in kwargs.items():
+            if keys[name] not in self._bounds:
+                self._bounds[keys[name]] = super().aggregate(
+                    **{name: value})[name]
+            result[name] = self._bounds[keys[name]]
+        return result
+
+    def dates(self, field_name, kind, order='ASC'):
+        """Как QuerySet.dates, но через MIN() по индексу на каждый период."""
+        if kind not in ('year', 'month', 'day'):
+            return super().dates(field_name, kind, order)
+        field = self.model._meta.get_field(field_name)
+        is_datetime = field.get_internal_type() == 'DateTimeField'
+        queryset = self.order_by()
+        periods = []
+        current = self.aggregate(first=Min(field_name))['first']
+        last = getattr(self, '_bounds', {}).get(('Max', field_name))
+        while current is not None:
+            if is_datetime:
+                # Периоды считаются в текущем часовом поясе, как у
+                # стандартного dates().
+                if settings.USE_TZ:
+                    current = timezone.localtime(current)
+                current = current.date()
+            period = _start_of(current, kind)
+            periods.append(period)
+            boundary = _next_period(period, kind)
+            if is_datetime:
+                boundary = datetime.datetime.combine(
+                    boundary, datetime.time.min)
+                if settings.USE_TZ:
+                    boundary = timezone.make_aware(boundary)
+            if last is not None and boundary > last:
+                # За известным MAX искать нечего.
+                break
+            current = queryset.filter(
+                **{f'{field_name}__gte': boundary}
+            ).aggregate(first=Min(field_name))['first']
+        return periods[::-1] if order == 'DESC' else periods
+
+
+_dates_classes = {}
+
+
+def with_indexed_dates(queryset):
+    """Копия queryset, у которой dates() работает через IndexedDatesMixin."""
+    base = type(queryset)
+    if base not in _dates_classes:
+        _dates_classes[base] = type(
+            f'Indexed{base.__name__}', (IndexedDatesMixin, base), {})
+    queryset = queryset._chain()
+    queryset.__class__ = _dates_classes[base]
+    return queryset
+
+
+class IndexedChangeList(ChangeList):
+    def get_queryset(self, request):
+        return with_indexed_dates(super().get_queryset(request))
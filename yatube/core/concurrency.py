@@ -0,0 +1,81 @@
+"""Параллельная загрузка независимых частей страницы.
+
+Django 2.2 не умеет асинхронные view, поэтому независимые запросы
+view (страница постов и счётчики профиля, пост и его комментарии)
+выполняются в общем пуле потоков: SQLite и сетевые базы отпускают GIL
+на время запроса. Поток пула открывает свои соединения с базой и
+закрывает их после каждой задачи: request_finished, который закрывает
+соединения потоков запросов, до потоков пула не доходит.
+
+Внутри транзакции параллелить нельзя: другие соединения не видят её
+незафиксированных изменений. Поэтому в atomic-блоке (и в TestCase)
+функции выполняются по очереди в текущем потоке.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+_executor = None
+_lock = threading.Lock()
+
+
+def executor():
+    """Общий пул; размер читается из настроек при первом вызове."""
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.CONCURRENT_LOADERS,
+                thread_name_prefix='loader',
+            )
+    return _executor
+
+
+def _in_transaction():
+    return any(connection.in_atomic_block
+               for connection in connections.all())
+
+
+def _run(func, wrappers):
+    """Выполняет func с execute_wrapper вызывающего потока.
+
+    Так запросы из пула попадают в учёт QueryCountMiddleware и в
+    бюджеты view.
+    """
+    try:
+        with ExitStack() as stack:
+            for alias, alias_wrappers in wrappers.items():
+                for wrapper in alias_wrappers:
+                    stack.enter_context(
+                        connections[alias].execute_wrapper(wrapper))
+            return func()
+    finally:
+        connections.close_all()
+
+
+def gather(*funcs):
+    """Вызывает функции без аргументов параллельно.
+
+    Возвращает список результатов в порядке функций; исключение любой
+    из них пробрасывается. Первая функция выполняется в текущем потоке.
+    """
+    if (
+        len(funcs) < 2
+        or not settings.CONCURRENT_LOADERS
+        or _in_transaction()
+    ):
+        return [func() for func in funcs]
+    wrappers = {
+        connection.alias: list(connection.execute_wrappers)
+        for connection in connections.all()
+    }
+    futures = [executor().submit(_run, func, wrappers) for func in funcs[1:]]
+    try:
+        first = funcs[0]()
+    finally:
+        # Задачи пула не должны работать после ответа, даже с ошибкой.
+        wait(futures)
+    return [first, *(future.result() for future in futures)]
@@ -0,0 +1,8 @@
+from django.conf import settings
+
+
+def live(request):
+    """Включены ли живые ленты (posts.live)."""
+    return {
+        'live_updates': settings.LIVE_UPDATES
+    }
@@ -0,0 +1,51 @@
+import logging
+
+from django.conf import settings
+
+from .query_budget import record_queries
+
+logger = logging.getLogger('core.queries')
+
+
+class QueryCountMiddleware:
+    """Считает SQL-запросы каждого HTTP-запроса.
+
+    Итог пишется в лог `core.queries`, а при QUERY_COUNT_HEADERS ещё и
+    в заголовки ответа. Если view объявил бюджет через `query_budget`
+    и вышел за него, или один запрос повторился много раз, в лог
+    уходит предупреждение.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.query_budget = None
+        with record_queries() as recorder:
+            response = self.get_response(request)
+        duplicates = recorder.duplicates()
+        if settings.QUERY_COUNT_HEADERS:
+            response['X-DB-Query-Count'] = recorder.count
+            response['X-DB-Duplicate-Queries'] = duplicates
+            response['X-DB-Time-Ms'] = f'{recorder.duration * 1000:.1f}'
+        logger.debug(
+            '%s %s: %d запросов (%d повторов) за %.1f мс',
+            request.method, request.path, recorder.count, duplicates,
+            recorder.duration * 1000,
+        )
+        budget = request.query_budget
+        if request.method not in ('GET', 'HEAD'):
+            budget = None
+        if budget is not None and recorder.count > budget:
+            logger.warning(
+                '%s: %d запросов при бюджете %d',
+                request.path, recorder.count, budget,
+            )
+        for sql, total in recorder.n_plus_one().items():
+            logger.warning(
+                '%s: возможный N+1, %d раз: %s', request.path, total, sql,
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = getattr(view_func, 'query_budget', None)
@@ -0,0 +1,218 @@
+"""Брокеры событий для живых лент (posts.live).
+
+Событие — (id, каналы, вид, данные). id растут монотонно, и подписчик
+читает всё, что новее последнего увиденного id: так после разрыва
+клиент продолжает с Last-Event-ID. Брокер хранит только последние
+BACKLOG событий; если подписчик отстал сильнее, `read` сообщает о
+пропуске, и клиенту нужно перечитать страницу целиком. Пропуск и id
+новее последнего: брокер перезапустился и начал счёт заново, события
+с такими id клиент иначе не получил бы никогда.
+
+`MemoryBroker` — очередь в памяти процесса, подписчики будятся сразу.
+Подходит для одного процесса: события другого воркера он не увидит.
+
+`SQLiteBroker` — общая очередь в файле SQLite для нескольких воркеров
+на одной машине, подписчики опрашивают её раз в POLL_INTERVAL. В
+продакшене на его место встаёт Redis.
+
+Брокер выбирается настройкой LIVE_BROKER, как бэкенд кеша.
+"""
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from collections import deque, namedtuple
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+Event = namedtuple('Event', 'id channels kind data')
+
+
+class BaseBroker:
+    def __init__(self, location, params):
+        options = params.get('OPTIONS', {})
+        self.backlog = int(options.get('BACKLOG', 1000))
+        self.poll_interval = float(options.get('POLL_INTERVAL', 0.5))
+
+    def publish(self, channels, kind, data):
+        """Добавляет событие; возвращает его id."""
+        raise NotImplementedError
+
+    def last_id(self):
+        raise NotImplementedError
+
+    def read(self, after):
+        """(события новее after, были ли пропущены вытесненные).
+
+        Если after больше last_id, событий нет, а пропуск есть.
+        """
+        raise NotImplementedError
+
+    def wait(self, after, timeout):
+        """read, ждущий новых событий не дольше timeout секунд."""
+        deadline = time.monotonic() + timeout
+        while True:
+            events, missed = self.read(after)
+            remaining = deadline - time.monotonic()
+            if events or missed or remaining <= 0:
+                return events, missed
+            time.sleep(min(self.poll_interval, remaining))
+
+    async def wait_async(self, after, timeout):
+        """wait для цикла событий: ожидание не занимает поток."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            events, missed = await loop.run_in_executor(
+                None, self.read, after)
+            remaining = deadline - loop.time()
+            if events or missed or remaining <= 0:
+                return events, missed
+            await asyncio.sleep(min(self.poll_interval, remaining))
+
+
+class MemoryBroker(BaseBroker):
+    def __init__(self, location, params):
+        super().__init__(location, params)
+        self._events = deque(maxlen=self.backlog)
+        self._last_id = 0
+        self._condition = threading.Condition()
+        # Ожидающие в циклах событий: (цикл, asyncio.Event).
+        self._async_waiters = set()
+
+    def publish(self, channels, kind, data):
+        with self._condition:
+            self._last_id += 1
+            self._events.append(
+                Event(self._last_id, tuple(channels), kind, data))
+            self._condition.notify_all()
+            waiters = list(self._async_waiters)
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # Цикл закрылся раньше, чем подписчик снял ожидание.
+                pass
+        return self._last_id
+
+    def last_id(self):
+        return self._last_id
+
+    def read(self, after):
+        with self._condition:
+            return self._read(after)
+
+    def _read(self, after):
+        if after > self._last_id:
+            return [], True
+        if not self._events or self._events[-1].id <= after:
+            return [], False
+        missed = self._events[0].id > after + 1
+        return [event for event in self._events if event.id > after], missed
+
+    def wait(self, after, timeout):
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._last_id != after, timeout)
+            return self._read(after)
+
+    async def wait_async(self, after, timeout):
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._condition:
+            if self._last_id != after:
+                return self._read(after)
+            self._async_waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter[1].wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._condition:
+                self._async_waiters.discard(waiter)
+        return self.read(after)
+
+
+class SQLiteBroker(BaseBroker):
+    """Очередь в файле SQLite, LOCATION — путь к файлу."""
+
+    def __init__(self, location, params):
+        super().__init__(location, params)
+        self._path = location
+        self._local = threading.local()
+
+    @property
+    def _db(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(
+                self._path, timeout=30, isolation_level=None,
+                check_same_thread=False,
+            )
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS events ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                'channels TEXT, kind TEXT, data TEXT)'
+            )
+            self._local.db = db
+        return db
+
+    def publish(self, channels, kind, data):
+        db = self._db
+        event_id = db.execute(
+            'INSERT INTO events (channels, kind, data) VALUES (?, ?, ?)',
+            (json.dumps(list(channels)), kind,
+             json.dumps(data, ensure_ascii=False)),
+        ).lastrowid
+        db.execute('DELETE FROM events WHERE id <= ?',
+                   (event_id - self.backlog,))
+        return event_id
+
+    def last_id(self):
+        row = self._db.execute(
+            "SELECT seq FROM sqlite_sequence WHERE name = 'events'"
+        ).fetchone()
+        return row[0] if row else 0
+
+    def read(self, after):
+        rows = self._db.execute(
+            'SELECT id, channels, kind, data FROM events WHERE id > ? '
+            'ORDER BY id LIMIT ?',
+            (after, self.backlog),
+        ).fetchall()
+        if not rows:
+            return [], after > self.last_id()
+        events = [
+            Event(event_id, tuple(json.loads(channels)), kind,
+                  json.loads(data))
+            for event_id, channels, kind, data in rows
+        ]
+        return events, events[0].id > after + 1
+
+
+_broker = None
+_lock = threading.Lock()
+
+
+def broker():
+    """Брокер из настройки LIVE_BROKER, один на процесс."""
+    global _broker
+    with _lock:
+        if _broker is None:
+            config = settings.LIVE_BROKER
+            _broker = import_string(config['BACKEND'])(
+                config.get('LOCATION', ''), config)
+    return _broker
+
+
+@receiver(setting_changed)
+def reset_broker(setting, **kwargs):
+    global _broker
+    if setting == 'LIVE_BROKER':
+        with _lock:
+            _broker = None
@@ -0,0 +1,78 @@
+"""Учёт SQL-запросов на один HTTP-запрос.
+
+`QueryRecorder` подключается к соединениям через execute_wrapper и
+собирает число запросов, суммарное время и «отпечатки» SQL: текст без
+параметров, где списки IN (%s, %s, ...) свёрнуты в IN (...). Один и тот
+же отпечаток много раз подряд — типичная картина N+1.
+"""
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+
+# Сколько повторов одного отпечатка считаем подозрением на N+1.
+N_PLUS_ONE_THRESHOLD = 3
+
+
+def fingerprint(sql):
+    return IN_LIST.sub('IN (...)', sql)
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.queries = []
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.duration += elapsed
+            self.queries.append((sql, params, elapsed))
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    def fingerprints(self):
+        return Counter(fingerprint(sql) for sql, _, _ in self.queries)
+
+    def duplicates(self):
+        """Сколько запросов повторяют уже выполненный отпечаток."""
+        return sum(total - 1 for total in self.fingerprints().values())
+
+    def n_plus_one(self, threshold=N_PLUS_ONE_THRESHOLD):
+        """Отпечатки, повторившиеся не меньше threshold раз."""
+        return {
+            sql: total for sql, total in self.fingerprints().items()
+            if total >= threshold
+        }
+
+
+@contextmanager
+def record_queries():
+    """Записывает запросы ко всем базам внутри блока with."""
+    recorder = QueryRecorder()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        yield recorder
+
+
+def query_budget(limit):
+    """Объявляет для view предельное число SQL-запросов.
+
+    Лимит не зависит от размера страницы: view, которому нужно больше,
+    где-то делает запрос на каждую строку. Лимит относится к чтению
+    (GET и HEAD): запись вызывает сигналы, и её стоимость другая.
+    """
+    def decorator(view_func):
+        view_func.query_budget = limit
+        return view_func
+    return decorator
@@ -0,0 +1,28 @@
+from django.urls import resolve
+
+from .query_budget import record_queries
+
+
+class QueryBudgetMixin:
+    """Проверки числа SQL-запросов для TestCase."""
+
+    def assertQueryBudget(self, client, url, budget=None, **extra):
+        """GET-запрос укладывается в бюджет view и не даёт N+1.
+
+        Без явного budget берётся лимит, объявленный у view через
+        `query_budget`.
+        """
+        if budget is None:
+            budget = getattr(resolve(url).func, 'query_budget', None)
+            self.assertIsNotNone(budget, f'У view для {url} нет бюджета')
+        with record_queries() as recorder:
+            response = client.get(url, **extra)
+        self.assertLessEqual(
+            recorder.count, budget,
+            f'{url}: {recorder.count} запросов при бюджете {budget}:\n'
+            + '\n'.join(sql for sql, _, _ in recorder.queries),
+        )
+        self.assertEqual(
+            recorder.n_plus_one(), {}, f'{url}: похоже на N+1'
+        )
+        return response
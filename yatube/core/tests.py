@@ -1,7 +1,27 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime
 from http import HTTPStatus
+from unittest import mock
 
+from core.asgi import WsgiToAsgi
+from core.cache import SQLiteCache, TwoLevelCache
+from core.changelist import ApproximateCountPaginator, with_indexed_dates
+from core.concurrency import gather
+from core.pubsub import MemoryBroker, SQLiteBroker
+from core.query_budget import record_queries
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.core.wsgi import get_wsgi_application
+from django.db import connections, transaction
+from django.db.models import Max, Min
+from django.http.cookie import parse_cookie
+from django.test import (Client, SimpleTestCase, TestCase,
+                         TransactionTestCase, override_settings)
+from django.utils.timezone import make_aware
 
 User = get_user_model()
 
@@ -16,3 +36,377 @@ class ViewTestClass(TestCase):
         response = self.guest_client.get('/page/')
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         self.assertTemplateUsed(response, 'core/404.html')
+
+    @override_settings(QUERY_COUNT_HEADERS=True)
+    def test_query_count_headers(self):
+        """Ответ содержит число SQL-запросов и их время."""
+        response = self.guest_client.get('/about/tech/')
+        self.assertEqual(response['X-DB-Query-Count'], '0')
+        self.assertEqual(response['X-DB-Duplicate-Queries'], '0')
+        self.assertIn('X-DB-Time-Ms', response)
+
+
+class SharedCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'cache.sqlite3')
+
+    def make_cache(self):
+        # Отдельный объект на тот же файл — как кеш другого воркера.
+        return SQLiteCache(self.path, {})
+
+    def test_values_are_visible_to_other_processes(self):
+        """Запись одного воркера видна другому."""
+        first, second = self.make_cache(), self.make_cache()
+        first.set_many({'a': 1, 'b': {'text': 'пост'}})
+        self.assertEqual(second.get_many(['a', 'b', 'c']),
+                         {'a': 1, 'b': {'text': 'пост'}})
+        self.assertEqual(second.incr('a'), 2)
+        self.assertEqual(first.get('a'), 2)
+
+    def test_incr_without_returning(self):
+        """На SQLite старше 3.35 incr обходится без RETURNING."""
+        cache = self.make_cache()
+        cache.set('a', 1)
+        with mock.patch('core.cache.SUPPORTS_RETURNING', False):
+            self.assertEqual(cache.incr('a', 2), 3)
+            with self.assertRaises(ValueError):
+                cache.incr('missing')
+        self.assertEqual(self.make_cache().get('a'), 3)
+
+    def test_add_and_expiry(self):
+        """add не перезаписывает живой ключ, просроченный — перезаписывает."""
+        cache = self.make_cache()
+        self.assertTrue(cache.add('lock', 1))
+        self.assertFalse(self.make_cache().add('lock', 2))
+        cache.set('lock', 1, timeout=-1)
+        self.assertIsNone(cache.get('lock'))
+        self.assertTrue(cache.add('lock', 2))
+        with self.assertRaises(ValueError):
+            cache.incr('missing')
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'core.cache.TwoLevelCache',
+        'LOCATION': 'two_level_shared',
+        'OPTIONS': {'LOCAL_PREFIXES': ['page:']},
+    },
+    'two_level_shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'two-level-tests',
+    },
+})
+class TwoLevelCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = TwoLevelCache('two_level_shared', {
+            'OPTIONS': {'LOCAL_PREFIXES': ['page:']},
+        })
+        self.cache.clear()
+
+    def test_immutable_keys_are_served_locally(self):
+        """Ключи страниц после первого чтения не ходят в общий кеш."""
+        self.cache.shared.set('page:1', 'html')
+        self.assertEqual(self.cache.get_many(['page:1']), {'page:1': 'html'})
+        with mock.patch.object(self.cache.shared, 'get_many') as get_many:
+            self.assertEqual(self.cache.get_many(['page:1']),
+                             {'page:1': 'html'})
+        get_many.assert_not_called()
+
+    def test_versions_are_always_shared(self):
+        """Сдвиг поколения в другом процессе виден сразу."""
+        self.cache.set('version:feed', 1)
+        self.cache.shared.incr('version:feed')
+        self.assertEqual(self.cache.get('version:feed'), 2)
+
+
+class ChangeListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for username, joined in (
+            ('first', datetime(2024, 12, 31, 23, 0)),
+            ('second', datetime(2025, 1, 15, 12, 0)),
+            ('third', datetime(2025, 3, 1, 0, 0)),
+            ('fourth', datetime(2025, 3, 20, 8, 30)),
+        ):
+            User.objects.create_user(
+                username=username, date_joined=make_aware(joined))
+
+    def test_dates_match_queryset_dates(self):
+        """dates() по индексу совпадает со стандартным."""
+        users = User.objects.all()
+        for kind in ('year', 'month', 'day'):
+            for order in ('ASC', 'DESC'):
+                with self.subTest(kind=kind, order=order):
+                    self.assertEqual(
+                        list(with_indexed_dates(users).dates(
+                            'date_joined', kind, order)),
+                        list(users.dates('date_joined', kind, order)),
+                    )
+        filtered = users.filter(date_joined__year=2025)
+        self.assertEqual(
+            with_indexed_dates(filtered).dates('date_joined', 'month'),
+            list(filtered.dates('date_joined', 'month')),
+        )
+
+    def test_dates_reuse_aggregated_bounds(self):
+        """dates() после MIN и MAX не перечитывает края диапазона."""
+        users = with_indexed_dates(User.objects.all())
+        with self.assertNumQueries(2):
+            users.aggregate(first=Min('date_joined'),
+                            last=Max('date_joined'))
+        expected = list(User.objects.dates('date_joined', 'year'))
+        with self.assertNumQueries(1):
+            self.assertEqual(users.dates('date_joined', 'year'), expected)
+
+    def test_small_tables_are_counted_exactly(self):
+        paginator = ApproximateCountPaginator(User.objects.all(), 2)
+        self.assertEqual(paginator.count, 4)
+
+    def test_large_tables_are_estimated(self):
+        """Больше exact_limit строк: оценка вместо COUNT(*)."""
+        users = User.objects.order_by('pk')
+        paginator = ApproximateCountPaginator(users, 2)
+        paginator.exact_limit = 2
+        top = users.last().pk
+        with self.assertNumQueries(1):
+            self.assertEqual(paginator.count, top)
+        filtered = ApproximateCountPaginator(
+            users.exclude(username='first'), 2)
+        filtered.exact_limit = 2
+        self.assertEqual(filtered.count, 3)
+
+
+def call_asgi(application, scope, body=b''):
+    """Ответ ASGI-приложения: (статус, заголовки, части тела)."""
+    messages = []
+    chunks = [{'type': 'http.request', 'body': body[:1],
+               'more_body': True},
+              {'type': 'http.request', 'body': body[1:]}]
+
+    async def receive():
+        return chunks.pop(0)
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(application({'type': 'http', **scope}, receive, send))
+    start, *parts = messages
+    return (start['status'], dict(start['headers']),
+            [part['body'] for part in parts])
+
+
+class WsgiToAsgiTests(SimpleTestCase):
+    def test_environ_and_streaming(self):
+        """Запрос переводится в environ, ответ отдаётся частями."""
+        seen = {}
+
+        def wsgi(environ, start_response):
+            seen.update(environ, body=environ['wsgi.input'].read())
+            header = 'да'.encode().decode('latin-1')
+            start_response('201 Created', [('X-Test', header)])
+            return [b'one', b'', b'two']
+
+        status, headers, parts = call_asgi(WsgiToAsgi(wsgi), {
+            'method': 'POST',
+            'path': '/группа/',
+            'query_string': b'a=1',
+            'headers': [(b'content-type', b'text/plain'),
+                        (b'accept', b'text/html'),
+                        (b'accept', b'*/*')],
+        }, body=b'data')
+        self.assertEqual(status, 201)
+        self.assertEqual(headers[b'x-test'], 'да'.encode())
+        self.assertEqual(parts, [b'one', b'two', b''])
+        self.assertEqual(seen['REQUEST_METHOD'], 'POST')
+        self.assertEqual(
+            seen['PATH_INFO'].encode('latin-1').decode(), '/группа/')
+        self.assertEqual(seen['QUERY_STRING'], 'a=1')
+        self.assertEqual(seen['CONTENT_TYPE'], 'text/plain')
+        self.assertEqual(seen['HTTP_ACCEPT'], 'text/html,*/*')
+        self.assertEqual(seen['body'], b'data')
+
+    def test_repeated_cookie_headers(self):
+        seen = {}
+
+        def wsgi(environ, start_response):
+            seen.update(parse_cookie(environ['HTTP_COOKIE']))
+            start_response('200 OK', [])
+            return []
+
+        call_asgi(WsgiToAsgi(wsgi), {
+            'method': 'GET', 'path': '/',
+            'headers': [(b'cookie', b'sessionid=abc'),
+                        (b'cookie', b'csrftoken=xyz')],
+        })
+        self.assertEqual(seen, {'sessionid': 'abc', 'csrftoken': 'xyz'})
+
+    def test_django_page(self):
+        status, headers, parts = call_asgi(
+            WsgiToAsgi(get_wsgi_application()),
+            {'method': 'GET', 'path': '/about/tech/',
+             'headers': [(b'host', b'testserver')]},
+        )
+        self.assertEqual(status, 200)
+        self.assertIn(b'text/html', headers[b'content-type'])
+        self.assertTrue(b''.join(parts))
+
+    def test_lifespan(self):
+        messages = [{'type': 'lifespan.startup'},
+                    {'type': 'lifespan.shutdown'}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        asyncio.run(WsgiToAsgi(None)({'type': 'lifespan'}, receive, send))
+        self.assertEqual(sent, ['lifespan.startup.complete',
+                                'lifespan.shutdown.complete'])
+
+
+@override_settings(CONCURRENT_LOADERS=2)
+class GatherTests(TransactionTestCase):
+    def test_functions_run_in_parallel(self):
+        """Функции ждут друг друга, значит, выполняются одновременно."""
+        barrier = threading.Barrier(2, timeout=5)
+
+        def meet(value):
+            barrier.wait()
+            return value
+
+        self.assertEqual(gather(lambda: meet(1), lambda: meet(2)), [1, 2])
+
+    def test_errors_are_raised(self):
+        def fail():
+            raise ValueError('ошибка')
+
+        with self.assertRaises(ValueError):
+            gather(lambda: 1, fail)
+
+    def test_queries_are_recorded(self):
+        """Запросы из пула видны QueryCountMiddleware."""
+        User.objects.create_user(username='first')
+        with record_queries() as recorder:
+            results = gather(
+                lambda: User.objects.count(),
+                lambda: User.objects.values_list('username', flat=True)
+                .get(),
+            )
+        self.assertEqual(results, [1, 'first'])
+        self.assertEqual(recorder.count, 2)
+
+    def test_pool_closes_connections(self):
+        """Соединения потока пула не переживают задачу, даже с ошибкой."""
+        closed = []
+        with mock.patch.object(
+            connections, 'close_all',
+            lambda: closed.append(threading.get_ident()),
+        ):
+            with self.assertRaises(ValueError):
+                gather(lambda: 1, lambda: int('x'))
+            gather(lambda: 1, threading.get_ident)
+        self.assertEqual(len(closed), 2)
+        self.assertNotIn(threading.get_ident(), closed)
+
+    def test_sequential_in_transaction(self):
+        """В транзакции пул не видел бы её изменений."""
+        with transaction.atomic():
+            self.assertEqual(
+                gather(threading.get_ident, threading.get_ident),
+                [threading.get_ident()] * 2,
+            )
+
+
+class MemoryBrokerTests(SimpleTestCase):
+    def setUp(self):
+        self.broker = MemoryBroker('', {'OPTIONS': {'BACKLOG': 3}})
+
+    def test_read_after_id(self):
+        first = self.broker.publish(['feed'], 'post', {'id': 1})
+        self.broker.publish(['post:1'], 'comment', {'id': 2})
+        events, missed = self.broker.read(first)
+        self.assertFalse(missed)
+        self.assertEqual([(event.channels, event.data) for event in events],
+                         [(('post:1',), {'id': 2})])
+        self.assertEqual(self.broker.read(self.broker.last_id()),
+                         ([], False))
+
+    def test_missed_events(self):
+        """Вытесненные события — пропуск, а не тихая потеря."""
+        for number in range(5):
+            self.broker.publish(['feed'], 'post', {'id': number})
+        events, missed = self.broker.read(0)
+        self.assertTrue(missed)
+        self.assertEqual([event.id for event in events], [3, 4, 5])
+        self.assertFalse(self.broker.read(2)[1])
+
+    def test_id_after_restart(self):
+        """id новее последнего — брокер перезапущен, это пропуск."""
+        self.broker.publish(['feed'], 'post', {})
+        self.assertEqual(self.broker.read(10), ([], True))
+        started = time.monotonic()
+        self.assertEqual(self.broker.wait(10, timeout=5), ([], True))
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(
+            asyncio.run(self.broker.wait_async(10, timeout=5)), ([], True))
+
+    def test_wait_wakes_on_publish(self):
+        timer = threading.Timer(
+            0.05, self.broker.publish, (['feed'], 'post', {}))
+        timer.start()
+        self.addCleanup(timer.cancel)
+        events, _ = self.broker.wait(0, timeout=5)
+        self.assertEqual(len(events), 1)
+        self.assertEqual(self.broker.wait(1, timeout=0.01), ([], False))
+
+    def test_wait_async(self):
+        async def wait():
+            loop = asyncio.get_running_loop()
+            loop.call_later(0.05, lambda: threading.Thread(
+                target=self.broker.publish, args=(['feed'], 'post', {}),
+            ).start())
+            return await self.broker.wait_async(0, timeout=5)
+
+        events, _ = asyncio.run(wait())
+        self.assertEqual(len(events), 1)
+
+
+class SQLiteBrokerTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'live.sqlite3')
+
+    def make_broker(self):
+        return SQLiteBroker(
+            self.path, {'OPTIONS': {'BACKLOG': 2, 'POLL_INTERVAL': 0.01}})
+
+    def test_id_after_restart(self):
+        broker = self.make_broker()
+        self.assertEqual(broker.wait(5, timeout=1), ([], True))
+        broker.publish(['feed'], 'post', {})
+        self.assertEqual(broker.read(1), ([], False))
+
+    def test_events_are_visible_to_other_processes(self):
+        first, second = self.make_broker(), self.make_broker()
+        self.assertEqual(second.last_id(), 0)
+        first.publish(['feed', 'group:cats'], 'post', {'text': 'пост'})
+        events, missed = second.wait(0, timeout=1)
+        self.assertFalse(missed)
+        self.assertEqual(events[0].channels, ('feed', 'group:cats'))
+        self.assertEqual(events[0].data, {'text': 'пост'})
+        self.assertEqual(second.last_id(), 1)
+
+    def test_backlog_is_trimmed(self):
+        broker = self.make_broker()
+        for number in range(4):
+            broker.publish(['feed'], 'post', {'id': number})
+        events, missed = broker.read(0)
+        self.assertTrue(missed)
+        self.assertEqual([event.id for event in events], [3, 4])
+        self.assertEqual(
+            asyncio.run(broker.wait_async(4, timeout=0.05)), ([], False))
@@ -1,11 +1,30 @@
+from core.changelist import ApproximateCountPaginator, IndexedChangeList
 from django.contrib import admin
 
 from .models import Comment, Follow, Group, Post
 
-admin.site.register(Group)
 
+class LargeTableAdmin(admin.ModelAdmin):
+    """Список без полного COUNT(*) для таблиц в миллионы строк."""
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+    date_hierarchy = 'pub_date'
+    list_filter = ('pub_date',)
+    empty_value_display = '-пусто-'
+
+    def get_changelist(self, request, **kwargs):
+        return IndexedChangeList
+
+
+@admin.register(Group)
+class GroupAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'title', 'slug')
+    search_fields = ('title', 'slug')
+    prepopulated_fields = {'slug': ('title',)}
 
-class PostAdmin(admin.ModelAdmin):
+
+@admin.register(Post)
+class PostAdmin(LargeTableAdmin):
     list_display = (
         'pk',
         'text',
@@ -14,37 +33,46 @@ class PostAdmin(admin.ModelAdmin):
         'group',
     )
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
+    raw_id_fields = ('author',)
     search_fields = ('text',)
-    list_filter = ('pub_date',)
-    empty_value_display = '-пусто-'
-
 
-admin.site.register(Post, PostAdmin)
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        formfield = super().formfield_for_foreignkey(
+            db_field, request, **kwargs)
+        if db_field.name == 'group' and request is not None:
+            # Список групп в каждой строке list_editable — копия поля
+            # формы, и без готовых choices каждая строка читает группы
+            # заново. Читаем их один раз на запрос.
+            if not hasattr(request, '_group_choices'):
+                # iter(): list() спросил бы у итератора len() — лишний COUNT.
+                request._group_choices = list(iter(formfield.choices))
+            formfield.choices = request._group_choices
+        return formfield
 
 
-class CommentAdmin(admin.ModelAdmin):
+@admin.register(Comment)
+class CommentAdmin(LargeTableAdmin):
     list_display = (
         'post',
+        'author',
         'text',
         'pub_date'
     )
+    list_select_related = ('post', 'author')
+    raw_id_fields = ('post', 'author')
     search_fields = ('text',)
-    list_filter = ('pub_date',)
-    empty_value_display = '-пусто-'
-
-
-admin.site.register(Comment, CommentAdmin)
 
 
-class FollowAdmin(admin.ModelAdmin):
+@admin.register(Follow)
+class FollowAdmin(LargeTableAdmin):
     list_display = (
         'user',
         'author',
         'pub_date'
     )
-    search_fields = ('author',)
-    list_filter = ('pub_date',)
-    empty_value_display = '-пусто-'
-
-
-admin.site.register(Follow, FollowAdmin)
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
+    # Поиск по началу имени: author — внешний ключ, искать надо по
+    # полю связанной модели.
+    search_fields = ('^user__username', '^author__username')
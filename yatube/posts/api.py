@@ -0,0 +1,289 @@
+"""JSON API для мобильных клиентов: /api/v1/.
+
+Ленты отдаются страницами по курсору (KeysetPaginator): в ответе
+results и ссылки next/previous. Параметр fields= выбирает поля,
+limit= — размер страницы. Ответы на GET несут сильный ETag и
+Last-Modified из поколений кеша (posts.cache), и повторный запрос с
+If-None-Match к неизменившейся ленте получает 304 без обращения к базе.
+
+Запись — через сессию сайта, поэтому POST, PATCH и DELETE требуют
+CSRF-токен, как и формы. Тело запроса — JSON или обычная форма.
+"""
+import json
+from functools import partial, wraps
+
+from core.query_budget import query_budget
+from django.contrib.auth.models import User
+from django.http import Http404, HttpResponse, JsonResponse, QueryDict
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+
+from . import counters, follows, timeline
+from .cache import (FEED, RENAMES, author_version, conditional_versioned,
+                    group_version, post_version, post_versions)
+from .forms import CommentForm, PostForm
+from .models import Counter, Follow, Group, Post
+from .serializers import (COMMENT_FIELDS, POST_FIELDS, prepare,
+                          select_fields, serialize)
+from .utils import COUNT_PAGE_COMMENTS, COUNT_PAGE_OBJECTS, KeysetPaginator
+
+MAX_LIMIT = 100
+
+
+class ApiError(Exception):
+    def __init__(self, status, detail, **extra):
+        super().__init__(detail)
+        self.status = status
+        self.data = {'detail': detail, **extra}
+
+
+def _json(data, status=200):
+    return JsonResponse(
+        data, status=status,
+        json_dumps_params={'ensure_ascii': False, 'separators': (',', ':')},
+    )
+
+
+def api_view(*methods):
+    """Разрешённые методы и ошибки в виде JSON вместо HTML-страниц."""
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            allowed = set(methods)
+            if 'GET' in allowed:
+                allowed.add('HEAD')
+            try:
+                if request.method not in allowed:
+                    response = _json(
+                        {'detail': 'Метод не поддерживается'}, status=405)
+                    response['Allow'] = ', '.join(sorted(allowed))
+                    return response
+                return view_func(request, *args, **kwargs)
+            except ApiError as error:
+                return _json(error.data, status=error.status)
+            except Http404:
+                return _json({'detail': 'Не найдено'}, status=404)
+        return wrapper
+    return decorator
+
+
+def _require_login(request):
+    if not request.user.is_authenticated:
+        raise ApiError(401, 'Нужна авторизация')
+
+
+def api_login_required(view_func):
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        _require_login(request)
+        return view_func(request, *args, **kwargs)
+    return wrapper
+
+
+def _data(request):
+    """Тело запроса: JSON-объект или поля формы."""
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            raise ApiError(400, 'Некорректный JSON')
+        if not isinstance(data, dict):
+            raise ApiError(400, 'Ожидается JSON-объект')
+        return data
+    if request.method == 'POST':
+        return request.POST.dict()
+    # PATCH и DELETE Django в request.POST не разбирает.
+    return QueryDict(request.body, encoding=request.encoding).dict()
+
+
+def _fields(request, available):
+    try:
+        return select_fields(request.GET.get('fields'), available)
+    except ValueError as error:
+        raise ApiError(400, 'Неизвестные поля', fields=str(error))
+
+
+def _invalid(form):
+    return ApiError(400, 'Некорректные данные',
+                    errors=form.errors.get_json_data())
+
+
+def _page(request, queryset, available, per_page,
+          paginator_class=KeysetPaginator):
+    fields = _fields(request, available)
+    try:
+        limit = min(max(int(request.GET.get('limit', per_page)), 1),
+                    MAX_LIMIT)
+    except ValueError:
+        raise ApiError(400, 'limit должен быть числом')
+    page = paginator_class(
+        prepare(queryset, fields, available), limit
+    ).page_by_cursor(request.GET.get('cursor'))
+    return _json({
+        'results': [serialize(obj, fields, available) for obj in page],
+        'next': _cursor_url(request, page.next_cursor),
+        'previous': _cursor_url(request, page.previous_cursor),
+    })
+
+
+def _cursor_url(request, cursor):
+    if cursor is None:
+        return None
+    params = request.GET.copy()
+    params['cursor'] = cursor
+    return f'{request.path}?{params.urlencode()}'
+
+
+def _post_response(post, status=200):
+    post = prepare(
+        Post.objects.filter(pk=post.pk), list(POST_FIELDS), POST_FIELDS
+    ).get()
+    response = _json(serialize(post, list(POST_FIELDS), POST_FIELDS),
+                     status=status)
+    if status == 201:
+        response['Location'] = reverse('posts:api:post', args=[post.pk])
+    return response
+
+
+def _post_form(request, data, instance=None):
+    if 'group' in data:
+        slug = data['group']
+        data['group'] = None
+        if slug:
+            data['group'] = Group.objects.filter(slug=slug).values_list(
+                'pk', flat=True).first()
+            if data['group'] is None:
+                raise ApiError(400, 'Некорректные данные',
+                               errors={'group': ['Нет такой группы']})
+    form = PostForm(data, files=request.FILES or None, instance=instance)
+    if not form.is_valid():
+        raise _invalid(form)
+    return form
+
+
+@query_budget(4)
+@api_view('GET', 'POST')
+@conditional_versioned(lambda request: [FEED])
+def post_list(request):
+    if request.method == 'POST':
+        _require_login(request)
+        post = _post_form(request, _data(request)).save(commit=False)
+        post.author = request.user
+        post.save()
+        return _post_response(post, status=201)
+    return _page(request, Post.objects.all(), POST_FIELDS, COUNT_PAGE_OBJECTS)
+
+
+@query_budget(3)
+@api_view('GET', 'PATCH', 'DELETE')
+@conditional_versioned(lambda request, post_id: post_versions(post_id))
+def post_item(request, post_id):
+    if request.method == 'GET':
+        fields = _fields(request, POST_FIELDS)
+        post = get_object_or_404(
+            prepare(Post.objects.all(), fields, POST_FIELDS), pk=post_id)
+        return _json(serialize(post, fields, POST_FIELDS))
+    _require_login(request)
+    post = get_object_or_404(Post, pk=post_id)
+    if post.author_id != request.user.pk:
+        raise ApiError(403, 'Пост может менять только автор')
+    if request.method == 'DELETE':
+        post.delete()
+        return HttpResponse(status=204)
+    data = {
+        'text': post.text,
+        'group': post.group.slug if post.group_id else None,
+    }
+    data.update(_data(request))
+    _post_form(request, data, instance=post).save()
+    return _post_response(post)
+
+
+# В комментариях — имена их авторов: переименование сдвигает RENAMES.
+@query_budget(4)
+@api_view('GET', 'POST')
+@conditional_versioned(
+    lambda request, post_id: [post_version(post_id), RENAMES])
+def comment_list(request, post_id):
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    if request.method == 'POST':
+        _require_login(request)
+        form = CommentForm(_data(request))
+        if not form.is_valid():
+            raise _invalid(form)
+        comment = form.save(commit=False)
+        comment.author = request.user
+        comment.post = post
+        comment.save()
+        return _json(serialize(comment, list(COMMENT_FIELDS),
+                               COMMENT_FIELDS), status=201)
+    return _page(request, post.comments.all(), COMMENT_FIELDS,
+                 COUNT_PAGE_COMMENTS)
+
+
+@query_budget(3)
+@api_view('GET')
+@conditional_versioned(lambda request, slug: [group_version(slug)])
+def group_posts(request, slug):
+    group = get_object_or_404(Group.objects.only('pk'), slug=slug)
+    return _page(request, group.posts.all(), POST_FIELDS, COUNT_PAGE_OBJECTS)
+
+
+@query_budget(7)
+@api_view('GET')
+@conditional_versioned(
+    lambda request, username: [author_version(username)], personal=True)
+def profile(request, username):
+    author = get_object_or_404(User, username=username)
+    counts = counters.get_many([
+        (Counter.AUTHOR_POSTS, author.pk),
+        (Counter.FOLLOWERS, author.pk),
+        (Counter.FOLLOWING, author.pk),
+    ])
+    following = request.user.is_authenticated and Follow.objects.filter(
+        user=request.user, author=author
+    ).exists()
+    return _json({
+        'username': author.username,
+        'full_name': author.get_full_name(),
+        'posts_count': counts[Counter.AUTHOR_POSTS, author.pk],
+        'followers_count': counts[Counter.FOLLOWERS, author.pk],
+        'following_count': counts[Counter.FOLLOWING, author.pk],
+        'following': following,
+    })
+
+
+@query_budget(3)
+@api_view('GET')
+@conditional_versioned(lambda request, username: [author_version(username)])
+def profile_posts(request, username):
+    author = get_object_or_404(User.objects.only('pk'), username=username)
+    return _page(request, author.posts.all(), POST_FIELDS,
+                 COUNT_PAGE_OBJECTS)
+
+
+@api_view('POST', 'DELETE')
+@api_login_required
+def profile_follow(request, username):
+    author = get_object_or_404(User.objects.only('pk'), username=username)
+    if author.pk == request.user.pk:
+        raise ApiError(400, 'Нельзя подписаться на себя')
+    if request.method == 'POST':
+        follows.follow(request.user.pk, author.pk)
+    else:
+        follows.unfollow(request.user.pk, author.pk)
+    return _json({'following': request.method == 'POST'})
+
+
+# Как у posts.views.follow_index: число запросов не зависит от числа
+# знаменитостей.
+@query_budget(5)
+@api_view('GET')
+@api_login_required
+@conditional_versioned(
+    lambda request: [FEED, author_version(request.user.username)],
+    personal=True)
+def follow_feed(request):
+    return _page(request, Post.objects.all(), POST_FIELDS,
+                 COUNT_PAGE_OBJECTS,
+                 partial(timeline.FeedPaginator, user=request.user))
@@ -3,3 +3,13 @@ from django.apps import AppConfig
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        # Регистрируем обработчики сигналов: счётчики и т.п.
+        from . import signals  # noqa: F401
+
+        # Защита от «бомб»: Pillow откажется открывать картинку больше
+        # удвоенного предела ещё до декодирования.
+        from django.conf import settings
+        from PIL import Image
+        Image.MAX_IMAGE_PIXELS = settings.POST_IMAGE_MAX_PIXELS
@@ -0,0 +1,70 @@
+"""Замеры производительности.
+
+Замеры идут на отдельной тестовой базе и со своим кешем во временном
+каталоге, поэтому их можно запускать рядом с рабочими данными, ничего
+в них не меняя: очистка кеша между замерами не трогает общий кеш, а
+ключи тестовых данных не попадают к живому серверу.
+
+Синтетические данные строит `dataset`, время и запросы страниц меряет
+`pages`, пропускную способность WSGI и ASGI — `concurrency`, объём
+картинок — `images`.
+"""
+import copy
+import os
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import (override_settings, setup_test_environment,
+                               teardown_test_environment)
+
+
+def isolated_caches(directory):
+    """CACHES, в которых каждый общий кеш заменён файлом в directory.
+
+    LRU процесса (core.cache.TwoLevelCache) общий для одноимённых
+    общих уровней, поэтому двухуровневые кеши смотрят на свой алиас.
+    """
+    def isolated_cache(alias):
+        return {
+            'BACKEND': 'core.cache.SQLiteCache',
+            'LOCATION': os.path.join(directory, f'{alias}.cache'),
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        }
+
+    isolated = {}
+    for alias, config in settings.CACHES.items():
+        if config['BACKEND'] == 'core.cache.TwoLevelCache':
+            shared = f'benchmark-{config["LOCATION"]}'
+            isolated[alias] = dict(copy.deepcopy(config), LOCATION=shared)
+            isolated[shared] = isolated_cache(shared)
+        else:
+            isolated[alias] = isolated_cache(alias)
+    return isolated
+
+
+@contextmanager
+def benchmark_database():
+    """Создаёт пустую тестовую базу и отдельный кеш на время замера."""
+    setup_test_environment(debug=False)
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(CACHES=isolated_caches(directory)):
+            try:
+                yield
+            finally:
+                # Страницы тестовой базы не должны пережить замер в LRU.
+                cache.clear()
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(share * (len(ordered) - 1))))
+    return ordered[index]
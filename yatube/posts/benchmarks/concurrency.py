@@ -0,0 +1,172 @@
+"""Пропускная способность WSGI и ASGI при множестве клиентов."""
+import asyncio
+import io
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from core.asgi import WsgiToAsgi
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.wsgi import get_wsgi_application
+from django.test import Client
+from django.test.utils import override_settings
+
+from . import percentile
+from .pages import page_urls
+
+User = get_user_model()
+
+
+def _scopes(urls, cookie, total, warm):
+    """Запросы замера по кругу страниц: [(страница, scope ASGI)].
+
+    Без warm у каждого запроса свой параметр bench=, то есть своя
+    запись в кеше страниц: меряется построение страницы.
+    """
+    pages = list(urls.items())
+    scopes = []
+    for number in range(total):
+        page, url = pages[number % len(pages)]
+        headers = [(b'host', b'testserver')]
+        if page == 'follow_index':
+            headers.append((b'cookie', cookie.encode()))
+        scopes.append((page, {
+            'type': 'http',
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': url,
+            'query_string': b'' if warm else f'bench={number}'.encode(),
+            'root_path': '',
+            'headers': headers,
+            'server': ('testserver', 80),
+            'client': ('127.0.0.1', 0),
+        }))
+    return scopes
+
+
+def _wsgi_get(application, scope):
+    """(статус, время ответа в мс) WSGI-приложения."""
+    status = []
+
+    def start_response(line, headers, exc_info=None):
+        status.append(int(line.split(' ', 1)[0]))
+
+    started = time.perf_counter()
+    result = application(
+        WsgiToAsgi.environ(scope, io.BytesIO()), start_response)
+    try:
+        b''.join(result)
+    finally:
+        result.close()
+    return status[0], (time.perf_counter() - started) * 1000
+
+
+async def _asgi_get(application, scope):
+    status = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b''}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+
+    started = time.perf_counter()
+    await application(scope, receive, send)
+    return status[0], (time.perf_counter() - started) * 1000
+
+
+def _run_wsgi(application, scopes, concurrency, threads):
+    # Как потоковый WSGI-сервер: запросы клиентов ждут в очереди один
+    # из threads потоков, и ожидание входит во время ответа.
+    pending = iter(scopes)
+    lock = threading.Lock()
+
+    def client(server):
+        responses = []
+        while True:
+            with lock:
+                item = next(pending, None)
+            if item is None:
+                return responses
+            started = time.perf_counter()
+            status, _ = server.submit(
+                _wsgi_get, application, item[1]).result()
+            responses.append(
+                (status, (time.perf_counter() - started) * 1000))
+
+    with ThreadPoolExecutor(max_workers=threads) as server, \
+            ThreadPoolExecutor(max_workers=concurrency) as clients:
+        futures = [clients.submit(client, server)
+                   for _ in range(concurrency)]
+        return [response for future in futures
+                for response in future.result()]
+
+
+def _run_asgi(application, scopes, concurrency, threads):
+    asgi = WsgiToAsgi(application, max_workers=threads)
+    pending = iter(scopes)
+
+    async def client():
+        return [await _asgi_get(asgi, scope) for _, scope in pending]
+
+    async def run():
+        clients = await asyncio.gather(
+            *(client() for _ in range(concurrency)))
+        return [response for responses in clients
+                for response in responses]
+
+    try:
+        return asyncio.run(run())
+    finally:
+        asgi.executor.shutdown()
+
+
+CONCURRENCY_MODES = {
+    'wsgi': (_run_wsgi, False),
+    'wsgi+gather': (_run_wsgi, True),
+    'asgi': (_run_asgi, False),
+    'asgi+gather': (_run_asgi, True),
+}
+
+
+def concurrency_test(concurrency=50, total=500, threads=8, warm=False):
+    """Пропускная способность WSGI и ASGI при concurrency клиентах.
+
+    Каждый режим выполняет total запросов к страницам load_test
+    потоками размера threads, с параллельной загрузкой частей страниц
+    (+gather) и без неё. Возвращает {режим: {'rps', 'p50', 'p95',
+    'p99'}}, время — от отправки запроса до конца ответа, в мс.
+    """
+    urls, reader_id = page_urls()
+    reader = Client()
+    reader.force_login(User.objects.get(pk=reader_id))
+    cookie = (f'{settings.SESSION_COOKIE_NAME}='
+              f'{reader.cookies[settings.SESSION_COOKIE_NAME].value}')
+    application = get_wsgi_application()
+    # Первые запросы компилируют шаблоны и в замер не идут.
+    for _, scope in _scopes(urls, cookie, len(urls), warm=True):
+        _wsgi_get(application, scope)
+    results = {}
+    for mode, (run, loaders) in CONCURRENCY_MODES.items():
+        cache.clear()
+        scopes = _scopes(urls, cookie, total, warm)
+        with override_settings(CONCURRENT_LOADERS=threads * loaders):
+            started = time.perf_counter()
+            responses = run(application, scopes, concurrency, threads)
+            elapsed = time.perf_counter() - started
+        failed = [status for status, _ in responses if status != 200]
+        if failed:
+            raise RuntimeError(f'{mode}: статусы {sorted(set(failed))}')
+        timings = [timing for _, timing in responses]
+        results[mode] = {
+            'rps': len(responses) / elapsed,
+            'p50': statistics.median(timings),
+            'p95': percentile(timings, 0.95),
+            'p99': percentile(timings, 0.99),
+        }
+    return results
@@ -0,0 +1,195 @@
+"""Синтетические данные для замеров: пачки bulk_create."""
+import itertools
+import random
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from .. import transfer
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+BATCH_SIZE = 5000
+
+
+def create_users(count, prefix='bench'):
+    users = [
+        User(username=f'{prefix}_{i}', password='!') for i in range(count)
+    ]
+    User.objects.bulk_create(users)
+    return list(
+        User.objects.filter(username__startswith=f'{prefix}_')
+        .values_list('pk', flat=True)
+    )
+
+
+def create_posts(author_ids, total, group_id=None):
+    """Добавляет total постов, распределяя их по авторам по кругу."""
+    for start in range(0, total, BATCH_SIZE):
+        size = min(BATCH_SIZE, total - start)
+        Post.objects.bulk_create(
+            Post(
+                author_id=author_ids[(start + i) % len(author_ids)],
+                group_id=group_id,
+                text=f'Пост {start + i}',
+            )
+            for i in range(size)
+        )
+
+
+def create_comments(post_ids, author_ids, total):
+    """Добавляет total комментариев к постам post_ids по кругу."""
+    for start in range(0, total, BATCH_SIZE):
+        size = min(BATCH_SIZE, total - start)
+        Comment.objects.bulk_create(
+            Comment(
+                post_id=post_ids[(start + i) % len(post_ids)],
+                author_id=author_ids[(start + i) % len(author_ids)],
+                text=f'Комментарий {start + i}',
+            )
+            for i in range(size)
+        )
+
+
+def create_follows(user_ids, total, skip=0):
+    """Добавляет total подписок между user_ids, начиная с пары skip.
+
+    Пары перебираются по порядку (читатель, сдвиг до автора), так что
+    повторов нет, пока total + skip < len(user_ids) ** 2.
+    """
+    count = len(user_ids)
+    for start in range(skip, skip + total, BATCH_SIZE):
+        size = min(BATCH_SIZE, skip + total - start)
+        Follow.objects.bulk_create(
+            Follow(
+                user_id=user_ids[number // (count - 1)],
+                author_id=user_ids[
+                    (number // (count - 1) + number % (count - 1) + 1)
+                    % count],
+            )
+            for number in range(start, start + size)
+        )
+
+
+# Слова для текстов синтетических постов: поиску нужно, что находить.
+WORDS = (
+    'котик', 'собака', 'закат', 'море', 'город', 'прогулка', 'чайник',
+    'книга', 'поезд', 'дождь', 'утро', 'вечер', 'фотография', 'дорога',
+    'лес', 'река', 'кофе', 'друзья', 'выходные', 'работа', 'концерт',
+    'отпуск', 'снег', 'лето', 'новости', 'рецепт', 'пирог', 'музей',
+    'горы', 'велосипед', 'сад', 'цветы', 'небо', 'мост', 'парк',
+)
+# Доля постов, опубликованных в какой-нибудь группе.
+GROUP_SHARE = 0.6
+
+
+def zipf_weights(count, alpha):
+    """Накопленные веса закона Ципфа: k-й по популярности — 1 / k**alpha."""
+    return list(itertools.accumulate(
+        1 / rank ** alpha for rank in range(1, count + 1)))
+
+
+def _text(rng):
+    return ' '.join(rng.choices(WORDS, k=rng.randint(5, 20))).capitalize()
+
+
+def max_pk(model):
+    return model.objects.order_by('-pk').values_list(
+        'pk', flat=True).first() or 0
+
+
+def generate_dataset(users, groups, posts, comments, follows, days=365,
+                     alpha=1.1, seed=0, prefix='user'):
+    """Заполняет базу правдоподобными данными пачками bulk_create.
+
+    Авторов постов и популярность групп выбирает закон Ципфа: немногие
+    пишут много, большинство — почти ничего. Подписываются тоже в
+    основном на популярных авторов. Посты идут по времени за последние
+    days дней, комментарии появляются после поста, чаще к свежим.
+    В конце пересобираются счётчики, ленты и поисковый индекс.
+    Возвращает число созданных строк каждой модели.
+    """
+    rng = random.Random(seed)
+    user_ids = create_users(users, prefix)
+    Group.objects.bulk_create(
+        Group(title=f'Группа {i}', slug=f'{prefix}-group-{i}',
+              description=_text(rng))
+        for i in range(groups)
+    )
+    group_ids = list(
+        Group.objects.filter(slug__startswith=f'{prefix}-group-')
+        .order_by('pk').values_list('pk', flat=True)
+    )
+    author_weights = zipf_weights(len(user_ids), alpha)
+    group_weights = zipf_weights(len(group_ids), alpha)
+    now = timezone.now()
+    begin = now - timedelta(days=days)
+    slot = timedelta(days=days) / max(posts, 1)
+    first_post = max_pk(Post) + 1
+
+    with transfer.keep_dates():
+        for start in range(0, posts, BATCH_SIZE):
+            size = min(BATCH_SIZE, posts - start)
+            authors = rng.choices(user_ids, cum_weights=author_weights,
+                                  k=size)
+            Post.objects.bulk_create(
+                Post(
+                    author_id=author_id,
+                    group_id=(
+                        rng.choices(group_ids, cum_weights=group_weights)[0]
+                        if group_ids and rng.random() < GROUP_SHARE
+                        else None
+                    ),
+                    text=_text(rng),
+                    pub_date=begin + slot * (start + i + rng.random()),
+                )
+                for i, author_id in enumerate(authors)
+            )
+        # Посты вставлены подряд, поэтому номер поста однозначно задаёт
+        # его id и время публикации.
+        posts = max_pk(Post) - first_post + 1
+        for start in range(0, comments if posts else 0, BATCH_SIZE):
+            size = min(BATCH_SIZE, comments - start)
+            batch = []
+            for _ in range(size):
+                number = int(posts * rng.random() ** 0.5)
+                pub_date = min(
+                    now,
+                    begin + slot * (number + 1)
+                    + timedelta(hours=rng.expovariate(1 / 6)),
+                )
+                batch.append(Comment(
+                    post_id=first_post + number,
+                    author_id=rng.choice(user_ids),
+                    text=_text(rng),
+                    pub_date=pub_date,
+                ))
+            Comment.objects.bulk_create(batch)
+
+        follows = min(follows, len(user_ids) * (len(user_ids) - 1))
+        pairs = set()
+        while len(pairs) < follows:
+            readers = rng.choices(user_ids, k=follows - len(pairs))
+            authors = rng.choices(user_ids, cum_weights=author_weights,
+                                  k=len(readers))
+            pairs.update(
+                pair for pair in zip(readers, authors) if pair[0] != pair[1])
+        pairs = sorted(pairs)
+        for start in range(0, len(pairs), BATCH_SIZE):
+            Follow.objects.bulk_create(
+                (Follow(user_id=user_id, author_id=author_id,
+                        pub_date=now - timedelta(days=rng.uniform(0, days)))
+                 for user_id, author_id in pairs[start:start + BATCH_SIZE]),
+                ignore_conflicts=True,
+            )
+
+    transfer.rebuild_derived()
+    return {
+        'user': len(user_ids),
+        'group': len(group_ids),
+        'post': posts,
+        'comment': comments if posts else 0,
+        'follow': len(pairs),
+    }
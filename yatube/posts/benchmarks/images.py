@@ -0,0 +1,65 @@
+"""Объём картинок ленты: одна миниатюра против вариантов."""
+import io
+import random
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+
+from PIL import Image, ImageFilter, ImageOps
+
+from .. import variants
+
+
+# Клиенты для замера картинок: ширина колонки в CSS-пикселях, плотность
+# пикселей экрана и форматы, которые понимает браузер.
+IMAGE_CLIENTS = {
+    'mobile': (375, 2.0, ('image/avif', 'image/webp', 'image/jpeg')),
+    'mobile-1x': (360, 1.0, ('image/webp', 'image/jpeg')),
+    'desktop': (960, 1.0, ('image/avif', 'image/webp', 'image/jpeg')),
+}
+
+
+def synthetic_photo(width, height, seed):
+    """Картинка, сжимающаяся примерно как фотография: шум и градиент."""
+    rng = random.Random(seed)
+    noise = Image.effect_noise((width, height), rng.randint(20, 60))
+    gradient = Image.linear_gradient('L').resize((width, height))
+    channels = [
+        Image.blend(noise, gradient.rotate(rng.randint(0, 359)), 0.6)
+        .filter(ImageFilter.GaussianBlur(rng.uniform(0.5, 2)))
+        for _ in range(3)
+    ]
+    return Image.merge('RGB', channels)
+
+
+def _single_thumbnail_bytes(image):
+    # Как сейчас отдаёт sorl-thumbnail: 960x339 JPEG с качеством 95.
+    buffer = io.BytesIO()
+    ImageOps.fit(image, variants.ASPECT, Image.LANCZOS).save(
+        buffer, 'JPEG', quality=95)
+    return len(buffer.getvalue())
+
+
+def image_bytes(count=20, size=(1600, 1200), clients=IMAGE_CLIENTS):
+    """Байты картинок ленты: одна миниатюра против вариантов.
+
+    Возвращает {клиент: (байт с одной миниатюрой, байт с вариантами)}
+    в сумме по count картинкам.
+    """
+    totals = {name: [0, 0] for name in clients}
+    with tempfile.TemporaryDirectory() as directory:
+        storage = FileSystemStorage(location=directory)
+        for seed in range(count):
+            image = synthetic_photo(*size, seed)
+            buffer = io.BytesIO()
+            image.save(buffer, 'JPEG', quality=90)
+            name = storage.save(
+                f'photo_{seed}.jpg', ContentFile(buffer.getvalue()))
+            baseline = _single_thumbnail_bytes(image)
+            manifest = variants.build(name, storage=storage)
+            for client, (width, dpr, accept) in clients.items():
+                totals[client][0] += baseline
+                totals[client][1] += variants.pick(
+                    manifest, width, dpr, accept)[2]
+    return {client: tuple(values) for client, values in totals.items()}
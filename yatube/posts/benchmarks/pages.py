@@ -0,0 +1,190 @@
+"""Время ответа, число запросов и память страниц."""
+import statistics
+import time
+import tracemalloc
+
+from core.query_budget import record_queries
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client
+from django.urls import reverse
+
+from ..models import Counter, Group, Post
+from . import percentile
+from .dataset import (create_comments, create_follows, create_posts,
+                      create_users, max_pk)
+
+User = get_user_model()
+
+
+def measure_url(client, url, repeat=20, clear_cache=True, memory=False):
+    """Время ответа (мс) и число SQL-запросов для GET url.
+
+    С memory=True ещё один запрос идёт под tracemalloc, и в результат
+    добавляется пик выделенной памяти в КиБ. Отдельно, чтобы трассировка
+    не искажала время.
+    """
+    timings = []
+    queries = []
+    for _ in range(repeat):
+        if clear_cache:
+            cache.clear()
+        with record_queries() as recorder:
+            start = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - start) * 1000)
+        queries.append(recorder.count)
+        if response.status_code != 200:
+            raise RuntimeError(f'{url}: статус {response.status_code}')
+    result = {
+        'p50': statistics.median(timings),
+        'p95': percentile(timings, 0.95),
+        'p99': percentile(timings, 0.99),
+        'queries': statistics.median(queries),
+    }
+    if memory:
+        if clear_cache:
+            cache.clear()
+        tracemalloc.start()
+        try:
+            client.get(url)
+            result['memory'] = tracemalloc.get_traced_memory()[1] / 1024
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def profile_scaling(sizes, repeat=20, authors=1000, author_posts=25):
+    """Время профиля одного автора при растущей таблице постов.
+
+    Возвращает список (число постов, результат measure_url).
+    """
+    author = User.objects.create_user(username='bench_author')
+    create_posts([author.pk], author_posts)
+    others = create_users(authors)
+    client = Client()
+    url = f'/profile/{author.username}/'
+    results = []
+    current = author_posts
+    for size in sorted(sizes):
+        if size > current:
+            create_posts(others, size - current)
+            current = size
+        results.append((current, measure_url(client, url, repeat)))
+    return results
+
+
+ADMIN_CHANGELISTS = (
+    '/admin/posts/post/',
+    '/admin/posts/comment/',
+    '/admin/posts/follow/',
+    '/admin/posts/follow/?q=bench_1',
+)
+
+
+def admin_changelists(sizes, repeat=5, users=1000):
+    """Время списков Post, Comment и Follow в админке.
+
+    Все три таблицы растут до каждого размера из sizes. Возвращает
+    список (число строк, {url: результат measure_url}).
+    """
+    admin = User.objects.create_superuser(
+        'bench_admin', 'admin@example.com', 'bench')
+    client = Client()
+    client.force_login(admin)
+    user_ids = create_users(users)
+    results = []
+    current = 0
+    for size in sorted(sizes):
+        if size > current:
+            create_posts(user_ids, size - current)
+            post_ids = list(Post.objects.values_list('pk', flat=True)[:1000])
+            create_comments(post_ids, user_ids, size - current)
+            create_follows(user_ids, size - current, skip=current)
+            current = size
+        results.append((current, {
+            url: measure_url(client, url, repeat, clear_cache=False)
+            for url in ADMIN_CHANGELISTS
+        }))
+    return results
+
+
+def _busiest(kind):
+    """Объект с наибольшим значением счётчика kind."""
+    return Counter.objects.filter(kind=kind).order_by(
+        '-value', 'object_id').values_list('object_id', flat=True).first()
+
+
+def page_urls():
+    """Адреса страниц для нагрузочного замера.
+
+    Берутся самые тяжёлые варианты: крупнейшая группа, самый пишущий
+    автор, самый обсуждаемый пост и лента самого активного читателя.
+    Возвращает ({страница: адрес}, id читателя для follow_index).
+    """
+    group = Group.objects.filter(
+        pk=_busiest(Counter.GROUP_POSTS)).values_list('slug', flat=True)
+    author = User.objects.filter(
+        pk=_busiest(Counter.AUTHOR_POSTS)).values_list('username', flat=True)
+    post_id = _busiest(Counter.POST_COMMENTS) or max_pk(Post)
+    reader_id = _busiest(Counter.FOLLOWING)
+    if not (group and author and post_id and reader_id):
+        raise RuntimeError('В базе нет данных для замера')
+    return {
+        'index': reverse('posts:index'),
+        'group_posts': reverse('posts:group_list', args=[group[0]]),
+        'profile': reverse('posts:profile', args=[author[0]]),
+        'post_detail': reverse('posts:post_detail', args=[post_id]),
+        'follow_index': reverse('posts:follow_index'),
+    }, reader_id
+
+
+def load_test(repeat=20, warm=False):
+    """p50/p95/p99, запросы и пик памяти основных страниц.
+
+    По умолчанию кеш страниц очищается перед каждым запросом, то есть
+    меряется построение страницы; с warm=True — ответ из кеша.
+    """
+    urls, reader_id = page_urls()
+    anonymous = Client()
+    reader = Client()
+    reader.force_login(User.objects.get(pk=reader_id))
+    results = {}
+    for page, url in urls.items():
+        client = reader if page == 'follow_index' else anonymous
+        # Первый запрос компилирует шаблоны и в замер не идёт.
+        client.get(url)
+        results[page] = measure_url(
+            client, url, repeat, clear_cache=not warm, memory=True)
+    return results
+
+
+# Метрики, по которым замер сравнивается с сохранённым эталоном.
+COMPARED = ('p50', 'p95', 'p99', 'queries', 'memory')
+# Разница во времени меньше этой (мс) — шум, а не ухудшение.
+NOISE_MS = 2
+
+
+def compare(results, baseline, tolerance=0.2):
+    """Ухудшения относительно эталона.
+
+    Время и память могут вырасти не больше чем в 1 + tolerance раз
+    (время — ещё на NOISE_MS сверху), число запросов не может вырасти
+    вовсе. Возвращает список (страница, метрика, было, стало).
+    """
+    regressions = []
+    for page, result in results.items():
+        before = baseline.get(page, {})
+        for metric in COMPARED:
+            if metric not in before or metric not in result:
+                continue
+            if metric == 'queries':
+                limit = before[metric]
+            elif metric == 'memory':
+                limit = before[metric] * (1 + tolerance)
+            else:
+                limit = before[metric] * (1 + tolerance) + NOISE_MS
+            if result[metric] > limit:
+                regressions.append(
+                    (page, metric, before[metric], result[metric]))
+    return regressions
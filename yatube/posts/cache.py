@@ -0,0 +1,369 @@
+"""Кеш страниц с инвалидацией по поколениям.
+
+У каждой сущности, от которой зависит страница, есть «поколение» —
+число в кеше: общая лента, группа, автор, пост. Сигналы моделей
+увеличивают нужные поколения, а ключ закешированной страницы включает
+текущие поколения всех её зависимостей. Изменение данных даёт новый
+ключ, поэтому страницы можно держать долго и не показывать устаревшее.
+
+Сигналы сдвигают поколения ещё раз после коммита (`bump_on_commit`):
+пока транзакция не зафиксирована, параллельный запрос видит старые
+данные и мог бы сохранить страницу по ним под уже новым поколением.
+"""
+import hashlib
+import math
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+
+from .models import Group, Post, User
+
+FEED = 'feed'
+# Сдвигается при смене имени пользователя или slug группы: тогда
+# запомненные зависимости страниц постов (`post_versions`) устарели.
+RENAMES = 'renames'
+
+# Перерисовка страницы под блокировкой: срок жизни блокировки на случай
+# падения воркера, сколько ждать чужой перерисовки, если старой версии
+# нет, и коэффициент досрочного истечения.
+LOCK_TIMEOUT = 10
+WAIT_TIMEOUT = 2
+WAIT_STEP = 0.05
+EARLY_BETA = 1.0
+
+
+def group_version(slug):
+    return f'version:group:{slug}'
+
+
+def author_version(username):
+    return f'version:author:{username}'
+
+
+def post_version(post_id):
+    return f'version:post:{post_id}'
+
+
+def post_versions(post_id):
+    """Поколения страницы поста: сам пост, его автор и группа.
+
+    Имя автора и slug группы запоминаются в кеше под текущими
+    поколениями поста и RENAMES, так что база читается только после
+    правки поста или переименования.
+    """
+    names = [post_version(post_id), RENAMES]
+    current = get_versions(names)
+    key = f'post-deps:{post_id}:{current[names[0]]}:{current[RENAMES]}'
+    deps = cache.get(key)
+    if deps is None:
+        deps = Post.objects.filter(pk=post_id).values_list(
+            'author__username', 'group__slug').first()
+        if deps is None:
+            return names
+        cache.set(key, deps)
+    username, slug = deps
+    names.append(author_version(username))
+    if slug is not None:
+        names.append(group_version(slug))
+    return names
+
+
+def post_pages(post):
+    """Поколения страниц, на которых виден пост (до и после правки)."""
+    # _saved_* запоминает сигнал post_init в posts.signals.
+    group_ids = {post.group_id, post._saved_group_id} - {None}
+    author_ids = {post.author_id, post._saved_author_id} - {None}
+    slugs = Group.objects.filter(pk__in=group_ids).values_list(
+        'slug', flat=True)
+    usernames = User.objects.filter(pk__in=author_ids).values_list(
+        'username', flat=True)
+    return (
+        [FEED, post_version(post.pk)]
+        + [group_version(slug) for slug in slugs]
+        + [author_version(username) for username in usernames]
+    )
+
+
+def _fresh_version():
+    # Поколение, потерянное при очистке кеша, начинается с текущего
+    # времени, чтобы не совпасть с ключами старых страниц.
+    return time.time_ns() // 1000
+
+
+def get_versions(names):
+    """Текущие поколения: {name: version}, недостающие создаются."""
+    versions = cache.get_many(names)
+    for name in names:
+        if name not in versions:
+            version = _fresh_version()
+            if not cache.add(name, version, timeout=None):
+                version = cache.get(name, version)
+            versions[name] = version
+    return versions
+
+
+def modified_key(name):
+    return f'modified:{name}'
+
+
+def last_modified(names):
+    """Время (unix) последнего сдвига любого из поколений names.
+
+    Если отметки нет — кеш очищали, — отсчёт начинается с текущего
+    момента: клиенты один раз получат ответ целиком.
+    """
+    keys = [modified_key(name) for name in names]
+    stamps = cache.get_many(keys)
+    for key in keys:
+        if key not in stamps:
+            now = time.time()
+            if not cache.add(key, now, timeout=None):
+                now = cache.get(key, now)
+            stamps[key] = now
+    return max(stamps.values())
+
+
+def bump(*names):
+    """Сдвигает поколения: зависящие от них страницы устаревают."""
+    names = set(names)
+    for name in names:
+        try:
+            cache.incr(name)
+        except ValueError:
+            cache.add(name, _fresh_version(), timeout=None)
+    now = time.time()
+    cache.set_many(
+        {modified_key(name): now for name in names}, timeout=None)
+
+
+def bump_on_commit(*names):
+    """bump сейчас и, внутри транзакции, ещё раз после её коммита.
+
+    Первый сдвиг нужен самой транзакции: страницы, которые она читает
+    после записи, не берутся из кеша. Второй убирает страницы, которые
+    другие запросы успели отрисовать до коммита.
+    """
+    bump(*names)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: bump(*names))
+
+
+def _request_id(request, shared=False):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    user = 0 if shared else request.user.pk or 0
+    return f'{path}:{user}'
+
+
+def page_key(request, names, shared=False):
+    versions = get_versions(names)
+    stamp = '.'.join(str(versions[name]) for name in names)
+    return f'page:{_request_id(request, shared)}:{stamp}'
+
+
+def stale_key(request, shared=False):
+    """Последняя отрисованная версия страницы, без учёта поколений."""
+    return f'stale:{_request_id(request, shared)}'
+
+
+def _expires_early(entry):
+    """Вероятностное досрочное истечение (XFetch).
+
+    Чем дольше страница считается и чем ближе срок жизни, тем вероятнее,
+    что один из запросов обновит её заранее, не дожидаясь, пока ключ
+    пропадёт у всех одновременно.
+    """
+    expires, delta = entry[2], entry[3]
+    if expires is None:
+        return False
+    jitter = -delta * EARLY_BETA * math.log(1.0 - random.random())
+    return time.time() + jitter >= expires
+
+
+def _response(entry):
+    return HttpResponse(entry[0], content_type=entry[1])
+
+
+def _wait_for(key):
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_STEP)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def _cacheable(request, response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not (response.cookies and not request.COOKIES)
+    )
+
+
+def _single_flight(request, key, entry, render, shared=False):
+    """Перерисовывает страницу под блокировкой.
+
+    Если блокировку уже взял другой запрос, отдаёт имеющуюся версию:
+    текущую, досрочно истекающую, или последнюю из прошлых поколений.
+    Без единой версии ждёт чужую перерисовку и только потом рисует сам.
+    """
+    lock = f'lock:{key}'
+    if cache.add(lock, 1, LOCK_TIMEOUT):
+        try:
+            return render()
+        finally:
+            cache.delete(lock)
+    stale = False
+    if entry is None:
+        entry = cache.get(stale_key(request, shared))
+        stale = entry is not None
+        entry = entry or _wait_for(key)
+    if entry is not None:
+        response = _response(entry)
+        # Прошлую версию нельзя пометить ETag текущих поколений
+        # (conditional_versioned), иначе клиент застрянет на ней.
+        response.stale = stale
+        return response
+    return render()
+
+
+def cache_versioned(versions, timeout=None, stale_while_revalidate=False,
+                    shared=False):
+    """Кеширует ответ view с ключом из поколений его зависимостей.
+
+    versions(request, *args, **kwargs) возвращает список имён
+    поколений. Страница уникальна для каждого пользователя, потому что
+    шапка сайта персональная, — кроме shared=True: тогда одна копия на
+    всех, а персональные части подставляются позже (posts.personal).
+
+    С stale_while_revalidate страницу после сдвига поколения
+    перерисовывает один запрос — тот, что первым взял блокировку, —
+    а остальные тем временем получают предыдущую версию.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view_func(request, *args, **kwargs)
+            page_timeout = (
+                settings.PAGE_CACHE_TIMEOUT if timeout is None else timeout
+            )
+            key = page_key(
+                request, versions(request, *args, **kwargs), shared)
+
+            def render():
+                started = time.monotonic()
+                response = view_func(request, *args, **kwargs)
+                if not _cacheable(request, response):
+                    return response
+                entry = (
+                    response.content,
+                    response['Content-Type'],
+                    time.time() + page_timeout if page_timeout else None,
+                    time.monotonic() - started,
+                )
+                cache.set(key, entry, page_timeout)
+                if stale_while_revalidate:
+                    cache.set(stale_key(request, shared), entry, page_timeout)
+                return response
+
+            entry = cache.get(key)
+            if not stale_while_revalidate:
+                return render() if entry is None else _response(entry)
+            if entry is not None and not _expires_early(entry):
+                return _response(entry)
+            return _single_flight(request, key, entry, render, shared)
+        return wrapper
+    return decorator
+
+
+def _patch_cache_control(request, response, shared_max_age):
+    """Анонимам — общий кеш прокси, остальным — только браузер.
+
+    Страница без пользователя одинакова для всех анонимов, если при
+    отрисовке не понадобился CSRF-токен и ответ не ставит cookie.
+    """
+    if (
+        request.user.is_authenticated
+        or request.META.get('CSRF_COOKIE_USED')
+        or response.cookies
+    ):
+        patch_cache_control(response, private=True, no_cache=True)
+    else:
+        patch_cache_control(
+            response, public=True, max_age=0, s_maxage=shared_max_age)
+
+
+def _etag(request, names, personal):
+    """Сильный ETag адреса и текущих поколений names."""
+    current = get_versions(names)
+    parts = [request.get_full_path()]
+    parts += [str(current[name]) for name in names]
+    if personal:
+        parts.append(str(request.user.pk or 0))
+    return quote_etag(hashlib.md5('|'.join(parts).encode()).hexdigest())
+
+
+def _http_modified(names):
+    """Last-Modified для поколений names или None.
+
+    HTTP-дата точна до секунды. Пока идёт секунда последнего сдвига, в
+    неё может попасть ещё один, и тот же Last-Modified описал бы другие
+    данные: до её конца ответ сверяется только по ETag.
+    """
+    modified = int(last_modified(names))
+    return modified if time.time() >= modified + 1 else None
+
+
+def conditional_versioned(versions, personal=False, shared_max_age=None):
+    """Сильный ETag и Last-Modified из поколений зависимостей view.
+
+    versions — как у cache_versioned. ETag — хеш адреса (с параметрами
+    запроса) и текущих поколений, поэтому меняется вместе с данными.
+    Если клиент прислал совпадающий If-None-Match (или, без него,
+    If-Modified-Since не раньше последнего сдвига поколений), view не
+    вызывается: ответ 304 без тела, без запросов к базе и без
+    отрисовки. Last-Modified отдаётся, только когда секунда последнего
+    сдвига уже прошла. С personal ответ зависит от пользователя: его id
+    входит в ETag, а ответ получает Vary: Cookie.
+
+    С shared_max_age ответ получает Cache-Control: анонимный — public
+    с s-maxage для прокси (браузер всё равно сверяется по ETag),
+    персональный — private, no-cache.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view_func(request, *args, **kwargs)
+            names = versions(request, *args, **kwargs)
+            etag = _etag(request, names, personal)
+            modified = _http_modified(names)
+            response = get_conditional_response(
+                request, etag=etag, last_modified=modified)
+            if response is None:
+                response = view_func(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+            if personal:
+                patch_vary_headers(response, ('Cookie',))
+            if getattr(response, 'stale', False):
+                patch_cache_control(response, no_cache=True, max_age=0)
+                return response
+            response['ETag'] = etag
+            if modified is not None:
+                response['Last-Modified'] = http_date(modified)
+            if shared_max_age is not None:
+                _patch_cache_control(request, response, shared_max_age)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,160 @@
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from .models import Comment, Counter, Follow, Post
+
+# Откуда берётся истинное значение каждого счётчика:
+# модель и поле, по которому группируются строки.
+SOURCES = {
+    Counter.AUTHOR_POSTS: (Post, 'author_id'),
+    Counter.GROUP_POSTS: (Post, 'group_id'),
+    Counter.POST_COMMENTS: (Comment, 'post_id'),
+    Counter.FOLLOWERS: (Follow, 'author_id'),
+    Counter.FOLLOWING: (Follow, 'user_id'),
+}
+
+
+def count_from_source(kind, object_id):
+    """Честный COUNT(*) по исходной таблице."""
+    model, field = SOURCES[kind]
+    return model.objects.filter(**{field: object_id}).count()
+
+
+def _create_from_source(kind, object_id):
+    counter, _ = Counter.objects.get_or_create(
+        kind=kind,
+        object_id=object_id,
+        defaults={'value': count_from_source(kind, object_id)},
+    )
+    return counter.value
+
+
+def change(kind, object_id, delta):
+    """Сдвигает счётчик на delta в текущей транзакции.
+
+    Если счётчика ещё нет, он создаётся сразу с точным значением из
+    исходной таблицы: изменение, ради которого нас вызвали, в нём уже
+    учтено.
+    """
+    if object_id is None or not delta:
+        return
+    with transaction.atomic():
+        updated = Counter.objects.filter(
+            kind=kind, object_id=object_id
+        ).update(value=F('value') + delta)
+        if not updated:
+            _create_from_source(kind, object_id)
+
+
+def start(kinds, object_id):
+    """Заводит нулевые счётчики нового объекта.
+
+    Тогда первое чтение страницы объекта не считает COUNT(*) и не
+    вставляет счётчики сама, а укладывается в бюджет запросов view.
+    """
+    Counter.objects.bulk_create(
+        [Counter(kind=kind, object_id=object_id, value=0) for kind in kinds],
+        ignore_conflicts=True,
+    )
+
+
+def get_count(kind, object_id):
+    """Значение счётчика за один запрос по первичному ключу."""
+    value = Counter.objects.filter(
+        kind=kind, object_id=object_id
+    ).values_list('value', flat=True).first()
+    if value is None:
+        return _create_from_source(kind, object_id)
+    return value
+
+
+def get_counts(kind, object_ids):
+    """Значения счётчиков для набора объектов: {object_id: value}."""
+    object_ids = set(object_ids)
+    values = dict(
+        Counter.objects.filter(
+            kind=kind, object_id__in=object_ids
+        ).values_list('object_id', 'value')
+    )
+    for object_id in object_ids - set(values):
+        values[object_id] = _create_from_source(kind, object_id)
+    return values
+
+
+def get_many(keys):
+    """Значения разных счётчиков одним запросом.
+
+    keys — пары (kind, object_id); возвращает {(kind, object_id): value}.
+    """
+    keys = set(keys)
+    query = Q()
+    for kind, object_id in keys:
+        query |= Q(kind=kind, object_id=object_id)
+    values = {
+        (kind, object_id): value
+        for kind, object_id, value in Counter.objects.filter(query)
+        .values_list('kind', 'object_id', 'value')
+    } if keys else {}
+    missing = [
+        Counter(kind=kind, object_id=object_id,
+                value=count_from_source(kind, object_id))
+        for kind, object_id in keys - set(values)
+    ]
+    Counter.objects.bulk_create(missing, ignore_conflicts=True)
+    values.update(
+        ((counter.kind, counter.object_id), counter.value)
+        for counter in missing
+    )
+    return values
+
+
+def forget(kind, object_id):
+    """Удаляет счётчик объекта, которого больше нет."""
+    Counter.objects.filter(kind=kind, object_id=object_id).delete()
+
+
+def _actual_values(kind):
+    model, field = SOURCES[kind]
+    return dict(
+        model.objects.exclude(**{field: None})
+        .order_by()
+        .values_list(field)
+        .annotate(total=Count('pk'))
+    )
+
+
+def verify(kinds=None):
+    """Сравнивает счётчики с исходными таблицами.
+
+    Возвращает список расхождений (kind, object_id, stored, actual).
+    Отсутствующий счётчик ошибкой не считается: он будет посчитан
+    при первом чтении.
+    """
+    mismatches = []
+    for kind in kinds or SOURCES:
+        actual = _actual_values(kind)
+        stored = Counter.objects.filter(kind=kind).values_list(
+            'object_id', 'value'
+        )
+        for object_id, stored_value in stored.iterator():
+            actual_value = actual.get(object_id, 0)
+            if stored_value != actual_value:
+                mismatches.append(
+                    (kind, object_id, stored_value, actual_value)
+                )
+    return mismatches
+
+
+def rebuild(kinds=None):
+    """Пересчитывает счётчики с нуля и возвращает число записей."""
+    total = 0
+    for kind in kinds or SOURCES:
+        with transaction.atomic():
+            Counter.objects.filter(kind=kind).delete()
+            counters = [
+                Counter(kind=kind, object_id=object_id, value=value)
+                for object_id, value in _actual_values(kind).items()
+            ]
+            Counter.objects.bulk_create(counters)
+        total += len(counters)
+    return total
@@ -0,0 +1,140 @@
+"""Подписки одним SQL-запросом.
+
+`follow` — INSERT с пропуском конфликта по уникальности (user, author),
+`unfollow` — один DELETE. Повторный запрос ничего не меняет, а
+rowcount сразу говорит, изменилось ли что-нибудь: это и есть сдвиг
+числа подписчиков автора, который функции возвращают. `bulk_follow`
+узнаёт вставленные пары из RETURNING (или по rowcount каждой строки,
+где его нет), так что параллельная подписка не считается дважды.
+
+Всё производное от подписок (счётчики, ленты, поколения страниц)
+обновляют получатели сигнала `follows_changed` в posts.signals; его же
+посылают обычные post_save/post_delete модели Follow, так что способ
+записи подписки на результат не влияет.
+"""
+from django.db import connection, transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import Follow
+
+# Три параметра на строку: пачка укладывается в лимит SQLite в 999.
+BATCH_SIZE = 300
+
+# Аргументы: pairs — список пар (user_id, author_id), delta — +1 для
+# новых подписок, -1 для удалённых.
+follows_changed = Signal()
+
+
+def _insert_sql(rows):
+    ops = connection.ops
+    columns = ', '.join(
+        ops.quote_name(column) for column in ('user_id', 'author_id',
+                                              'pub_date'))
+    values = ', '.join(['(%s, %s, %s)'] * rows)
+    return (
+        f'{ops.insert_statement(ignore_conflicts=True)} '
+        f'{ops.quote_name(Follow._meta.db_table)} ({columns}) '
+        f'VALUES {values} '
+        f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}'
+    ).strip()
+
+
+def _insert(pairs):
+    """Вставляет пары, пропуская существующие; число вставленных."""
+    pub_date = Follow._meta.get_field('pub_date').get_db_prep_save(
+        timezone.now(), connection)
+    params = [
+        value for user_id, author_id in pairs
+        for value in (user_id, author_id, pub_date)
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(_insert_sql(len(pairs)), params)
+        return cursor.rowcount
+
+
+def _supports_returning():
+    if connection.vendor == 'postgresql':
+        return True
+    return (connection.vendor == 'sqlite'
+            and connection.Database.sqlite_version_info >= (3, 35))
+
+
+def _insert_new(pairs):
+    """Вставляет пары; список тех, что действительно вставлены."""
+    if not _supports_returning():
+        return [pair for pair in pairs if _insert([pair])]
+    pub_date = Follow._meta.get_field('pub_date').get_db_prep_save(
+        timezone.now(), connection)
+    params = [
+        value for user_id, author_id in pairs
+        for value in (user_id, author_id, pub_date)
+    ]
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'{_insert_sql(len(pairs))} '
+            f'RETURNING {quote("user_id")}, {quote("author_id")}',
+            params,
+        )
+        return [tuple(row) for row in cursor.fetchall()]
+
+
+def _existing(batch):
+    return set(Follow.objects.filter(
+        user_id__in={user_id for user_id, _ in batch},
+        author_id__in={author_id for _, author_id in batch},
+    ).values_list('user_id', 'author_id'))
+
+
+def follow(user_id, author_id):
+    """Подписывает пользователя на автора; 1, если подписка новая."""
+    if user_id == author_id:
+        return 0
+    with transaction.atomic():
+        delta = _insert([(user_id, author_id)])
+        if delta:
+            follows_changed.send(
+                sender=Follow, pairs=[(user_id, author_id)], delta=1)
+    return delta
+
+
+def unfollow(user_id, author_id):
+    """Отписывает пользователя от автора; -1, если подписка была."""
+    table = connection.ops.quote_name(Follow._meta.db_table)
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {table} WHERE user_id = %s AND author_id = %s',
+                [user_id, author_id],
+            )
+            delta = -cursor.rowcount
+        if delta:
+            follows_changed.send(
+                sender=Follow, pairs=[(user_id, author_id)], delta=-1)
+    return delta
+
+
+def bulk_follow(pairs, batch_size=BATCH_SIZE):
+    """Создаёт подписки из пар (user_id, author_id) пачками.
+
+    Повторы, подписки на себя и уже существующие подписки пропускаются.
+    Возвращает число новых подписок. Предварительная выборка только
+    сокращает INSERT: сигнал получают пары, которые вставил он сам.
+    """
+    pairs = list(dict.fromkeys(
+        (user_id, author_id) for user_id, author_id in pairs
+        if user_id != author_id
+    ))
+    created = 0
+    for start in range(0, len(pairs), batch_size):
+        batch = pairs[start:start + batch_size]
+        with transaction.atomic():
+            existing = _existing(batch)
+            new = [pair for pair in batch if pair not in existing]
+            inserted = _insert_new(new) if new else []
+            if not inserted:
+                continue
+            created += len(inserted)
+            follows_changed.send(sender=Follow, pairs=inserted, delta=1)
+    return created
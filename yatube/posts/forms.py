@@ -1,6 +1,8 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
 from .models import Comment, Post
+from .uploads import sanitize_image
 
 
 class PostForm(forms.ModelForm):
@@ -9,6 +11,32 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('group', 'text', 'image',)
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Файлы, отклонённые ImageUploadHandler, до поля не доходят:
+        # ошибка добавляется в clean().
+        self.upload_errors = {
+            name: upload.upload_error
+            for name, upload in self.files.items()
+            if getattr(upload, 'upload_error', None)
+        }
+        if self.upload_errors:
+            self.files = self.files.copy()
+            for name in self.upload_errors:
+                del self.files[name]
+
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            image = sanitize_image(image)
+        return image
+
+    def clean(self):
+        cleaned_data = super().clean()
+        for name, error in self.upload_errors.items():
+            self.add_error(name, error)
+        return cleaned_data
+
 
 class CommentForm(forms.ModelForm):
 
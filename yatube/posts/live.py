@@ -0,0 +1,171 @@
+"""Живые ленты: новые посты и комментарии через Server-Sent Events.
+
+После коммита сигналы публикуют событие в брокер (core.pubsub) с
+каналами, где его ждут: 'feed' — все посты, 'group:<slug>' — посты
+группы, 'author:<id>' — для ленты подписок, 'post:<id>' — комментарии
+поста. Страница держит EventSource на /live/... и показывает, сколько
+появилось нового, вместо того чтобы перечитываться по таймеру.
+
+Поток живёт LIVE_TIMEOUT секунд и без событий раз в LIVE_HEARTBEAT
+секунд шлёт комментарий-пинг, чтобы прокси не закрывали соединение.
+Браузер переподключается сам с заголовком Last-Event-ID и получает
+пропущенное; если брокер его уже вытеснил или после перезапуска не
+знает такого id — событие reset. Под WSGI
+поток занимает поток сервера, под ASGI (yatube.asgi) ждёт событий в
+цикле событий. Поэтому без LIVE_UPDATES страницы не подписываются, а
+поток отвечает 204: по нему EventSource перестаёт переподключаться.
+"""
+import json
+import time
+
+from core.pubsub import broker
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_GET
+
+from .models import Comment, Follow, Group, Post
+from .serializers import COMMENT_FIELDS, POST_FIELDS, prepare, serialize
+
+# Через сколько миллисекунд браузеру переподключаться после разрыва.
+RETRY_MS = 3000
+
+
+def _publish(queryset, fields, kind, channels):
+    obj = prepare(queryset, list(fields), fields).first()
+    if obj is None:
+        return None
+    return broker().publish(
+        channels(obj), kind, serialize(obj, list(fields), fields))
+
+
+def announce_post(post_id):
+    """Событие о новом посте; пост к этому времени уже в базе."""
+    return _publish(
+        Post.objects.filter(pk=post_id), POST_FIELDS, 'post',
+        lambda post: ['feed', f'author:{post.author_id}'] + (
+            [f'group:{post.group.slug}'] if post.group_id else []),
+    )
+
+
+def announce_comment(comment_id):
+    return _publish(
+        Comment.objects.filter(pk=comment_id), COMMENT_FIELDS, 'comment',
+        lambda comment: [f'post:{comment.post_id}'],
+    )
+
+
+def _message(event):
+    data = json.dumps(event.data, ensure_ascii=False, separators=(',', ':'))
+    return f'id: {event.id}\nevent: {event.kind}\ndata: {data}\n\n'.encode()
+
+
+class LiveStream:
+    """Сообщения SSE для набора каналов, начиная с событий после last_id.
+
+    Итерируется и обычным for (WSGI), и async for через `aiter`.
+    """
+
+    def __init__(self, channels, last_id=None):
+        self.channels = set(channels)
+        self.broker = broker()
+        self.last_id = self.broker.last_id() if last_id is None else last_id
+        now = time.monotonic()
+        self.deadline = now + settings.LIVE_TIMEOUT
+        self.last_sent = now
+
+    def _timeout(self):
+        wake = min(self.deadline, self.last_sent + settings.LIVE_HEARTBEAT)
+        return max(0, wake - time.monotonic())
+
+    def _chunk(self, events, missed):
+        parts = []
+        if events:
+            self.last_id = events[-1].id
+        elif missed:
+            # id клиента новее брокера: счёт начался заново.
+            self.last_id = self.broker.last_id()
+        if missed:
+            parts.append(
+                f'id: {self.last_id}\nevent: reset\ndata: {{}}\n\n'.encode())
+        else:
+            parts.extend(_message(event) for event in events
+                         if self.channels.intersection(event.channels))
+        now = time.monotonic()
+        if not parts and now - self.last_sent >= settings.LIVE_HEARTBEAT:
+            parts.append(b': ping\n\n')
+        if parts:
+            self.last_sent = now
+        return b''.join(parts)
+
+    def __iter__(self):
+        yield f'retry: {RETRY_MS}\n\n'.encode()
+        while time.monotonic() < self.deadline:
+            chunk = self._chunk(
+                *self.broker.wait(self.last_id, self._timeout()))
+            if chunk:
+                yield chunk
+
+    async def aiter(self):
+        yield f'retry: {RETRY_MS}\n\n'.encode()
+        while time.monotonic() < self.deadline:
+            chunk = self._chunk(
+                *await self.broker.wait_async(self.last_id, self._timeout()))
+            if chunk:
+                yield chunk
+
+
+class LiveResponse(StreamingHttpResponse):
+    """Поток событий; core.asgi отдаёт его через async_content."""
+
+    def __init__(self, stream):
+        super().__init__(
+            iter(stream), content_type='text/event-stream; charset=utf-8')
+        self.async_content = stream.aiter
+        self['Cache-Control'] = 'no-cache'
+        # nginx не должен копить поток в буфере.
+        self['X-Accel-Buffering'] = 'no'
+
+
+def _last_event_id(request):
+    # Параметр — для полифилов EventSource, не умеющих заголовок.
+    value = request.META.get(
+        'HTTP_LAST_EVENT_ID', request.GET.get('last_event_id'))
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _stream(request, channels):
+    if not settings.LIVE_UPDATES:
+        return HttpResponse(status=204)
+    return LiveResponse(LiveStream(channels, _last_event_id(request)))
+
+
+@require_GET
+def feed(request):
+    return _stream(request, ['feed'])
+
+
+@require_GET
+def group(request, slug):
+    get_object_or_404(Group.objects.only('pk'), slug=slug)
+    return _stream(request, [f'group:{slug}'])
+
+
+@require_GET
+@login_required
+def follow(request):
+    # Подписки читаются при подключении: после новой подписки её посты
+    # придут, когда браузер переподключится.
+    author_ids = Follow.objects.filter(user=request.user).values_list(
+        'author_id', flat=True)
+    return _stream(request, [f'author:{pk}' for pk in author_ids])
+
+
+@require_GET
+def post(request, post_id):
+    get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    return _stream(request, [f'post:{post_id}'])
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from posts import benchmarks
+from posts.benchmarks import pages
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время списков постов, комментариев и подписок в админке '
+        'при росте таблиц на отдельной тестовой базе.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            nargs='+',
+            type=int,
+            default=[10000, 100000, 1000000],
+            help='Число строк в каждой из таблиц.',
+        )
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with benchmarks.benchmark_database():
+            results = pages.admin_changelists(
+                options['sizes'], repeat=options['repeat'])
+        self.stdout.write(
+            f'{"строк":>8} {"список":<32} {"p50, мс":>9} {"p95, мс":>9} '
+            f'{"запросов":>9}'
+        )
+        for size, by_url in results:
+            for url, result in by_url.items():
+                self.stdout.write(
+                    f'{size:>8} {url:<32} {result["p50"]:>9.2f} '
+                    f'{result["p95"]:>9.2f} {result["queries"]:>9}'
+                )
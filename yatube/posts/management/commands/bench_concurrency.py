@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+
+from posts import benchmarks
+from posts.benchmarks import concurrency, dataset
+
+from .generate_data import add_dataset_arguments, dataset_options
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет отдельную тестовую базу синтетическими данными и '
+        'сравнивает пропускную способность WSGI и ASGI при множестве '
+        'одновременных клиентов.'
+    )
+
+    def add_arguments(self, parser):
+        add_dataset_arguments(parser)
+        parser.add_argument(
+            '--concurrency', type=int, default=50,
+            help='Сколько клиентов шлют запросы одновременно.')
+        parser.add_argument(
+            '--requests', type=int, default=500,
+            help='Сколько запросов в каждом режиме.')
+        parser.add_argument(
+            '--threads', type=int, default=8,
+            help='Потоков сервера, выполняющих view.')
+        parser.add_argument(
+            '--warm', action='store_true',
+            help='Отдавать страницы из кеша, а не строить заново.')
+
+    def handle(self, *args, **options):
+        with benchmarks.benchmark_database():
+            dataset.generate_dataset(**dataset_options(options))
+            results = concurrency.concurrency_test(
+                options['concurrency'], options['requests'],
+                options['threads'], warm=options['warm'])
+
+        self.stdout.write(
+            f'{"режим":<12} {"запр./с":>9} {"p50, мс":>9} '
+            f'{"p95, мс":>9} {"p99, мс":>9}'
+        )
+        for mode, result in results.items():
+            self.stdout.write(
+                f'{mode:<12} {result["rps"]:>9.1f} {result["p50"]:>9.2f} '
+                f'{result["p95"]:>9.2f} {result["p99"]:>9.2f}'
+            )
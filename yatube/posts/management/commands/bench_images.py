@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from posts import variants
+from posts.benchmarks import images
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает объём картинок ленты: одна миниатюра 960x339 против '
+        'вариантов разной ширины и формата.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=20)
+        parser.add_argument(
+            '--size', nargs=2, type=int, default=[1600, 1200],
+            help='Размер исходных картинок.',
+        )
+
+    def handle(self, *args, **options):
+        formats = ', '.join(fmt[0] for fmt in variants.supported_formats())
+        self.stdout.write(f'Форматы вариантов: {formats}')
+        results = images.image_bytes(
+            options['count'], tuple(options['size']))
+        self.stdout.write(
+            f'{"клиент":>10} {"было, КБ":>10} {"стало, КБ":>10} '
+            f'{"экономия":>9}'
+        )
+        for client, (before, after) in results.items():
+            self.stdout.write(
+                f'{client:>10} {before / 1024:>10.1f} {after / 1024:>10.1f} '
+                f'{1 - after / before:>9.0%}'
+            )
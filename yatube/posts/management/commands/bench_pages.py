@@ -0,0 +1,71 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import benchmarks
+from posts.benchmarks import dataset, pages
+
+from .generate_data import add_dataset_arguments, dataset_options
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет отдельную тестовую базу синтетическими данными и '
+        'замеряет главную, группу, профиль, пост и ленту подписок.'
+    )
+
+    def add_arguments(self, parser):
+        add_dataset_arguments(parser)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument(
+            '--warm', action='store_true',
+            help='Не очищать кеш страниц между запросами.')
+        parser.add_argument(
+            '--baseline',
+            help='JSON с эталонным замером: ухудшения будут ошибкой.')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help='Допустимый рост времени и памяти, доля от эталона.')
+        parser.add_argument(
+            '--save', help='Сохранить замер в JSON как новый эталон.')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as stream:
+                baseline = json.load(stream)
+        with benchmarks.benchmark_database():
+            dataset.generate_dataset(**dataset_options(options))
+            results = pages.load_test(
+                options['repeat'], warm=options['warm'])
+
+        self.stdout.write(
+            f'{"страница":<14} {"p50, мс":>9} {"p95, мс":>9} '
+            f'{"p99, мс":>9} {"запросов":>9} {"память, КиБ":>12}'
+        )
+        for page, result in results.items():
+            self.stdout.write(
+                f'{page:<14} {result["p50"]:>9.2f} {result["p95"]:>9.2f} '
+                f'{result["p99"]:>9.2f} {result["queries"]:>9} '
+                f'{result["memory"]:>12.0f}'
+            )
+        if options['save']:
+            with open(options['save'], 'w', encoding='utf-8') as stream:
+                json.dump({
+                    'dataset': dataset_options(options),
+                    'warm': options['warm'],
+                    'results': results,
+                }, stream, indent=2)
+        if baseline is None:
+            return
+        if baseline.get('dataset') != dataset_options(options):
+            self.stdout.write(self.style.WARNING(
+                'Эталон снят на других данных: сравнение приблизительное.'))
+        regressions = pages.compare(
+            results, baseline['results'], options['tolerance'])
+        for page, metric, before, after in regressions:
+            self.stdout.write(self.style.ERROR(
+                f'{page}: {metric} {before:.2f} -> {after:.2f}'))
+        if regressions:
+            raise CommandError(f'Ухудшений: {len(regressions)}')
+        self.stdout.write(self.style.SUCCESS('Ухудшений нет'))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from posts import benchmarks
+from posts.benchmarks import pages
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время страницы профиля при росте таблицы постов '
+        'на отдельной тестовой базе.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            nargs='+',
+            type=int,
+            default=[1000, 10000, 100000, 1000000],
+            help='Размеры таблицы постов.',
+        )
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with benchmarks.benchmark_database():
+            results = pages.profile_scaling(
+                options['sizes'], repeat=options['repeat'])
+        self.stdout.write(
+            f'{"постов":>10} {"p50, мс":>9} {"p95, мс":>9} {"запросов":>9}'
+        )
+        for size, result in results:
+            self.stdout.write(
+                f'{size:>10} {result["p50"]:>9.2f} '
+                f'{result["p95"]:>9.2f} {result["queries"]:>9}'
+            )
@@ -0,0 +1,49 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает группы, посты, комментарии и подписки в NDJSON или CSV, '
+        'по файлу на модель.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Каталог для файлов.')
+        parser.add_argument(
+            '--format', choices=transfer.FORMATS, default='ndjson')
+        parser.add_argument(
+            '--model',
+            action='append',
+            dest='models',
+            choices=list(transfer.EXPORTS),
+            help='Модель; по умолчанию все.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=transfer.BATCH_SIZE,
+            help='Строк на один запрос к базе.',
+        )
+
+    def handle(self, *args, **options):
+        directory = options['directory']
+        fmt = options['format']
+        os.makedirs(directory, exist_ok=True)
+        for name in options['models'] or transfer.EXPORTS:
+            path = os.path.join(directory, transfer.file_name(name, fmt))
+            start = time.perf_counter()
+            with open(path, 'w', encoding='utf-8', newline='') as stream:
+                total = transfer.write_rows(
+                    name,
+                    transfer.export_rows(name, options['batch_size']),
+                    stream, fmt,
+                )
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f'{name}: {total} строк за {elapsed:.1f} с '
+                f'({total / max(elapsed, 1e-6):.0f} строк/с)'
+            )
+        self.stdout.write(self.style.SUCCESS(f'Выгружено в {directory}'))
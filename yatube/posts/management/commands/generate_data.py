@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.benchmarks import dataset
+
+
+def add_dataset_arguments(parser):
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--groups', type=int, default=20)
+    parser.add_argument('--posts', type=int, default=100000)
+    parser.add_argument('--comments', type=int, default=200000)
+    parser.add_argument('--follows', type=int, default=20000)
+    parser.add_argument(
+        '--days', type=int, default=365,
+        help='За сколько дней распределить посты.')
+    parser.add_argument(
+        '--alpha', type=float, default=1.1,
+        help='Показатель закона Ципфа для авторов, групп и подписок.')
+    parser.add_argument('--seed', type=int, default=0)
+
+
+def dataset_options(options):
+    return {
+        name: options[name]
+        for name in ('users', 'groups', 'posts', 'comments', 'follows',
+                     'days', 'alpha', 'seed')
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими пользователями, группами, постами, '
+        'комментариями и подписками.'
+    )
+
+    def add_arguments(self, parser):
+        add_dataset_arguments(parser)
+        parser.add_argument(
+            '--prefix', default='user',
+            help='Начало имён пользователей и адресов групп.')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        created = dataset.generate_dataset(
+            prefix=options['prefix'], **dataset_options(options))
+        elapsed = time.perf_counter() - start
+        total = sum(created.values())
+        for name, count in created.items():
+            self.stdout.write(f'{name}: {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано строк: {total} за {elapsed:.1f} с '
+            f'({total / max(elapsed, 1e-6):.0f} строк/с)'
+        ))
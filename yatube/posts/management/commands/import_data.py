@@ -0,0 +1,69 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает файлы export_data пачками. Прерванная загрузка '
+        'продолжается с контрольной точки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Каталог с файлами.')
+        parser.add_argument(
+            '--format', choices=transfer.FORMATS, default='ndjson')
+        parser.add_argument(
+            '--batch-size', type=int, default=transfer.BATCH_SIZE)
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Забыть контрольную точку и загрузить всё заново.',
+        )
+        parser.add_argument(
+            '--no-rebuild',
+            action='store_true',
+            help='Не пересобирать счётчики, ленты и поисковый индекс.',
+        )
+
+    def handle(self, *args, **options):
+        directory = options['directory']
+        fmt = options['format']
+        if not os.path.isdir(directory):
+            raise CommandError(f'Нет каталога {directory}')
+        checkpoint = transfer.Checkpoint(directory)
+        if options['restart']:
+            checkpoint.clear()
+        for name in transfer.EXPORTS:
+            path = os.path.join(directory, transfer.file_name(name, fmt))
+            if not os.path.exists(path):
+                continue
+            start = time.perf_counter()
+            with open(path, encoding='utf-8', newline='') as stream:
+                try:
+                    loaded, skipped = transfer.import_file(
+                        name, stream, fmt, checkpoint,
+                        options['batch_size'])
+                except transfer.ImportConflict as error:
+                    raise CommandError(str(error))
+            elapsed = time.perf_counter() - start
+            resumed = (
+                f', пропущено по контрольной точке {skipped}'
+                if skipped else ''
+            )
+            self.stdout.write(
+                f'{name}: {loaded} строк за {elapsed:.1f} с '
+                f'({loaded / max(elapsed, 1e-6):.0f} строк/с){resumed}'
+            )
+        if not options['no_rebuild']:
+            start = time.perf_counter()
+            transfer.rebuild_derived()
+            self.stdout.write(
+                'Счётчики, ленты и поисковый индекс пересобраны за '
+                f'{time.perf_counter() - start:.1f} с'
+            )
+        checkpoint.clear()
+        self.stdout.write(self.style.SUCCESS('Загрузка завершена'))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики или сверяет их с БД.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--kind',
+            action='append',
+            choices=sorted(counters.SOURCES),
+            help='Тип счётчика; по умолчанию все.',
+        )
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Только сверить счётчики, ничего не меняя.',
+        )
+
+    def handle(self, *args, **options):
+        kinds = options['kind']
+        if not options['verify']:
+            total = counters.rebuild(kinds)
+            self.stdout.write(self.style.SUCCESS(
+                f'Пересчитано счётчиков: {total}'
+            ))
+            return
+        mismatches = counters.verify(kinds)
+        for kind, object_id, stored, actual in mismatches:
+            self.stdout.write(
+                f'{kind}:{object_id} хранится {stored}, на самом деле {actual}'
+            )
+        if mismatches:
+            raise CommandError(f'Расхождений: {len(mismatches)}')
+        self.stdout.write(self.style.SUCCESS('Счётчики совпадают с БД'))
@@ -0,0 +1,53 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:28
+
+from django.db import migrations, models
+from django.db.models import Count
+
+SOURCES = {
+    'author_posts': ('Post', 'author_id'),
+    'group_posts': ('Post', 'group_id'),
+    'post_comments': ('Comment', 'post_id'),
+    'followers': ('Follow', 'author_id'),
+    'following': ('Follow', 'user_id'),
+}
+
+
+def fill_counters(apps, schema_editor):
+    Counter = apps.get_model('posts', 'Counter')
+    for kind, (model_name, field) in SOURCES.items():
+        model = apps.get_model('posts', model_name)
+        rows = (
+            model.objects.exclude(**{field: None})
+            .order_by()
+            .values_list(field)
+            .annotate(total=Count('pk'))
+        )
+        Counter.objects.bulk_create(
+            Counter(kind=kind, object_id=object_id, value=total)
+            for object_id, total in rows
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0004_follow'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Counter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('author_posts', 'Посты автора'), ('group_posts', 'Посты группы'), ('post_comments', 'Комментарии к посту'), ('followers', 'Подписчики автора'), ('following', 'Подписки пользователя')], max_length=20, verbose_name='Тип счётчика')),
+                ('object_id', models.PositiveIntegerField(verbose_name='Объект')),
+                ('value', models.IntegerField(default=0, verbose_name='Значение')),
+            ],
+            options={
+                'verbose_name': 'Счётчик',
+                'verbose_name_plural': 'Счётчики',
+                'unique_together': {('kind', 'object_id')},
+            },
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
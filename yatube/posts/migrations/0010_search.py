@@ -0,0 +1,74 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:54
+
+from django.db import DatabaseError, migrations, models
+import django.db.models.deletion
+
+FTS_TABLE = 'posts_search'
+
+
+def create_fts_table(apps, schema_editor):
+    # Без FTS5 (другая СУБД или SQLite без расширения) поиск работает
+    # на таблицах SearchTerm и SearchDocument.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5('
+            "text, comments, tokenize = 'unicode61')"
+        )
+    except DatabaseError:
+        return
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def report_unindexed(apps, schema_editor):
+    # Индекс здесь не строится: разбор текста живёт в posts.search и
+    # со временем меняется, а миграция должна давать один и тот же
+    # результат. Существующие посты индексирует rebuild_search.
+    Post = apps.get_model('posts', 'Post')
+    if Post.objects.using(schema_editor.connection.alias).exists():
+        print(
+            '\n  Индекс поиска пуст: постройте его командой '
+            '`manage.py rebuild_search`.'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_post_image_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='posts.Post', verbose_name='Пост')),
+                ('length', models.PositiveIntegerField(verbose_name='Число слов с весами')),
+            ],
+            options={
+                'verbose_name': 'Документ поиска',
+                'verbose_name_plural': 'Документы поиска',
+            },
+        ),
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64, verbose_name='Основа слова')),
+                ('frequency', models.PositiveIntegerField(verbose_name='Частота с весом')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='posts.Post', verbose_name='Пост')),
+            ],
+            options={
+                'verbose_name': 'Слово индекса',
+                'verbose_name_plural': 'Слова индекса',
+                'unique_together': {('term', 'post')},
+            },
+        ),
+        migrations.RunPython(create_fts_table, drop_fts_table),
+        migrations.RunPython(report_unindexed, migrations.RunPython.noop),
+    ]
@@ -2,6 +2,8 @@ from core.models import CreatedModel
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from .storage import post_images
+
 User = get_user_model()
 
 
@@ -38,11 +40,33 @@ class Post(CreatedModel):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
-        blank=True
+        storage=post_images,
+        blank=True,
+        db_index=True
+    )
+    image_variants = models.TextField(
+        'Варианты картинки',
+        blank=True,
+        editable=False,
+        help_text='JSON-манифест, см. posts.variants'
+    )
+    updated = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True,
+        null=True
     )
 
     class Meta:
         ordering = ['-pub_date']
+        # Ленты автора и группы читаются как «посты X от новых к
+        # старым» с pk для равных дат (KeysetPaginator): без pk в индексе
+        # SQLite досортировывает страницу во временном B-дереве.
+        indexes = [
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_date_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_date_idx'),
+        ]
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
 
@@ -72,6 +96,10 @@ class Comment(CreatedModel):
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(fields=['post', '-pub_date', '-id'],
+                         name='comment_post_date_idx'),
+        ]
 
 
 class Follow(CreatedModel):
@@ -91,3 +119,107 @@ class Follow(CreatedModel):
 
     class Meta:
         ordering = ['-pub_date']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'author'],
+                                    name='follow_unique_user_author'),
+        ]
+
+
+class Counter(models.Model):
+    """Денормализованный счётчик: число постов автора, подписчиков и т.д.
+
+    Поддерживается сигналами при сохранении и удалении `Post`, `Comment`
+    и `Follow`, поэтому страницы читают готовое число вместо COUNT(*).
+    """
+    AUTHOR_POSTS = 'author_posts'
+    GROUP_POSTS = 'group_posts'
+    POST_COMMENTS = 'post_comments'
+    FOLLOWERS = 'followers'
+    FOLLOWING = 'following'
+    KIND_CHOICES = (
+        (AUTHOR_POSTS, 'Посты автора'),
+        (GROUP_POSTS, 'Посты группы'),
+        (POST_COMMENTS, 'Комментарии к посту'),
+        (FOLLOWERS, 'Подписчики автора'),
+        (FOLLOWING, 'Подписки пользователя'),
+    )
+
+    kind = models.CharField('Тип счётчика', max_length=20,
+                            choices=KIND_CHOICES)
+    object_id = models.PositiveIntegerField('Объект')
+    value = models.IntegerField('Значение', default=0)
+
+    class Meta:
+        unique_together = ('kind', 'object_id')
+        verbose_name = 'Счётчик'
+        verbose_name_plural = 'Счётчики'
+
+    def __str__(self):
+        return f'{self.kind}:{self.object_id}={self.value}'
+
+
+class TimelineEntry(models.Model):
+    """Запись материализованной ленты подписок пользователя.
+
+    Заполняется при публикации поста (fan-out on write), дата копируется
+    из поста, чтобы лента читалась по индексу (user, -pub_date, -post).
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост'
+    )
+    pub_date = models.DateTimeField('Дата публикации поста')
+
+    class Meta:
+        ordering = ['-pub_date']
+        unique_together = ('user', 'post')
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='timeline_user_date_idx'),
+        ]
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+
+
+class SearchDocument(models.Model):
+    """Длина документа поиска для обратного индекса (posts.search)."""
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='search_document',
+        verbose_name='Пост'
+    )
+    length = models.PositiveIntegerField('Число слов с весами')
+
+    class Meta:
+        verbose_name = 'Документ поиска'
+        verbose_name_plural = 'Документы поиска'
+
+
+class SearchTerm(models.Model):
+    """Запись обратного индекса: основа слова и её частота в посте.
+
+    Используется, только если в базе нет FTS5 (см. posts.search).
+    """
+    term = models.CharField('Основа слова', max_length=64)
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='search_terms',
+        verbose_name='Пост'
+    )
+    frequency = models.PositiveIntegerField('Частота с весом')
+
+    class Meta:
+        unique_together = ('term', 'post')
+        verbose_name = 'Слово индекса'
+        verbose_name_plural = 'Слова индекса'
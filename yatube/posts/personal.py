@@ -0,0 +1,156 @@
+"""Персональные фрагменты страниц в духе ESI.
+
+Страница в кеше (cache_versioned с shared=True) одна на всех
+посетителей: вместо частей, зависящих от пользователя, — шапки,
+вкладок ленты, кнопки подписки, формы комментария с CSRF-токеном — в
+ней стоят метки `{% personal %}`. Перед отдачей метки заменяются
+фрагментами, отрисованными для текущего запроса (`assemble`).
+Собранная страница для анонимов кешируется отдельно, так что
+анонимный трафик обходится совсем без сборки.
+
+Фрагмент — маленький шаблон и функция, готовящая его контекст. Вне
+`shared_page` тег `{% personal %}` просто рисует фрагмент на месте.
+"""
+import base64
+import hashlib
+import json
+import re
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .cache import author_version, cache_versioned, get_versions, page_key
+from .forms import CommentForm
+from .models import Follow
+
+MARKER = re.compile(rb'<!--personal:([A-Za-z0-9_=-]+)-->')
+
+# Имя фрагмента: (шаблон, функция контекста, versions или None).
+FRAGMENTS = {}
+
+
+def fragment(name, template_name, versions=None):
+    """Регистрирует фрагмент name.
+
+    Функция получает request и параметры метки и возвращает контекст
+    шаблона. С versions(request, **params) отрисованный фрагмент
+    кешируется для пользователя до сдвига этих поколений.
+    """
+    def decorator(func):
+        FRAGMENTS[name] = (template_name, func, versions)
+        return func
+    return decorator
+
+
+def render_fragment(request, name, params):
+    template_name, func, versions = FRAGMENTS[name]
+    key = None
+    if versions is not None:
+        names = versions(request, **params)
+        current = get_versions(names)
+        raw = json.dumps(
+            [name, params, request.user.pk, [current[n] for n in names]],
+            sort_keys=True,
+        )
+        key = 'personal:' + hashlib.md5(raw.encode()).hexdigest()
+        html = cache.get(key)
+        if html is not None:
+            return mark_safe(html)
+    html = render_to_string(
+        template_name, func(request, **params), request=request)
+    if key is not None:
+        cache.set(key, html, settings.FRAGMENT_CACHE_TIMEOUT)
+    return mark_safe(html)
+
+
+def marker(name, params):
+    raw = json.dumps([name, params], separators=(',', ':')).encode()
+    encoded = base64.urlsafe_b64encode(raw).decode()
+    return mark_safe(f'<!--personal:{encoded}-->')
+
+
+def assemble(request, content):
+    """Подставляет в страницу фрагменты для текущего запроса."""
+    def replace(match):
+        name, params = json.loads(base64.urlsafe_b64decode(match.group(1)))
+        return render_fragment(request, name, params).encode()
+    return MARKER.sub(replace, content)
+
+
+def anonymous_key(request, names):
+    return 'anonymous:' + page_key(request, names, shared=True)
+
+
+def shared_page(versions, stale_while_revalidate=False):
+    """Общая копия страницы в кеше и сборка её для пользователя.
+
+    versions — как у cache_versioned. Анониму отдаётся готовая
+    собранная копия, если она есть; иначе страница берётся из общего
+    кеша (или рисуется с метками), собирается и, для анонима,
+    сохраняется собранной.
+    """
+    def decorator(view_func):
+        cached_view = cache_versioned(
+            versions, stale_while_revalidate=stale_while_revalidate,
+            shared=True,
+        )(view_func)
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view_func(request, *args, **kwargs)
+            anonymous = not request.user.is_authenticated
+            if anonymous:
+                key = anonymous_key(
+                    request, versions(request, *args, **kwargs))
+                entry = cache.get(key)
+                if entry is not None:
+                    return HttpResponse(entry[0], content_type=entry[1])
+            request.personal_fragments = True
+            response = cached_view(request, *args, **kwargs)
+            if response.status_code != 200 or response.streaming:
+                return response
+            response.content = assemble(request, response.content)
+            if (
+                anonymous
+                and not getattr(response, 'stale', False)
+                and not request.META.get('CSRF_COOKIE_USED')
+                and not response.cookies
+            ):
+                cache.set(
+                    key, (response.content, response['Content-Type']),
+                    settings.PAGE_CACHE_TIMEOUT,
+                )
+            return response
+        return wrapper
+    return decorator
+
+
+@fragment('header', 'includes/header.html')
+def header(request):
+    return {}
+
+
+@fragment('switcher', 'posts/includes/switcher.html')
+def switcher(request):
+    return {}
+
+
+@fragment(
+    'follow_button', 'posts/includes/follow_button.html',
+    versions=lambda request, author: [author_version(author)],
+)
+def follow_button(request, author):
+    following = request.user.is_authenticated and Follow.objects.filter(
+        user=request.user, author__username=author
+    ).exists()
+    return {'author': author, 'following': following}
+
+
+@fragment('post_actions', 'posts/includes/post_actions.html')
+def post_actions(request, post_id):
+    return {'post_id': post_id, 'form': CommentForm()}
@@ -0,0 +1,447 @@
+"""Полнотекстовый поиск по постам и комментариям к ним.
+
+Документ поиска — пост: его текст и тексты всех комментариев. Слова
+приводятся к основе стеммером Snowball для русского языка (`stem`),
+поэтому «котики», «котиков» и «котика» находят друг друга. Основы
+пишутся в индекс, и тот же разбор проходит запрос.
+
+Индекс — виртуальная таблица FTS5 в SQLite (`Fts5Index`). Если FTS5
+нет (другая СУБД или SQLite без расширения), работает обратный индекс
+на обычных таблицах SearchTerm и SearchDocument (`InvertedIndex`), а
+BM25 считается в Python. Выбор — SEARCH_BACKEND: 'auto', 'fts5' или
+'python'; после смены бэкенда, как и после миграции 0010_search на
+базе с постами, индекс строится командой `manage.py rebuild_search`.
+
+Релевантность — BM25, где слова поста весят вдвое больше слов
+комментариев; итог умножается на бонус свежести, убывающий вдвое
+каждые SEARCH_HALF_LIFE_DAYS дней. Индекс поддерживается сигналами
+при сохранении и удалении Post и Comment в той же транзакции. Новый
+или удалённый комментарий меняет документ поста на слова только этого
+комментария (`index_comment`, `unindex_comment`); остальные
+комментарии заново не разбираются.
+"""
+import math
+import re
+from collections import Counter as TermCounter
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Avg, Count, F, Q
+from django.utils import timezone
+
+from .models import Comment, Post, SearchDocument, SearchTerm
+
+FTS_TABLE = 'posts_search'
+
+# Вес слов самого поста относительно слов комментариев.
+TEXT_WEIGHT = 2
+# Параметры BM25, те же, что у bm25() в FTS5.
+K1 = 1.2
+B = 0.75
+# Сколько лучших по BM25 документов пересортировывается по свежести.
+CANDIDATES = 200
+MAX_QUERY_TERMS = 10
+MAX_TERM_LENGTH = 64
+
+WORD = re.compile(r'\w+')
+
+_fts5_databases = {}
+
+VOWELS = 'аеиоуыэюя'
+PERFECTIVE_GERUND = (('в', 'вши', 'вшись'),
+                     ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'))
+ADJECTIVE = (
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем',
+    'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю',
+    'ая', 'яя', 'ою', 'ею',
+)
+PARTICIPLE = (('ем', 'нн', 'вш', 'ющ', 'щ'), ('ивш', 'ывш', 'ующ'))
+REFLEXIVE = ('ся', 'сь')
+VERB = (
+    ('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет',
+     'ют', 'ны', 'ть', 'ешь', 'нно'),
+    ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй',
+     'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят', 'ует', 'уют',
+     'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'),
+)
+NOUN = (
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии',
+    'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам',
+    'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия',
+    'ья', 'я',
+)
+SUPERLATIVE = ('ейше', 'ейш')
+DERIVATIONAL = ('ость', 'ост')
+
+
+def _after_consonant(word, start):
+    # Начало области за первой согласной, стоящей после гласной.
+    for i in range(start + 1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            return i + 1
+    return len(word)
+
+
+def _strip(word, start, endings, after_a=()):
+    """Слово без самого длинного окончания из endings или None.
+
+    Окончание должно целиком лежать в word[start:]; окончаниям из
+    after_a ещё нужна стоящая перед ними «а» или «я».
+    """
+    for ending in sorted(endings + after_a, key=len, reverse=True):
+        cut = len(word) - len(ending)
+        if cut < start or not word.endswith(ending):
+            continue
+        if ending in after_a and ending not in endings and (
+            cut - 1 < start or word[cut - 1] not in 'ая'
+        ):
+            continue
+        return word[:cut]
+    return None
+
+
+def _strip_adjectival(word, start):
+    stripped = _strip(word, start, ADJECTIVE)
+    if stripped is None:
+        return None
+    participle = _strip(stripped, start, PARTICIPLE[1], PARTICIPLE[0])
+    return stripped if participle is None else participle
+
+
+def _strip_inflection(word, rv):
+    stripped = _strip(word, rv, PERFECTIVE_GERUND[1], PERFECTIVE_GERUND[0])
+    if stripped is not None:
+        return stripped
+    word = _strip(word, rv, REFLEXIVE) or word
+    for attempt in (
+        lambda: _strip_adjectival(word, rv),
+        lambda: _strip(word, rv, VERB[1], VERB[0]),
+        lambda: _strip(word, rv, NOUN),
+    ):
+        stripped = attempt()
+        if stripped is not None:
+            return stripped
+    return word
+
+
+def stem(word):
+    """Основа русского слова по алгоритму Snowball.
+
+    Слова не на кириллице возвращаются как есть.
+    """
+    word = word.lower().replace('ё', 'е')
+    rv = next(
+        (i + 1 for i, char in enumerate(word) if char in VOWELS), len(word))
+    if rv == len(word):
+        return word
+    r2 = _after_consonant(word, _after_consonant(word, 0))
+    word = _strip_inflection(word, rv)
+    if word.endswith('и') and len(word) - 1 >= rv:
+        word = word[:-1]
+    word = _strip(word, r2, DERIVATIONAL) or word
+    if word.endswith('нн') and len(word) - 1 >= rv:
+        return word[:-1]
+    superlative = _strip(word, rv, SUPERLATIVE)
+    if superlative is not None:
+        word = superlative
+        return word[:-1] if word.endswith('нн') else word
+    if word.endswith('ь') and len(word) - 1 >= rv:
+        return word[:-1]
+    return word
+
+
+def terms(text):
+    """Основы слов текста в порядке следования."""
+    return [
+        stem(word)[:MAX_TERM_LENGTH]
+        for word in WORD.findall(text.lower())
+    ]
+
+
+def query_terms(query):
+    """Различные основы слов запроса, не больше MAX_QUERY_TERMS."""
+    return list(dict.fromkeys(terms(query)))[:MAX_QUERY_TERMS]
+
+
+class Fts5Index:
+    """Индекс в виртуальной таблице FTS5: колонки text и comments."""
+
+    @staticmethod
+    def is_available():
+        # Таблицу создаёт миграция, если SQLite собран с FTS5; ответ
+        # запоминается для каждой базы.
+        if connection.vendor != 'sqlite':
+            return False
+        name = connection.settings_dict['NAME']
+        if name not in _fts5_databases:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' "
+                    'AND name = %s', [FTS_TABLE])
+                _fts5_databases[name] = cursor.fetchone() is not None
+        return _fts5_databases[name]
+
+    def add(self, post_id, text, comments):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id])
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, text, comments) '
+                'VALUES (%s, %s, %s)',
+                [post_id, ' '.join(terms(text)),
+                 ' '.join(terms(' '.join(comments)))],
+            )
+
+    def add_comment(self, post_id, text):
+        """Дописывает слова комментария; False, если поста нет в индексе."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {FTS_TABLE} SET comments = ltrim(comments || ' ' "
+                '|| %s) WHERE rowid = %s',
+                [' '.join(terms(text)), post_id],
+            )
+            return cursor.rowcount > 0
+
+    def remove_comment(self, post_id, text):
+        """Убирает слова комментария; False, если поста нет в индексе."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT comments FROM {FTS_TABLE} WHERE rowid = %s',
+                [post_id])
+            row = cursor.fetchone()
+            if row is None:
+                return False
+            # Порядок слов для BM25 не важен: вычитаются частоты.
+            left = TermCounter(row[0].split()) - TermCounter(terms(text))
+            cursor.execute(
+                f'UPDATE {FTS_TABLE} SET comments = %s WHERE rowid = %s',
+                [' '.join(left.elements()), post_id],
+            )
+        return True
+
+    def remove(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+
+    def match(self, query_terms, limit):
+        # Все слова обязательны; последнее ищется и как префикс, чтобы
+        # находились недописанные слова.
+        quoted = [f'"{term}"' for term in query_terms]
+        quoted[-1] += '*'
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, -bm25({FTS_TABLE}, %s, 1.0) '
+                f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                f'ORDER BY bm25({FTS_TABLE}, %s, 1.0) LIMIT %s',
+                [float(TEXT_WEIGHT), ' '.join(quoted),
+                 float(TEXT_WEIGHT), limit],
+            )
+            return cursor.fetchall()
+
+
+class InvertedIndex:
+    """Обратный индекс на таблицах SearchTerm и SearchDocument.
+
+    Частота слова в документе хранится уже с весом: слово из текста
+    поста считается TEXT_WEIGHT раз.
+    """
+
+    @staticmethod
+    def is_available():
+        return True
+
+    def add(self, post_id, text, comments):
+        frequencies = TermCounter()
+        for term in terms(text):
+            frequencies[term] += TEXT_WEIGHT
+        frequencies.update(terms(' '.join(comments)))
+        self.remove(post_id)
+        SearchDocument.objects.create(
+            post_id=post_id, length=sum(frequencies.values()))
+        SearchTerm.objects.bulk_create(
+            SearchTerm(term=term, post_id=post_id, frequency=frequency)
+            for term, frequency in frequencies.items()
+        )
+
+    def _shift(self, post_id, frequencies, sign):
+        """Сдвигает частоты слов поста; False, если поста нет в индексе."""
+        if not SearchDocument.objects.filter(post_id=post_id).update(
+            length=F('length') + sign * sum(frequencies.values())
+        ):
+            return False
+        posting = SearchTerm.objects.filter(post_id=post_id)
+        known = set(posting.filter(term__in=frequencies).values_list(
+            'term', flat=True))
+        by_frequency = {}
+        for term in known:
+            by_frequency.setdefault(frequencies[term], []).append(term)
+        for frequency, group in by_frequency.items():
+            posting.filter(term__in=group).update(
+                frequency=F('frequency') + sign * frequency)
+        if sign > 0:
+            SearchTerm.objects.bulk_create(
+                SearchTerm(term=term, post_id=post_id, frequency=frequency)
+                for term, frequency in frequencies.items()
+                if term not in known
+            )
+        else:
+            posting.filter(term__in=known, frequency__lte=0).delete()
+        return True
+
+    def add_comment(self, post_id, text):
+        return self._shift(post_id, TermCounter(terms(text)), 1)
+
+    def remove_comment(self, post_id, text):
+        return self._shift(post_id, TermCounter(terms(text)), -1)
+
+    def remove(self, post_id):
+        SearchTerm.objects.filter(post_id=post_id).delete()
+        SearchDocument.objects.filter(post_id=post_id).delete()
+
+    def clear(self):
+        SearchTerm.objects.all().delete()
+        SearchDocument.objects.all().delete()
+
+    @staticmethod
+    def _lookup(query_terms):
+        # Последнее слово, как и в FTS5, ищется ещё и как префикс.
+        *head, last = query_terms
+        return Q(term__in=head) | Q(term__startswith=last), set(head), last
+
+    def _postings(self, query_terms):
+        """{post_id: {слово запроса: частота}} для всех найденных постов."""
+        lookup, head, last = self._lookup(query_terms)
+        postings = {}
+        rows = SearchTerm.objects.filter(lookup).values_list(
+            'term', 'post_id', 'frequency')
+        for term, post_id, frequency in rows:
+            key = term if term in head else last
+            frequencies = postings.setdefault(post_id, TermCounter())
+            frequencies[key] += frequency
+        return postings
+
+    def match(self, query_terms, limit):
+        postings = self._postings(query_terms)
+        document_frequency = TermCounter(
+            term for frequencies in postings.values() for term in frequencies
+        )
+        # Все слова обязательны, как и в FTS5.
+        found = {
+            post_id: frequencies
+            for post_id, frequencies in postings.items()
+            if len(frequencies) == len(query_terms)
+        }
+        if not found:
+            return []
+        lengths = dict(SearchDocument.objects.filter(
+            post_id__in=SearchTerm.objects.filter(
+                self._lookup(query_terms)[0]).values('post_id')
+        ).values_list('post_id', 'length'))
+        stats = SearchDocument.objects.aggregate(
+            total=Count('pk'), average=Avg('length'))
+        total, average = stats['total'], stats['average'] or 1
+        scores = []
+        for post_id, frequencies in found.items():
+            norm = K1 * (1 - B + B * lengths.get(post_id, 0) / average)
+            score = sum(
+                _idf(total, document_frequency[term])
+                * frequency * (K1 + 1) / (frequency + norm)
+                for term, frequency in frequencies.items()
+            )
+            scores.append((post_id, score))
+        scores.sort(key=lambda item: item[1], reverse=True)
+        return scores[:limit]
+
+
+def _idf(total, frequency):
+    return math.log(1 + (total - frequency + 0.5) / (frequency + 0.5))
+
+
+def get_index():
+    """Индекс, выбранный настройкой SEARCH_BACKEND."""
+    backend = settings.SEARCH_BACKEND
+    if backend == 'fts5' or (backend == 'auto' and Fts5Index.is_available()):
+        return Fts5Index()
+    return InvertedIndex()
+
+
+def index_post(post_id):
+    """Переиндексирует пост вместе с его комментариями."""
+    text = Post.objects.filter(pk=post_id).values_list(
+        'text', flat=True).first()
+    index = get_index()
+    if text is None:
+        index.remove(post_id)
+        return
+    comments = Comment.objects.filter(post_id=post_id).values_list(
+        'text', flat=True)
+    index.add(post_id, text, list(comments))
+
+
+def index_comment(post_id, text):
+    """Добавляет в документ поста слова нового комментария."""
+    if not get_index().add_comment(post_id, text):
+        # Поста ещё нет в индексе: документ строится целиком.
+        index_post(post_id)
+
+
+def unindex_comment(post_id, text):
+    """Убирает из документа поста слова удалённого комментария."""
+    if not get_index().remove_comment(post_id, text):
+        index_post(post_id)
+
+
+def remove_post(post_id):
+    get_index().remove(post_id)
+
+
+def rebuild():
+    """Строит индекс заново; возвращает число проиндексированных постов."""
+    index = get_index()
+    index.clear()
+    comments = {}
+    for post_id, text in Comment.objects.order_by().values_list(
+        'post_id', 'text'
+    ).iterator():
+        comments.setdefault(post_id, []).append(text)
+    total = 0
+    for post_id, text in Post.objects.order_by().values_list(
+        'pk', 'text'
+    ).iterator():
+        index.add(post_id, text, comments.get(post_id, []))
+        total += 1
+    return total
+
+
+def freshness(pub_date, now):
+    """Бонус свежести: 1 для нового поста, вдвое меньше каждый период."""
+    age = (now - pub_date).total_seconds() / 86400
+    return 0.5 ** (max(age, 0) / settings.SEARCH_HALF_LIFE_DAYS)
+
+
+def search(query, limit=None):
+    """id постов по запросу, от самых релевантных и свежих."""
+    limit = limit or settings.SEARCH_RESULTS
+    words = query_terms(query)
+    if not words:
+        return []
+    matches = get_index().match(words, CANDIDATES)
+    if not matches:
+        return []
+    dates = dict(Post.objects.filter(
+        pk__in=[post_id for post_id, _ in matches]
+    ).values_list('pk', 'pub_date'))
+    now = timezone.now()
+    ranked = sorted(
+        (
+            (score * (1 + freshness(dates[post_id], now)), post_id)
+            for post_id, score in matches if post_id in dates
+        ),
+        reverse=True,
+    )
+    return [post_id for _, post_id in ranked[:limit]]
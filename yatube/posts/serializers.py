@@ -0,0 +1,73 @@
+"""Компактные JSON-представления постов и комментариев.
+
+Каждое поле описано один раз: какие колонки оно читает из базы и как
+получить значение из объекта. Клиент выбирает подмножество полей
+параметром fields=, и запрос читает только нужные колонки (only()) и
+присоединяет только нужные таблицы (select_related()).
+"""
+
+# Поле: (колонки для only(), функция объект -> значение).
+POST_FIELDS = {
+    'id': ((), lambda post: post.pk),
+    'text': (('text',), lambda post: post.text),
+    'author': (('author__username',), lambda post: post.author.username),
+    'group': (
+        ('group__slug',),
+        lambda post: post.group.slug if post.group_id else None,
+    ),
+    'pub_date': (('pub_date',), lambda post: post.pub_date.isoformat()),
+    'image': (
+        ('image',),
+        lambda post: post.image.url if post.image else None,
+    ),
+}
+
+COMMENT_FIELDS = {
+    'id': ((), lambda comment: comment.pk),
+    'post': (('post_id',), lambda comment: comment.post_id),
+    'text': (('text',), lambda comment: comment.text),
+    'author': (
+        ('author__username',),
+        lambda comment: comment.author.username,
+    ),
+    'pub_date': (
+        ('pub_date',),
+        lambda comment: comment.pub_date.isoformat(),
+    ),
+}
+
+
+def select_fields(requested, available):
+    """Имена полей из параметра fields=id,text; без него — все поля.
+
+    Неизвестное имя — ValueError.
+    """
+    if not requested:
+        return list(available)
+    names = list(dict.fromkeys(
+        name.strip() for name in requested.split(',') if name.strip()))
+    unknown = [name for name in names if name not in available]
+    if unknown or not names:
+        raise ValueError(', '.join(unknown))
+    return names
+
+
+def prepare(queryset, fields, available):
+    """Ограничивает queryset колонками выбранных полей.
+
+    pk и pub_date читаются всегда: по ним строится курсор страницы.
+    """
+    columns = {'pk', 'pub_date'}
+    related = set()
+    for name in fields:
+        for column in available[name][0]:
+            columns.add(column)
+            if '__' in column:
+                related.add(column.split('__')[0])
+    queryset = queryset.select_related(*related) if related else (
+        queryset.select_related(None))
+    return queryset.only(*columns, *related)
+
+
+def serialize(obj, fields, available):
+    return {name: available[name][1](obj) for name in fields}
@@ -0,0 +1,283 @@
+import threading
+from collections import Counter as TallyCounter
+
+from django.db import transaction
+from django.db.models.signals import (post_delete, post_init, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from django.contrib.auth import get_user_model
+
+from . import (counters, follows, live, search, storage, thumbnails,
+               timeline)
+from .cache import (RENAMES, author_version, bump_on_commit, group_version,
+                    post_pages, post_version)
+from .models import Comment, Counter, Follow, Group, Post
+
+User = get_user_model()
+
+USER_COUNTERS = (Counter.AUTHOR_POSTS, Counter.FOLLOWERS, Counter.FOLLOWING)
+
+_local = threading.local()
+
+
+def _deleting_posts():
+    if not hasattr(_local, 'deleting_posts'):
+        _local.deleting_posts = set()
+    return _local.deleting_posts
+
+
+@receiver(post_init, sender=Post)
+def remember_post_relations(sender, instance, **kwargs):
+    # Запоминаем автора и группу из БД, чтобы при сохранении знать,
+    # с каких счётчиков пост нужно снять. Через __dict__, чтобы
+    # отложенное поле не вызывало лишний запрос.
+    instance._saved_author_id = instance.__dict__.get('author_id')
+    instance._saved_group_id = instance.__dict__.get('group_id')
+    image = instance.__dict__.get('image')
+    instance._saved_image = getattr(image, 'name', image) or None
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.change(Counter.AUTHOR_POSTS, instance.author_id, 1)
+        counters.change(Counter.GROUP_POSTS, instance.group_id, 1)
+    else:
+        if instance._saved_author_id != instance.author_id:
+            counters.change(
+                Counter.AUTHOR_POSTS, instance._saved_author_id, -1)
+            counters.change(Counter.AUTHOR_POSTS, instance.author_id, 1)
+        if instance._saved_group_id != instance.group_id:
+            counters.change(
+                Counter.GROUP_POSTS, instance._saved_group_id, -1)
+            counters.change(Counter.GROUP_POSTS, instance.group_id, 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.change(Counter.AUTHOR_POSTS, instance.author_id, -1)
+    counters.change(Counter.GROUP_POSTS, instance.group_id, -1)
+    counters.forget(Counter.POST_COMMENTS, instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change(Counter.POST_COMMENTS, instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.change(Counter.POST_COMMENTS, instance.post_id, -1)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def relay_saved_follow(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        follows.follows_changed.send(
+            sender=Follow, pairs=[(instance.user_id, instance.author_id)],
+            delta=1)
+
+
+@receiver(post_delete, sender=Follow)
+def relay_deleted_follow(sender, instance, **kwargs):
+    follows.follows_changed.send(
+        sender=Follow, pairs=[(instance.user_id, instance.author_id)],
+        delta=-1)
+
+
+@receiver(follows.follows_changed)
+def apply_follow_changes(sender, pairs, delta, **kwargs):
+    """Счётчики, ленты и страницы профилей после изменения подписок."""
+    # Счётчики первыми: timeline смотрит на число подписчиков автора.
+    for kind, side in ((Counter.FOLLOWERS, 1), (Counter.FOLLOWING, 0)):
+        for object_id, total in TallyCounter(
+            pair[side] for pair in pairs
+        ).items():
+            counters.change(kind, object_id, delta * total)
+    for user_id, author_id in pairs:
+        if delta > 0:
+            timeline.backfill(user_id, author_id)
+        else:
+            timeline.drop(user_id, author_id)
+    if delta < 0:
+        for author_id, total in TallyCounter(
+            author_id for _, author_id in pairs
+        ).items():
+            timeline.followers_dropped(author_id, total)
+    user_ids = {user_id for pair in pairs for user_id in pair}
+    usernames = User.objects.filter(pk__in=user_ids).values_list(
+        'username', flat=True)
+    bump_on_commit(*(author_version(username) for username in usernames))
+
+
+@receiver(post_save, sender=Group)
+def start_group_counters(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.start([Counter.GROUP_POSTS], instance.pk)
+
+
+@receiver(post_save, sender=User)
+def start_user_counters(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.start(USER_COUNTERS, instance.pk)
+
+
+@receiver(post_delete, sender=Group)
+def forget_group_counters(sender, instance, **kwargs):
+    counters.forget(Counter.GROUP_POSTS, instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def forget_user_counters(sender, instance, **kwargs):
+    for kind in USER_COUNTERS:
+        counters.forget(kind, instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def schedule_thumbnail(sender, instance, raw=False, **kwargs):
+    # Миниатюра строится после коммита: воркер читает пост из базы.
+    image = instance.image.name or None
+    if raw or image is None or image == instance._saved_image:
+        return
+    post_id = instance.pk
+    transaction.on_commit(lambda: thumbnails.schedule(post_id, image))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def release_image(sender, instance, raw=False, **kwargs):
+    # Удалённый пост или заменённая картинка: файл удаляется, только
+    # если на него больше не ссылается ни один пост (posts.storage).
+    if raw:
+        return
+    if kwargs['signal'] is post_delete:
+        image = instance.image.name or None
+    else:
+        image = instance._saved_image
+        if image == (instance.image.name or None):
+            return
+    if image is not None:
+        transaction.on_commit(lambda: storage.release(image))
+
+
+@receiver(post_save, sender=Post)
+def index_saved_post(sender, instance, raw=False, update_fields=None,
+                     **kwargs):
+    # Сохранение служебных полей (варианты картинки) текст не меняет.
+    if raw or (update_fields is not None and 'text' not in update_fields):
+        return
+    search.index_post(instance.pk)
+
+
+@receiver(pre_delete, sender=Post)
+def hold_post_index(sender, instance, **kwargs):
+    # Комментарии удаляемого поста удаляются раньше него: без этой
+    # отметки пост переиндексировался бы после каждого из них.
+    _deleting_posts().add(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_deleted_post(sender, instance, **kwargs):
+    _deleting_posts().discard(instance.pk)
+    search.remove_post(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def index_saved_comment(sender, instance, created, raw=False, **kwargs):
+    if raw or instance.post_id in _deleting_posts():
+        return
+    if created:
+        search.index_comment(instance.post_id, instance.text)
+    else:
+        # Прежний текст правленого комментария неизвестен.
+        search.index_post(instance.post_id)
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_deleted_comment(sender, instance, **kwargs):
+    if instance.post_id not in _deleting_posts():
+        search.unindex_comment(instance.post_id, instance.text)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def bump_post_versions(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump_on_commit(*post_pages(instance))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def bump_comment_versions(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump_on_commit(post_version(instance.post_id))
+
+
+@receiver(post_init, sender=Group)
+def remember_group_slug(sender, instance, **kwargs):
+    instance._saved_slug = instance.__dict__.get('slug')
+
+
+@receiver(post_init, sender=User)
+def remember_username(sender, instance, **kwargs):
+    instance._saved_username = instance.__dict__.get('username')
+
+
+def _renamed(old, new, version):
+    """Поколения страниц под прежним и новым именем."""
+    if old is None or old == new:
+        return [version(new)]
+    # Страницы постов помнят имя в зависимостях (cache.post_versions).
+    return [version(old), version(new), RENAMES]
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def bump_group_versions(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump_on_commit(*_renamed(
+            instance._saved_slug, instance.slug, group_version))
+        instance._saved_slug = instance.slug
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def bump_user_versions(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump_on_commit(*_renamed(
+            instance._saved_username, instance.username, author_version))
+        instance._saved_username = instance.username
+
+
+@receiver(post_save, sender=Post)
+def announce_post(sender, instance, created, raw=False, **kwargs):
+    # После коммита: получив событие, клиент перечитает страницу.
+    if created and not raw:
+        post_id = instance.pk
+        transaction.on_commit(lambda: live.announce_post(post_id))
+
+
+@receiver(post_save, sender=Comment)
+def announce_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        comment_id = instance.pk
+        transaction.on_commit(lambda: live.announce_comment(comment_id))
+
+
+# Подключается последним: остальные обработчики post_save уже видели
+# прежние автора и группу поста.
+@receiver(post_save, sender=Post)
+def forget_saved_relations(sender, instance, **kwargs):
+    instance._saved_author_id = instance.author_id
+    instance._saved_group_id = instance.group_id
+    instance._saved_image = instance.image.name or None
@@ -0,0 +1,165 @@
+"""Хранилище картинок постов с адресацией по содержимому.
+
+Имя файла — SHA-256 его содержимого: posts/ab/abcdef….jpg. Одна и та
+же картинка, загруженная разными пользователями, хранится один раз, а
+миниатюры sorl-thumbnail и варианты (posts.variants) строятся от имени
+файла и поэтому тоже общие.
+
+Ссылки на файл — это строки Post с таким значением image. Файл и всё
+производное от него удаляет `release`, когда ссылок не осталось;
+то, что пропустили (например, после падения процесса), подбирает
+команда `manage.py gc_media`.
+
+Дубликат при загрузке не пишется, а только обновляет дату изменения
+файла, и его пост ссылается на файл лишь после коммита. Поэтому
+`release` сначала переименовывает файл (после этого `save` запишет его
+заново), затем ещё раз проверяет ссылки и возраст и только потом
+удаляет; свежий файл возвращается на место.
+"""
+import hashlib
+import os
+import time
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.utils.deconstruct import deconstructible
+
+# Файл моложе стольких секунд release не удаляет: его только что
+# загрузили заново, и пост с ним может быть ещё не сохранён.
+RELEASE_MIN_AGE = 60
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def content_name(self, name, content):
+        """Имя по SHA-256 содержимого; файл читается по кускам."""
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        hexdigest = digest.hexdigest()
+        return os.path.join(
+            directory, hexdigest[:2], hexdigest + extension
+        ).replace('\\', '/')
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.content_name(name, content)
+        try:
+            # Дубликат: свежая дата изменения защищает файл от release
+            # и сборки мусора, пока пост с ним ещё не сохранён.
+            os.utime(self.path(name))
+            return name
+        except FileNotFoundError:
+            # Файла нет или его как раз забрал release.
+            return self._save(name, content)
+
+
+post_images = ContentAddressedStorage()
+
+
+def is_referenced(name):
+    from .models import Post
+    return Post.objects.filter(image=name).exists()
+
+
+def release(name, min_age=RELEASE_MIN_AGE):
+    """Удаляет картинку, её миниатюры и варианты, если она не нужна.
+
+    Вызывается после коммита. Файлы моложе min_age секунд не трогаются:
+    их подберёт gc_media. Возвращает True, если файл удалён.
+    """
+    if not name or is_referenced(name):
+        return False
+    try:
+        path = post_images.path(name)
+    except SuspiciousFileOperation:
+        # Путь вне MEDIA_ROOT, например из фикстуры, — файл не наш.
+        return False
+    released = f'{path}.released'
+    try:
+        os.rename(path, released)
+    except FileNotFoundError:
+        return False
+    # Пока файл был на месте, его могли загрузить заново и сослаться
+    # на него.
+    if (
+        is_referenced(name)
+        or time.time() - os.path.getmtime(released) < min_age
+    ):
+        os.replace(released, path)
+        return False
+    os.remove(released)
+    if post_images.exists(name):
+        # Картинку уже загрузили заново, производные ей нужны.
+        return True
+    from sorl.thumbnail import delete as delete_thumbnails
+    from sorl.thumbnail.images import ImageFile
+
+    from . import variants
+    delete_thumbnails(ImageFile(name, post_images), delete_file=False)
+    variants.delete_for(name)
+    return True
+
+
+def walk(storage, directory):
+    """Имена всех файлов в directory хранилища, рекурсивно."""
+    if not storage.exists(directory):
+        return
+    directories, files = storage.listdir(directory)
+    for file_name in files:
+        yield f'{directory}/{file_name}'
+    for subdirectory in directories:
+        yield from walk(storage, f'{directory}/{subdirectory}')
+
+
+def _is_old(storage, name, min_age):
+    modified = storage.get_modified_time(name).timestamp()
+    return time.time() - modified >= min_age
+
+
+def collect_garbage(min_age=60 * 60, dry_run=False):
+    """Удаляет картинки и варианты, на которые не ссылается ни один пост.
+
+    Файлы моложе min_age секунд не трогаются: их пост может быть ещё
+    не сохранён. Возвращает (число файлов, байт).
+    """
+    from . import variants
+    from .models import Post
+    images = set()
+    variant_names = set()
+    rows = Post.objects.exclude(image='').values_list(
+        'image', 'image_variants')
+    for image, manifest in rows.iterator():
+        images.add(image)
+        variant_names.update(variants.names_in(variants.loads(manifest)))
+        variant_names.update(variants.names_for(image))
+    orphans = [
+        (post_images, name) for name in walk(post_images, 'posts')
+        if not name.startswith(variants.DIRECTORY + '/')
+        and name not in images
+    ] + [
+        (default_storage, name)
+        for name in walk(default_storage, variants.DIRECTORY)
+        if name not in variant_names
+    ]
+    files = size = 0
+    for storage, name in orphans:
+        if not _is_old(storage, name, min_age):
+            continue
+        files += 1
+        size += storage.size(name)
+        if dry_run:
+            continue
+        if storage is post_images:
+            release(name, min_age)
+        else:
+            storage.delete(name)
+    return files, size
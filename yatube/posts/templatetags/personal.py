@@ -0,0 +1,18 @@
+from django import template
+
+from posts.personal import marker, render_fragment
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def personal(context, name, **params):
+    """Персональный фрагмент name (posts.personal).
+
+    На странице из общего кеша — метка, которую заполнит сборка; на
+    остальных страницах фрагмент рисуется сразу.
+    """
+    request = context.get('request')
+    if getattr(request, 'personal_fragments', False):
+        return marker(name, params)
+    return render_fragment(request, name, params)
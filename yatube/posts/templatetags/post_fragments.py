@@ -0,0 +1,51 @@
+# posts/templatetags/post_fragments.py
+import hashlib
+
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+register = template.Library()
+
+POST_TEMPLATE = 'includes/post.html'
+
+
+def fragment_key(post, template_name):
+    """Ключ фрагмента меняется при любой правке поста.
+
+    Кроме даты изменения в ключ входят имя автора и slug группы,
+    которые тоже выводятся во фрагменте.
+    """
+    version = post.updated or post.pub_date
+    group_slug = post.group.slug if post.group_id else ''
+    raw = (
+        f'{template_name}:{post.pk}:{version.timestamp() if version else 0}'
+        f':{post.author.username}:{group_slug}'
+    )
+    return 'post_fragment:' + hashlib.md5(raw.encode()).hexdigest()
+
+
+@register.simple_tag
+def post_fragments(posts, template_name=POST_TEMPLATE):
+    """Готовый HTML карточек постов из кеша, по фрагменту на пост.
+
+    Все карточки страницы читаются одним get_many, недостающие
+    рендерятся и сохраняются одним set_many. Карточка не зависит от
+    пользователя, поэтому общая для всех лент и всех читателей.
+    """
+    posts = list(posts)
+    keys = [fragment_key(post, template_name) for post in posts]
+    cached = cache.get_many(keys)
+    missing = {}
+    fragments = []
+    for key, post in zip(keys, posts):
+        if key not in cached:
+            cached[key] = missing[key] = render_to_string(
+                template_name, {'post': post, 'link': True}
+            )
+        fragments.append(mark_safe(cached[key]))
+    if missing:
+        cache.set_many(missing, settings.FRAGMENT_CACHE_TIMEOUT)
+    return fragments
@@ -0,0 +1,19 @@
+# posts/templatetags/post_images.py
+from django import template
+
+from .. import variants
+from ..thumbnails import POST_GEOMETRY, cached_thumbnail
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_thumbnail(image, geometry=POST_GEOMETRY):
+    """Готовая миниатюра картинки поста или None, пока её строит пул."""
+    return cached_thumbnail(image, geometry)
+
+
+@register.simple_tag
+def post_sources(post):
+    """[(MIME-тип, srcset), ...] для <picture> по манифесту вариантов."""
+    return variants.srcsets(variants.loads(post.image_variants))
@@ -0,0 +1,73 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from core.changelist import ApproximateCountPaginator
+from core.query_budget import record_queries
+from core.testing import QueryBudgetMixin
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+CHANGELISTS = (
+    '/admin/posts/post/',
+    '/admin/posts/comment/',
+    '/admin/posts/follow/',
+)
+
+
+class AdminChangeListTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'admin')
+        cls.admin_client = Client()
+        cls.admin_client.force_login(cls.admin)
+        cls.groups = [
+            Group.objects.create(title=f'Группа {i}', slug=f'group-{i}')
+            for i in range(3)
+        ]
+
+    def create_rows(self, count):
+        for i in range(count):
+            author = User.objects.create_user(username=f'user_{count}_{i}')
+            post = Post.objects.create(
+                author=author, text=f'Пост {i}', group=self.groups[i % 3])
+            Comment.objects.create(post=post, author=author, text='Ок')
+            Follow.objects.create(user=author, author=self.admin)
+
+    def test_changelists_do_not_query_per_row(self):
+        """Число запросов списка не растёт вместе с числом строк."""
+        for count in (1, 10):
+            self.create_rows(count)
+            for url in CHANGELISTS:
+                with self.subTest(url=url, count=count):
+                    self.assertQueryBudget(self.admin_client, url, budget=12)
+
+    def test_large_changelist_skips_full_count(self):
+        """В большой таблице строки не считаются через COUNT(*)."""
+        self.create_rows(5)
+        ApproximateCountPaginator.exact_limit = 2
+        self.addCleanup(setattr, ApproximateCountPaginator, 'exact_limit',
+                        10000)
+        for url in CHANGELISTS:
+            with self.subTest(url=url), record_queries() as recorder:
+                response = self.admin_client.get(url)
+            self.assertEqual(response.status_code, 200)
+            full_counts = [
+                sql for sql, _, _ in recorder.queries
+                if 'COUNT(*)' in sql and 'LIMIT' not in sql
+            ]
+            self.assertEqual(full_counts, [])
+
+    def test_follow_search_by_username(self):
+        """Подписки ищутся по имени читателя или автора."""
+        self.create_rows(3)
+        response = self.admin_client.get(
+            '/admin/posts/follow/', {'q': 'user_3_1'})
+        self.assertEqual(
+            [follow.user.username
+             for follow in response.context['cl'].result_list],
+            ['user_3_1'],
+        )
+        response = self.admin_client.get('/admin/posts/follow/', {'q': 'adm'})
+        self.assertEqual(response.context['cl'].result_count, 3)
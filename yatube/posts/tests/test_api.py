@@ -0,0 +1,293 @@
+import json
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from core.testing import QueryBudgetMixin
+from posts.cache import FEED, bump, modified_key
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ApiTestCase(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Котики', slug='cats', description='Про котиков')
+        cls.posts = [
+            Post.objects.create(author=cls.author, text=f'Пост {i}',
+                                group=cls.group if i % 2 else None)
+            for i in range(15)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def post_json(self, client, url, data, method='post'):
+        return getattr(client, method)(
+            url, json.dumps(data), content_type='application/json')
+
+
+class ApiReadTests(ApiTestCase):
+    def test_post_list_pages_by_cursor(self):
+        """Лента отдаётся страницами по курсору до конца."""
+        url = reverse('posts:api:post_list')
+        response = self.assertQueryBudget(self.client, url)
+        data = response.json()
+        self.assertEqual(
+            data['results'][0],
+            {
+                'id': self.posts[-1].pk,
+                'text': 'Пост 14',
+                'author': 'author',
+                'group': None,
+                'pub_date': self.posts[-1].pub_date.isoformat(),
+                'image': None,
+            },
+        )
+        self.assertIsNone(data['previous'])
+        ids = [post['id'] for post in data['results']]
+        while data['next']:
+            data = self.client.get(data['next']).json()
+            ids += [post['id'] for post in data['results']]
+        self.assertEqual(ids, [post.pk for post in reversed(self.posts)])
+
+    def test_field_selection_and_limit(self):
+        """fields= и limit= сужают ответ и запрос."""
+        url = reverse('posts:api:post_list')
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'fields': 'id,text', 'limit': 3})
+        data = response.json()
+        self.assertEqual(len(data['results']), 3)
+        self.assertEqual(set(data['results'][0]), {'id', 'text'})
+        self.assertIn('fields=id%2Ctext', data['next'])
+        self.assertIn('limit=3', data['next'])
+
+    def test_unknown_field(self):
+        response = self.client.get(
+            reverse('posts:api:post_list'), {'fields': 'id,secret'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['fields'], 'secret')
+
+    def test_group_and_profile_posts(self):
+        response = self.client.get(
+            reverse('posts:api:group_posts', args=['cats']))
+        self.assertEqual(len(response.json()['results']), 7)
+        self.assertTrue(all(post['group'] == 'cats'
+                            for post in response.json()['results']))
+        response = self.client.get(
+            reverse('posts:api:profile_posts', args=['reader']))
+        self.assertEqual(response.json()['results'], [])
+        response = self.client.get(
+            reverse('posts:api:group_posts', args=['dogs']))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {'detail': 'Не найдено'})
+
+    def test_post_and_comments(self):
+        post = self.posts[0]
+        Comment.objects.create(post=post, author=self.reader, text='Закат')
+        response = self.client.get(
+            reverse('posts:api:post', args=[post.pk]), {'fields': 'text'})
+        self.assertEqual(response.json(), {'text': 'Пост 0'})
+        response = self.client.get(
+            reverse('posts:api:comment_list', args=[post.pk]))
+        comment = response.json()['results'][0]
+        self.assertEqual(
+            (comment['post'], comment['author'], comment['text']),
+            (post.pk, 'reader', 'Закат'))
+
+    def test_profile(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        url = reverse('posts:api:profile', args=['author'])
+        response = self.reader_client.get(url)
+        self.assertEqual(response.json(), {
+            'username': 'author',
+            'full_name': '',
+            'posts_count': 15,
+            'followers_count': 1,
+            'following_count': 0,
+            'following': True,
+        })
+        self.assertIn('Cookie', response['Vary'])
+        self.assertFalse(self.client.get(url).json()['following'])
+
+    def test_query_budgets(self):
+        """Чтение укладывается в бюджеты без N+1."""
+        post = self.posts[0]
+        Comment.objects.create(post=post, author=self.reader, text='Закат')
+        for url in (
+            reverse('posts:api:post', args=[post.pk]),
+            reverse('posts:api:comment_list', args=[post.pk]),
+            reverse('posts:api:group_posts', args=['cats']),
+            reverse('posts:api:profile', args=['author']),
+            reverse('posts:api:profile_posts', args=['author']),
+        ):
+            with self.subTest(url=url):
+                self.assertQueryBudget(self.reader_client, url)
+
+    def test_follow_feed(self):
+        url = reverse('posts:api:follow_feed')
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.assertEqual(self.reader_client.get(url).json()['results'], [])
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = self.assertQueryBudget(self.reader_client, url)
+        self.assertEqual(len(response.json()['results']), 10)
+
+
+class ApiConditionalTests(ApiTestCase):
+    def test_unchanged_feed_is_not_modified(self):
+        """Совпавший ETag даёт 304 без тела и без запросов к базе."""
+        url = reverse('posts:api:post_list')
+        # Последний сдвиг ленты был раньше текущей секунды.
+        cache.set(modified_key(FEED), time.time() - 5, timeout=None)
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('"'))
+        self.assertIn('Last-Modified', response)
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_no_last_modified_within_bump_second(self):
+        """В секунду сдвига If-Modified-Since не даёт устаревший 304."""
+        url = reverse('posts:api:post_list')
+        cache.set(modified_key(FEED), time.time() - 5, timeout=None)
+        since = self.client.get(url)['Last-Modified']
+        bump(FEED)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('ETag', response)
+        self.assertNotIn('Last-Modified', response)
+
+    def test_change_gives_new_etag(self):
+        """Новый пост меняет ETag ленты и ленты автора."""
+        urls = [reverse('posts:api:post_list'),
+                reverse('posts:api:profile_posts', args=['author'])]
+        etags = [self.client.get(url)['ETag'] for url in urls]
+        Post.objects.create(author=self.author, text='Новый пост')
+        for url, etag in zip(urls, etags):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_depends_on_query(self):
+        url = reverse('posts:api:post_list')
+        self.assertNotEqual(
+            self.client.get(url)['ETag'],
+            self.client.get(url, {'fields': 'id'})['ETag'],
+        )
+
+    def test_personal_etag(self):
+        """ETag ленты подписок свой у каждого пользователя."""
+        url = reverse('posts:api:follow_feed')
+        etag = self.reader_client.get(url)['ETag']
+        response = self.author_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_comment_changes_post_etag(self):
+        post = self.posts[0]
+        url = reverse('posts:api:comment_list', args=[post.pk])
+        etag = self.client.get(url)['ETag']
+        Comment.objects.create(post=post, author=self.reader, text='Закат')
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_rename_changes_post_etag(self):
+        """Новые имя автора и slug группы меняют ETag поста."""
+        post = self.posts[1]
+        Comment.objects.create(post=post, author=self.author, text='Закат')
+        urls = [reverse('posts:api:post', args=[post.pk]),
+                reverse('posts:api:comment_list', args=[post.pk])]
+        # Django 2.2 не копирует объекты класса между тестами.
+        author = User.objects.get(pk=self.author.pk)
+        group = Group.objects.get(pk=self.group.pk)
+        for instance, field, value in ((author, 'username', 'writer'),
+                                       (group, 'slug', 'kittens')):
+            with self.subTest(field=field):
+                etags = [self.client.get(url)['ETag'] for url in urls]
+                setattr(instance, field, value)
+                instance.save()
+                for url, etag in zip(urls, etags):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                    self.assertEqual(response.status_code, 200)
+
+
+class ApiWriteTests(ApiTestCase):
+    def test_create_post(self):
+        url = reverse('posts:api:post_list')
+        data = {'text': 'Пост из приложения', 'group': 'cats'}
+        self.assertEqual(
+            self.post_json(self.client, url, data).status_code, 401)
+        response = self.post_json(self.author_client, url, data)
+        self.assertEqual(response.status_code, 201)
+        post = Post.objects.get(text='Пост из приложения')
+        self.assertEqual(post.group, self.group)
+        self.assertEqual(response.json()['id'], post.pk)
+        self.assertEqual(response['Location'],
+                         reverse('posts:api:post', args=[post.pk]))
+
+    def test_create_post_errors(self):
+        url = reverse('posts:api:post_list')
+        response = self.post_json(self.author_client, url, {'text': ''})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('text', response.json()['errors'])
+        response = self.post_json(
+            self.author_client, url, {'text': 'Пост', 'group': 'dogs'})
+        self.assertEqual(response.json()['errors'],
+                         {'group': ['Нет такой группы']})
+        response = self.author_client.post(
+            url, 'не json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_edit_and_delete_post(self):
+        post = self.posts[1]
+        url = reverse('posts:api:post', args=[post.pk])
+        response = self.post_json(
+            self.reader_client, url, {'text': 'Чужой'}, method='patch')
+        self.assertEqual(response.status_code, 403)
+        response = self.post_json(
+            self.author_client, url, {'text': 'Исправлено'}, method='patch')
+        self.assertEqual(response.json()['text'], 'Исправлено')
+        # Поля, которых нет в запросе, не меняются.
+        self.assertEqual(response.json()['group'], 'cats')
+        self.assertEqual(self.author_client.delete(url).status_code, 204)
+        self.assertFalse(Post.objects.filter(pk=post.pk).exists())
+
+    def test_add_comment(self):
+        post = self.posts[0]
+        url = reverse('posts:api:comment_list', args=[post.pk])
+        response = self.post_json(self.reader_client, url, {'text': 'Ура'})
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Comment.objects.filter(
+            post=post, author=self.reader, text='Ура').exists())
+
+    def test_follow_and_unfollow(self):
+        url = reverse('posts:api:profile_follow', args=['author'])
+        response = self.reader_client.post(url)
+        self.assertEqual(response.json(), {'following': True})
+        self.assertTrue(Follow.objects.filter(
+            user=self.reader, author=self.author).exists())
+        response = self.reader_client.delete(url)
+        self.assertEqual(response.json(), {'following': False})
+        self.assertFalse(Follow.objects.exists())
+        self.assertEqual(self.author_client.post(url).status_code, 400)
+
+    def test_method_not_allowed(self):
+        response = self.client.put(reverse('posts:api:post_list'))
+        self.assertEqual(response.status_code, 405)
+        self.assertEqual(response['Allow'], 'GET, HEAD, POST')
@@ -0,0 +1,98 @@
+import statistics
+import tempfile
+
+from django.core.cache import cache
+from django.db.models import Count, OuterRef, Subquery
+from django.test import (SimpleTestCase, TestCase, TransactionTestCase,
+                         override_settings)
+from posts import benchmarks, counters
+from posts.benchmarks import concurrency, dataset, pages
+from posts.models import Comment, Follow, Post, TimelineEntry
+
+
+class GenerateDatasetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.created = dataset.generate_dataset(
+            users=50, groups=5, posts=1000, comments=500, follows=200)
+
+    def test_counts(self):
+        self.assertEqual(self.created, {
+            'user': 50, 'group': 5, 'post': 1000, 'comment': 500,
+            'follow': 200,
+        })
+        self.assertEqual(Post.objects.count(), 1000)
+        self.assertEqual(Follow.objects.count(), 200)
+
+    def test_authorship_follows_power_law(self):
+        """Немногие авторы пишут большую часть постов."""
+        per_author = sorted(
+            Post.objects.order_by().values('author')
+            .annotate(total=Count('pk')).values_list('total', flat=True),
+            reverse=True,
+        )
+        self.assertGreater(per_author[0], 10 * statistics.median(per_author))
+        self.assertGreater(sum(per_author[:5]), 500)
+
+    def test_comments_come_after_posts(self):
+        post_date = Post.objects.filter(
+            pk=OuterRef('post')).values('pub_date')[:1]
+        self.assertFalse(
+            Comment.objects.filter(pub_date__lt=Subquery(post_date)).exists())
+
+    def test_derived_state_is_built(self):
+        """Счётчики и ленты соответствуют сгенерированным данным."""
+        self.assertEqual(counters.verify(), [])
+        self.assertTrue(TimelineEntry.objects.exists())
+
+
+class IsolatedCachesTests(SimpleTestCase):
+    def test_benchmark_cache_does_not_touch_shared(self):
+        """Очистка и записи замера не доходят до общего кеша."""
+        cache.set('page:real', 'настоящая')
+        self.addCleanup(cache.delete, 'page:real')
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(
+                    CACHES=benchmarks.isolated_caches(directory)):
+                cache.clear()
+                cache.set('page:fake', 'тестовая')
+                self.assertIsNone(cache.get('page:real'))
+        self.assertEqual(cache.get('page:real'), 'настоящая')
+        self.assertIsNone(cache.get('page:fake'))
+
+
+class LoadTestTests(TestCase):
+    def test_measures_all_pages(self):
+        dataset.generate_dataset(
+            users=10, groups=2, posts=50, comments=20, follows=20)
+        results = pages.load_test(repeat=2)
+        self.assertEqual(set(results), {
+            'index', 'group_posts', 'profile', 'post_detail',
+            'follow_index',
+        })
+        for result in results.values():
+            self.assertEqual(set(result), set(pages.COMPARED))
+            self.assertGreater(result['memory'], 0)
+
+    def test_compare(self):
+        baseline = {'index': {'p50': 10, 'queries': 4, 'memory': 100}}
+        self.assertEqual(pages.compare(
+            {'index': {'p50': 13, 'queries': 4, 'memory': 110}}, baseline),
+            [])
+        self.assertEqual(pages.compare(
+            {'index': {'p50': 20, 'queries': 5, 'memory': 130}}, baseline),
+            [('index', 'p50', 10, 20), ('index', 'queries', 4, 5),
+             ('index', 'memory', 100, 130)])
+
+
+class ConcurrencyTestTests(TransactionTestCase):
+    def test_measures_all_modes(self):
+        dataset.generate_dataset(
+            users=10, groups=2, posts=50, comments=20, follows=20)
+        results = concurrency.concurrency_test(
+            concurrency=3, total=10, threads=2)
+        self.assertEqual(set(results), set(concurrency.CONCURRENCY_MODES))
+        for result in results.values():
+            self.assertGreater(result['rps'], 0)
+            self.assertLessEqual(result['p50'], result['p99'])
@@ -1,8 +1,21 @@
+import threading
+import time
+from unittest import mock
+
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
 from django.core.cache import cache
-from django.test import Client, TestCase
+from django.http import HttpResponse
+from django.db import connection, transaction
+from django.test import (Client, RequestFactory, SimpleTestCase, TestCase,
+                         TransactionTestCase)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from posts.models import Group, Post
+from posts.cache import (FEED, _expires_early, author_version, bump,
+                         cache_versioned, conditional_versioned,
+                         get_versions, page_key, post_version)
+from posts.models import Comment, Follow, Group, Post
+from posts.templatetags.post_fragments import post_fragments
 
 User = get_user_model()
 
@@ -26,13 +39,333 @@ class PostViewsTests(TestCase):
             group=cls.group,
         )
 
+    def setUp(self):
+        cache.clear()
+
     def test_cash_index_page(self):
-        """Проверка работы кеша на странице index."""
+        """Страница index берётся из кеша, пока посты не менялись."""
+        response_first = self.guest_client.get(reverse('posts:index'))
+        with self.assertNumQueries(0):
+            response_second = self.guest_client.get(reverse('posts:index'))
+        self.assertEqual(response_first.content, response_second.content)
+
+    def test_cash_index_page_invalidated_on_delete(self):
+        """Удаление поста сразу убирает его из закешированной index."""
         response_first = self.authorized_client.get(reverse('posts:index'))
-        post_1 = Post.objects.get(pk=1)
-        post_1.delete()
+        self.assertContains(response_first, self.post.text)
+        Post.objects.get(pk=self.post.pk).delete()
         response_second = self.authorized_client.get(reverse('posts:index'))
-        self.assertEqual(response_first.content, response_second.content)
+        self.assertNotContains(response_second, self.post.text)
+
+    def test_cash_invalidation_is_precise(self):
+        """Изменение поста не сбрасывает кеш чужих страниц."""
+        other = Group.objects.create(
+            title='Другая группа',
+            slug='2',
+            description='Тестовое описание',
+        )
+        other_url = reverse('posts:group_list', kwargs={'slug': other.slug})
+        self.guest_client.get(other_url)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Новый текст'
+        post.save()
+        with self.assertNumQueries(0):
+            self.guest_client.get(other_url)
+        response = self.guest_client.get(
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}))
+        self.assertContains(response, 'Новый текст')
+
+    def test_cash_post_detail_invalidated_on_comment(self):
+        """Новый комментарий сразу виден на закешированной странице."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        self.guest_client.get(url)
+        Comment.objects.create(
+            post=self.post, author=self.user, text='Новый комментарий')
+        response = self.guest_client.get(url)
+        self.assertContains(response, 'Новый комментарий')
+
+    def test_cash_post_detail_follows_author_and_group(self):
+        """Страница поста следит за автором и группой, не только за постом."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        etag = self.guest_client.get(url)['ETag']
+        Post.objects.create(author=self.user, text='Второй пост')
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Всего постов автора:  <span >2')
+        with self.assertNumQueries(0):
+            self.guest_client.get(url)
+        author = User.objects.get(pk=self.user.pk)
+        author.username = 'renamed'
+        author.save()
+        self.assertContains(self.guest_client.get(url), 'renamed')
+        group = Group.objects.get(pk=self.group.pk)
+        group.slug = 'renamed-group'
+        group.save()
+        self.assertContains(self.guest_client.get(url), 'renamed-group')
+
+
+class ConditionalPageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    def setUp(self):
         cache.clear()
-        response_third = self.authorized_client.get(reverse('posts:index'))
-        self.assertNotEqual(response_first.content, response_third.content)
+        self.user_client = Client()
+        self.user_client.force_login(self.user)
+
+    def test_anonymous_page_is_shared(self):
+        """Анонимная страница кешируется прокси и сверяется по ETag."""
+        url = reverse('posts:index')
+        response = self.client.get(url)
+        self.assertEqual(
+            set(response['Cache-Control'].split(', ')),
+            {'public', 'max-age=0', 's-maxage=60'},
+        )
+        self.assertIn('Cookie', response['Vary'])
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertIn('public', response['Cache-Control'])
+
+    def test_personal_page_is_private(self):
+        url = reverse('posts:profile', args=['author'])
+        anonymous = self.client.get(url)
+        response = self.user_client.get(url)
+        self.assertEqual(
+            set(response['Cache-Control'].split(', ')),
+            {'private', 'no-cache'},
+        )
+        self.assertNotEqual(response['ETag'], anonymous['ETag'])
+        response = self.user_client.get(
+            url, HTTP_IF_NONE_MATCH=anonymous['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_changes_give_new_etag(self):
+        """Комментарий, пост и подписка меняют ETag своих страниц."""
+        detail = reverse('posts:post_detail', args=[self.post.pk])
+        feed = reverse('posts:follow_index')
+        etags = {
+            detail: self.client.get(detail)['ETag'],
+            feed: self.user_client.get(feed)['ETag'],
+        }
+        Comment.objects.create(post=self.post, author=self.user, text='Ок')
+        Follow.objects.create(user=self.user, author=self.author)
+        for url, client in ((detail, self.client), (feed, self.user_client)):
+            with self.subTest(url=url):
+                response = client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+                self.assertEqual(response.status_code, 200)
+
+    def test_missing_page_has_no_validators(self):
+        response = self.client.get(
+            reverse('posts:profile', args=['nobody']))
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('ETag', response)
+
+    def test_stale_page_has_no_validators(self):
+        """Прошлая версия страницы не получает ETag текущей."""
+        view = conditional_versioned(
+            lambda request: [FEED], personal=True, shared_max_age=60
+        )(cache_versioned(
+            lambda request: [FEED], stale_while_revalidate=True
+        )(lambda request: HttpResponse('page')))
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        self.assertIn('ETag', view(request))
+        bump(FEED)
+        # Перерисовку держит другой запрос.
+        cache.add(f'lock:{page_key(request, [FEED])}', 1)
+        response = view(request)
+        self.assertEqual(response.content, b'page')
+        self.assertNotIn('ETag', response)
+        self.assertIn('no-cache', response['Cache-Control'])
+
+
+class SharedPageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.other = User.objects.create_user(username='other')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.other_client = Client()
+        self.other_client.force_login(self.other)
+
+    def test_skeleton_is_shared_between_users(self):
+        """Второй пользователь получает страницу из общей копии."""
+        url = reverse('posts:profile', args=['author'])
+        self.reader_client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.other_client.get(url)
+        self.assertFalse(any('posts_post' in query['sql']
+                             for query in queries.captured_queries))
+        self.assertContains(response, 'Пользователь: other')
+        self.assertNotContains(response, 'Пользователь: reader')
+        self.assertNotContains(response, '<!--personal:')
+
+    def test_anonymous_copy_is_assembled_once(self):
+        """Анонимам отдаётся готовая страница без сборки и без базы."""
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        first = self.client.get(url)
+        with mock.patch('posts.personal.assemble') as assemble:
+            with self.assertNumQueries(0):
+                second = self.client.get(url)
+        assemble.assert_not_called()
+        self.assertEqual(first.content, second.content)
+        self.assertNotContains(second, 'csrfmiddlewaretoken')
+
+    def test_follow_button_is_personal(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        url = reverse('posts:profile', args=['author'])
+        self.assertContains(self.reader_client.get(url), 'Отписаться')
+        self.assertContains(self.other_client.get(url), 'Подписаться')
+        self.assertContains(self.client.get(url), 'Подписаться')
+        Follow.objects.filter(user=self.reader).delete()
+        self.assertContains(self.reader_client.get(url), 'Подписаться')
+
+    def test_comment_form_has_own_csrf_token(self):
+        """Форма комментария с CSRF-токеном рисуется для каждого заново."""
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        self.client.get(url)
+        response = self.reader_client.get(url)
+        self.assertContains(response, 'csrfmiddlewaretoken')
+        self.assertContains(
+            response, reverse('posts:add_comment', args=[self.post.pk]))
+        self.assertIn('private', response['Cache-Control'])
+
+
+class BumpOnCommitTests(TransactionTestCase):
+    def test_versions_change_again_after_commit(self):
+        """Страница, отрисованная до коммита, после него устаревает.
+
+        Параллельный запрос видит старые данные, пока транзакция не
+        зафиксирована, и мог бы сохранить их под новым поколением.
+        """
+        author = User.objects.create_user(username='author')
+        reader = User.objects.create_user(username='reader')
+        names = [FEED, author_version('author'), author_version('reader')]
+        with transaction.atomic():
+            post = Post.objects.create(author=author, text='Пост')
+            Comment.objects.create(post=post, author=author, text='Ок')
+            Follow.objects.create(user=reader, author=author)
+            names.append(post_version(post.pk))
+            during = get_versions(names)
+        after = get_versions(names)
+        for name in names:
+            with self.subTest(name=name):
+                self.assertNotEqual(after[name], during[name])
+
+
+class PostFragmentsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+        for number in range(3):
+            Post.objects.create(author=cls.user, text=f'Пост {number}')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_page_of_fragments_is_one_cache_read(self):
+        """Карточки страницы читаются из кеша одним get_many."""
+        posts = list(Post.objects.select_related('author', 'group'))
+        first = post_fragments(posts)
+        with mock.patch.object(cache, 'get_many',
+                               wraps=cache.get_many) as get_many, \
+                mock.patch.object(cache, 'set_many') as set_many:
+            second = post_fragments(posts)
+        get_many.assert_called_once()
+        set_many.assert_not_called()
+        self.assertEqual(first, second)
+        self.assertEqual(len(second), 3)
+
+    def test_fragment_changes_after_edit(self):
+        """Правка поста даёт новый фрагмент, остальные берутся из кеша."""
+        posts = list(Post.objects.select_related('author', 'group'))
+        post_fragments(posts)
+        edited = posts[0]
+        edited.text = 'Исправленный текст'
+        edited.save()
+        with mock.patch.object(cache, 'set_many',
+                               wraps=cache.set_many) as set_many:
+            fragments = post_fragments(posts)
+        self.assertIn('Исправленный текст', fragments[0])
+        self.assertEqual(len(set_many.call_args[0][0]), 1)
+
+
+class StampedeTests(SimpleTestCase):
+    """Нагрузочная проверка: сдвиг поколения под параллельными запросами."""
+
+    THREADS = 20
+
+    def setUp(self):
+        cache.clear()
+        self.renders = 0
+        self.lock = threading.Lock()
+
+        @cache_versioned(lambda request: [FEED], stale_while_revalidate=True)
+        def view(request):
+            with self.lock:
+                self.renders += 1
+                number = self.renders
+            # Имитация запросов к базе: перерисовка заметно дольше
+            # чтения из кеша.
+            time.sleep(0.2)
+            return HttpResponse(f'render {number}')
+
+        self.view = view
+
+    def get(self):
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        return self.view(request)
+
+    def hammer(self):
+        responses = []
+        barrier = threading.Barrier(self.THREADS)
+
+        def worker():
+            barrier.wait()
+            responses.append(self.get().content.decode())
+
+        threads = [threading.Thread(target=worker)
+                   for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return responses
+
+    def test_cold_cache_is_rendered_once(self):
+        """Без старой версии остальные запросы ждут единственную отрисовку."""
+        responses = self.hammer()
+        self.assertEqual(self.renders, 1)
+        self.assertEqual(set(responses), {'render 1'})
+
+    def test_stale_page_is_served_during_refresh(self):
+        """После сдвига поколения страницу перерисовывает один запрос."""
+        self.get()
+        bump(FEED)
+        responses = self.hammer()
+        self.assertEqual(self.renders, 2)
+        self.assertIn('render 2', responses)
+        self.assertEqual(set(responses), {'render 1', 'render 2'})
+        self.assertEqual(self.get().content.decode(), 'render 2')
+
+    def test_early_expiration(self):
+        """Страница у конца срока жизни обновляется заранее."""
+        now = time.time()
+        self.assertTrue(_expires_early(('', '', now - 1, 0.1)))
+        self.assertFalse(_expires_early(('', '', now + 3600, 0.1)))
+        self.assertFalse(_expires_early(('', '', None, 0.1)))
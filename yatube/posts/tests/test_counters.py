@@ -0,0 +1,105 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from posts import counters
+from posts.models import Comment, Counter, Follow, Group, Post
+
+User = get_user_model()
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test',
+            description='Тестовое описание',
+        )
+        cls.group_2 = Group.objects.create(
+            title='Тестовая группа 2',
+            slug='test-2',
+            description='Тестовое описание 2',
+        )
+
+    def test_post_counters_follow_create_edit_delete(self):
+        """Счётчики постов автора и группы следуют за изменениями."""
+        post = Post.objects.create(
+            author=self.user, text='Тестовый пост', group=self.group)
+        self.assertEqual(
+            counters.get_count(Counter.AUTHOR_POSTS, self.user.pk), 1)
+        self.assertEqual(
+            counters.get_count(Counter.GROUP_POSTS, self.group.pk), 1)
+        post = Post.objects.get(pk=post.pk)
+        post.group = self.group_2
+        post.save()
+        self.assertEqual(
+            counters.get_count(Counter.GROUP_POSTS, self.group.pk), 0)
+        self.assertEqual(
+            counters.get_count(Counter.GROUP_POSTS, self.group_2.pk), 1)
+        post.delete()
+        self.assertEqual(
+            counters.get_count(Counter.AUTHOR_POSTS, self.user.pk), 0)
+        self.assertEqual(
+            counters.get_count(Counter.GROUP_POSTS, self.group_2.pk), 0)
+
+    def test_comment_and_follow_counters(self):
+        """Счётчики комментариев и подписок следуют за изменениями."""
+        post = Post.objects.create(author=self.user, text='Тестовый пост')
+        Comment.objects.create(post=post, author=self.reader, text='Текст')
+        Follow.objects.create(user=self.reader, author=self.user)
+        self.assertEqual(
+            counters.get_count(Counter.POST_COMMENTS, post.pk), 1)
+        self.assertEqual(
+            counters.get_count(Counter.FOLLOWERS, self.user.pk), 1)
+        self.assertEqual(
+            counters.get_count(Counter.FOLLOWING, self.reader.pk), 1)
+        Follow.objects.filter(user=self.reader, author=self.user).delete()
+        self.assertEqual(
+            counters.get_count(Counter.FOLLOWERS, self.user.pk), 0)
+
+    def test_new_user_and_group_start_with_counters(self):
+        """Новые пользователь и группа сразу получают нулевые счётчики."""
+        user = User.objects.create_user(username='newcomer')
+        group = Group.objects.create(
+            title='Новая группа', slug='new', description='Описание')
+        self.assertEqual(
+            set(Counter.objects.filter(object_id=user.pk).exclude(
+                kind=Counter.GROUP_POSTS).values_list('kind', 'value')),
+            {(Counter.AUTHOR_POSTS, 0), (Counter.FOLLOWERS, 0),
+             (Counter.FOLLOWING, 0)},
+        )
+        self.assertTrue(Counter.objects.filter(
+            kind=Counter.GROUP_POSTS, object_id=group.pk, value=0).exists())
+
+    def test_missing_counter_is_computed_on_read(self):
+        """Отсутствующий счётчик считается по исходной таблице."""
+        Post.objects.bulk_create(
+            Post(author=self.user, text=str(i)) for i in range(3))
+        Counter.objects.all().delete()
+        self.assertEqual(
+            counters.get_count(Counter.AUTHOR_POSTS, self.user.pk), 3)
+        self.assertTrue(Counter.objects.filter(
+            kind=Counter.AUTHOR_POSTS, object_id=self.user.pk).exists())
+
+    def test_rebuild_counters_command(self):
+        """Команда находит расхождения и пересчитывает счётчики."""
+        Post.objects.create(author=self.user, text='Тестовый пост')
+        Counter.objects.filter(kind=Counter.AUTHOR_POSTS).update(value=10)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_counters', '--verify', stdout=StringIO())
+        call_command('rebuild_counters', stdout=StringIO())
+        self.assertEqual(counters.verify(), [])
+        self.assertEqual(
+            counters.get_count(Counter.AUTHOR_POSTS, self.user.pk), 1)
+
+    def test_profile_reads_counter(self):
+        """Профиль берёт число постов из счётчика."""
+        Post.objects.create(author=self.user, text='Тестовый пост')
+        response = self.client.get(f'/profile/{self.user.username}/')
+        self.assertEqual(response.context['count'], 1)
+        self.assertEqual(response.context['followers_count'], 0)
@@ -0,0 +1,105 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from core.query_budget import record_queries
+from posts import counters, follows
+from posts.models import Counter, Follow, Post, TimelineEntry
+
+User = get_user_model()
+
+
+class FollowsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+
+    def followers(self, author):
+        return counters.get_count(Counter.FOLLOWERS, author.pk)
+
+    def test_follow_is_idempotent(self):
+        """Повторная подписка ничего не меняет и возвращает 0."""
+        post = Post.objects.create(author=self.author, text='Тестовый пост')
+        self.assertEqual(follows.follow(self.reader.pk, self.author.pk), 1)
+        self.assertEqual(follows.follow(self.reader.pk, self.author.pk), 0)
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(self.followers(self.author), 1)
+        self.assertEqual(
+            counters.get_count(Counter.FOLLOWING, self.reader.pk), 1)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=post).exists())
+
+    def test_unfollow_is_idempotent(self):
+        """Повторная отписка ничего не меняет и возвращает 0."""
+        follows.follow(self.reader.pk, self.author.pk)
+        self.assertEqual(follows.unfollow(self.reader.pk, self.author.pk), -1)
+        self.assertEqual(follows.unfollow(self.reader.pk, self.author.pk), 0)
+        self.assertFalse(Follow.objects.exists())
+        self.assertEqual(self.followers(self.author), 0)
+
+    def test_self_follow_is_ignored(self):
+        self.assertEqual(follows.follow(self.author.pk, self.author.pk), 0)
+        self.assertFalse(Follow.objects.exists())
+
+    def test_bulk_follow(self):
+        """Массовая подписка пропускает повторы и существующие пары."""
+        others = [
+            User.objects.create_user(username=f'user_{i}') for i in range(3)
+        ]
+        Post.objects.create(author=self.author, text='Тестовый пост')
+        follows.follow(others[0].pk, self.author.pk)
+        pairs = [(user.pk, self.author.pk) for user in others] * 2 + [
+            (self.author.pk, self.author.pk),
+            (self.author.pk, self.reader.pk),
+        ]
+        self.assertEqual(follows.bulk_follow(pairs, batch_size=2), 3)
+        self.assertEqual(Follow.objects.count(), 4)
+        self.assertEqual(self.followers(self.author), 3)
+        self.assertEqual(self.followers(self.reader), 1)
+        self.assertEqual(
+            TimelineEntry.objects.filter(post__author=self.author).count(),
+            3,
+        )
+
+    def test_bulk_follow_counts_only_inserted(self):
+        """Подписку, появившуюся после выборки, сигнал не получает."""
+        others = [
+            User.objects.create_user(username=f'user_{i}') for i in range(3)
+        ]
+        pairs = [(user.pk, self.author.pk) for user in others]
+        for returning in (True, False):
+            with self.subTest(returning=returning):
+                Follow.objects.all().delete()
+                # Параллельный запрос подписался между выборкой и INSERT.
+                follows.follow(others[0].pk, self.author.pk)
+                with mock.patch.object(
+                    follows, '_existing', return_value=set()
+                ), mock.patch.object(
+                    follows, '_supports_returning', return_value=returning
+                ):
+                    self.assertEqual(follows.bulk_follow(pairs), 2)
+                self.assertEqual(self.followers(self.author), 3)
+                self.assertEqual(counters.verify(), [])
+
+    def test_orm_follows_share_side_effects(self):
+        """Подписка через ORM обновляет те же счётчики."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.followers(self.author), 1)
+        Follow.objects.all().delete()
+        self.assertEqual(self.followers(self.author), 0)
+
+    def test_follow_view_writes_once(self):
+        """View подписки сразу вставляет строку, без проверки exists()."""
+        self.client.force_login(self.reader)
+        url = reverse('posts:profile_follow', args=[self.author.username])
+        with record_queries() as recorder:
+            self.client.get(url)
+        follow_queries = [
+            sql for sql, _, _ in recorder.queries if 'posts_follow' in sql
+        ]
+        self.assertIn('INSERT', follow_queries[0])
+        self.client.get(url)
+        self.assertEqual(Follow.objects.count(), 1)
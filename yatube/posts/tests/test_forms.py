@@ -1,5 +1,8 @@
+import io
 import shutil
+import struct
 import tempfile
+import zlib
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
@@ -8,6 +11,7 @@ from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from posts.forms import PostForm
 from posts.models import Comment, Group, Post
+from PIL import Image
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -182,3 +186,80 @@ class PostFormTests(TestCase):
                 text='Тестовый коммент'
             ).exists()
         )
+
+
+def jpeg_upload(size, orientation=None, name='photo.jpg'):
+    image = Image.new('RGB', size, (200, 30, 30))
+    exif = Image.Exif()
+    exif[0x010F] = 'Камера'
+    if orientation:
+        exif[0x0112] = orientation
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', exif=exif.tobytes())
+    return SimpleUploadedFile(name, buffer.getvalue(), 'image/jpeg')
+
+
+def png_header(width, height):
+    """Начало PNG заданного размера: заголовок без пикселей."""
+    def chunk(kind, data):
+        return (struct.pack('>I', len(data)) + kind + data
+                + struct.pack('>I', zlib.crc32(kind + data)))
+    ihdr = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', ihdr) + chunk(b'IDAT', b'')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageUploadTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='author')
+        self.client.force_login(self.user)
+
+    def create(self, image):
+        return self.client.post(
+            reverse('posts:create'), data={'text': 'Пост', 'image': image})
+
+    @override_settings(POST_IMAGE_MAX_BYTES=1024)
+    def test_large_file_is_rejected(self):
+        """Файл больше предела отклоняется с понятной ошибкой."""
+        response = self.create(jpeg_upload((400, 400)))
+        self.assertFalse(Post.objects.exists())
+        self.assertIn('Файл больше',
+                      response.context['form'].errors['image'][0])
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100 * 100)
+    def test_too_many_pixels_is_rejected(self):
+        """Размер картинки проверяется по заголовку во время загрузки."""
+        response = self.create(jpeg_upload((200, 100)))
+        self.assertFalse(Post.objects.exists())
+        self.assertIn('слишком большая',
+                      response.context['form'].errors['image'][0])
+
+    def test_decompression_bomb_is_rejected(self):
+        """Огромная по заголовку картинка отклоняется без декодирования."""
+        response = self.create(SimpleUploadedFile(
+            'bomb.png', png_header(100000, 100000), 'image/png'))
+        self.assertFalse(Post.objects.exists())
+        self.assertIn('слишком большая',
+                      response.context['form'].errors['image'][0])
+
+    @override_settings(POST_IMAGE_MAX_SIDE=100)
+    def test_exif_is_stripped_and_original_downsampled(self):
+        """EXIF удаляется, картинка поворачивается и уменьшается."""
+        self.create(jpeg_upload((300, 200), orientation=6))
+        post = Post.objects.get()
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (67, 100))
+            self.assertFalse(image.getexif())
+
+    def test_clean_image_keeps_bytes_without_changes(self):
+        """Картинку без EXIF и в пределах размера не перекодируем."""
+        buffer = io.BytesIO()
+        Image.new('RGB', (50, 50)).save(buffer, 'PNG')
+        self.create(SimpleUploadedFile('plain.png', buffer.getvalue()))
+        with Post.objects.get().image.open('rb') as stored:
+            self.assertEqual(stored.read(), buffer.getvalue())
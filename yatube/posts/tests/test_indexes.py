@@ -0,0 +1,108 @@
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from posts import timeline
+from posts.models import Comment, Follow, Post
+
+User = get_user_model()
+
+
+@skipUnless(connection.vendor == 'sqlite', 'План запроса — для SQLite')
+class QueryPlanTests(TestCase):
+    """Горячие запросы читают страницу по составному индексу.
+
+    Проверяется EXPLAIN QUERY PLAN SQLite: поиск по индексу и никакой
+    досортировки во временном B-дереве.
+    """
+
+    def assertUsesIndex(self, queryset, index):
+        plan = queryset.explain()
+        self.assertIn(f'USING INDEX {index}', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_author_posts(self):
+        posts = Post.objects.filter(author_id=1).select_related(
+            'author', 'group').order_by('-pub_date', '-pk')
+        self.assertUsesIndex(posts[:11], 'post_author_date_idx')
+        # Следующая страница по курсору.
+        now = timezone.now()
+        self.assertUsesIndex(
+            posts.filter(
+                Q(pub_date__lt=now) | Q(pub_date=now, pk__lt=5))[:11],
+            'post_author_date_idx',
+        )
+
+    def test_group_posts(self):
+        posts = Post.objects.filter(group_id=1).select_related(
+            'author', 'group').order_by('-pub_date', '-pk')
+        self.assertUsesIndex(posts[:11], 'post_group_date_idx')
+
+    def test_post_comments(self):
+        comments = Comment.objects.filter(post_id=1).select_related(
+            'author').order_by('-pub_date', '-pk')
+        self.assertUsesIndex(comments[:21], 'comment_post_date_idx')
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_follow_feed_page(self):
+        """Лента подписок: записи ленты и посты знаменитости по индексам."""
+        reader, fan, author, celebrity = (
+            User.objects.create_user(username=name)
+            for name in ('reader', 'fan', 'author', 'celebrity'))
+        for user, followed in ((reader, author), (reader, celebrity),
+                               (fan, celebrity)):
+            Follow.objects.create(user=user, author=followed)
+        Post.objects.bulk_create(
+            Post(author=(author, celebrity)[i % 2], text=str(i))
+            for i in range(30))
+        timeline.rebuild()
+        first = timeline.FeedPaginator(
+            Post.objects.all(), 10, reader).page_by_cursor(None)
+        with CaptureQueriesContext(connection) as queries:
+            timeline.FeedPaginator(
+                Post.objects.all(), 10, reader
+            ).page_by_cursor(first.next_cursor)
+        plans = []
+        with connection.cursor() as cursor:
+            for query in queries.captured_queries:
+                cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+                plans.append(' '.join(
+                    str(row[-1]) for row in cursor.fetchall()))
+        self.assertFalse([plan for plan in plans if 'TEMP B-TREE' in plan])
+        plans = ' '.join(plans)
+        # Записи ленты и посты по автору читаются из самих индексов.
+        self.assertIn('INDEX timeline_user_date_idx (user_id=?', plans)
+        self.assertIn('INDEX post_author_date_idx (author_id=?', plans)
+
+    def test_follow_lookup(self):
+        plan = Follow.objects.filter(user_id=1, author_id=2).explain()
+        self.assertIn('(user_id=? AND author_id=?)', plan)
+
+
+class FollowUniqueTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+
+    def test_duplicate_follow_is_rejected(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=self.user, author=self.author)
+
+    def test_repeated_follow_request_keeps_one_row(self):
+        """Повторный запрос на подписку не создаёт вторую запись."""
+        self.client.force_login(self.user)
+        url = reverse('posts:profile_follow', args=[self.author.username])
+        self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(
+            Follow.objects.filter(user=self.user, author=self.author).count(),
+            1,
+        )
@@ -0,0 +1,230 @@
+import asyncio
+import json
+import time
+
+from core.asgi import WsgiToAsgi
+from core.pubsub import broker
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.wsgi import get_wsgi_application
+from django.test import (SimpleTestCase, TestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+from posts.live import LiveStream
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+LIVE_SETTINGS = {
+    'LIVE_UPDATES': True,
+    'LIVE_BROKER': {'BACKEND': 'core.pubsub.MemoryBroker'},
+    'LIVE_HEARTBEAT': 0.05,
+    'LIVE_TIMEOUT': 0.2,
+}
+
+
+def parse(content):
+    """Сообщения SSE списком словарей; пинги — {'ping': True}."""
+    messages = []
+    for block in content.decode().split('\n\n'):
+        if not block:
+            continue
+        if block.startswith(':'):
+            messages.append({'ping': True})
+            continue
+        message = dict(line.split(': ', 1) for line in block.split('\n'))
+        if 'data' in message:
+            message['data'] = json.loads(message['data'])
+        messages.append(message)
+    return messages
+
+
+@override_settings(**LIVE_SETTINGS)
+class LiveStreamTests(SimpleTestCase):
+    def test_events_of_own_channels(self):
+        """Поток отдаёт события своих каналов и пинги, пока жив."""
+        first = broker().publish(['feed'], 'post', {'id': 1})
+        broker().publish(['post:1'], 'comment', {'id': 2})
+        broker().publish(['feed', 'group:cats'], 'post', {'id': 3})
+        started = time.monotonic()
+        messages = parse(b''.join(LiveStream(['feed'], last_id=first)))
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(messages[0], {'retry': '3000'})
+        self.assertEqual(messages[1], {
+            'id': str(first + 2), 'event': 'post', 'data': {'id': 3}})
+        self.assertIn({'ping': True}, messages[2:])
+
+    def test_new_stream_starts_from_now(self):
+        broker().publish(['feed'], 'post', {'id': 1})
+        messages = parse(b''.join(LiveStream(['feed'])))
+        self.assertNotIn('event', ''.join(map(str, messages)))
+
+    @override_settings(LIVE_BROKER={
+        'BACKEND': 'core.pubsub.MemoryBroker', 'OPTIONS': {'BACKLOG': 2}})
+    def test_reset_after_missed_events(self):
+        for number in range(4):
+            last = broker().publish(['feed'], 'post', {'id': number})
+        messages = parse(b''.join(LiveStream(['feed'], last_id=0)))
+        self.assertEqual(messages[1], {
+            'id': str(last), 'event': 'reset', 'data': {}})
+        self.assertNotIn('post', ''.join(map(str, messages)))
+
+    def test_reset_after_broker_restart(self):
+        """Last-Event-ID из прошлой жизни брокера не теряет события."""
+        last = broker().publish(['feed'], 'post', {'id': 1})
+        stream = LiveStream(['feed'], last_id=last + 100)
+        started = time.monotonic()
+        messages = parse(b''.join(stream))
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(messages[1], {
+            'id': str(last), 'event': 'reset', 'data': {}})
+        self.assertEqual(stream.last_id, last)
+
+    def test_async_iteration(self):
+        event_id = broker().publish(['feed'], 'post', {'id': 1})
+
+        async def collect():
+            return [chunk async for chunk in
+                    LiveStream(['feed'], last_id=event_id - 1).aiter()]
+
+        messages = parse(b''.join(asyncio.run(collect())))
+        self.assertEqual(messages[1]['data'], {'id': 1})
+
+
+@override_settings(**LIVE_SETTINGS)
+class LiveViewTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Котики', slug='cats', description='Про котиков')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    def setUp(self):
+        # Разметка страниц зависит от LIVE_UPDATES, а в ключ кеша она
+        # не входит.
+        cache.clear()
+
+    def get(self, url, **extra):
+        response = self.client.get(url, **extra)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'],
+                         'text/event-stream; charset=utf-8')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        return parse(b''.join(response.streaming_content))
+
+    def test_replay_from_last_event_id(self):
+        """После переподключения клиент получает пропущенное."""
+        first = broker().publish(['feed'], 'post', {'id': 1})
+        broker().publish(['feed'], 'post', {'id': 2})
+        url = reverse('posts:live:feed')
+        messages = self.get(url, HTTP_LAST_EVENT_ID=str(first))
+        self.assertEqual([message['data'] for message in messages
+                          if message.get('event') == 'post'], [{'id': 2}])
+        messages = self.get(url, data={'last_event_id': first - 1})
+        self.assertEqual(len([message for message in messages
+                              if message.get('event') == 'post']), 2)
+
+    def test_channels(self):
+        last = broker().last_id()
+        broker().publish(['group:cats'], 'post', {'id': 1})
+        broker().publish([f'post:{self.post.pk}'], 'comment', {'id': 2})
+        broker().publish([f'author:{self.author.pk}'], 'post', {'id': 3})
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client.force_login(self.reader)
+        for url, expected in (
+            (reverse('posts:live:group', args=['cats']), {'id': 1}),
+            (reverse('posts:live:post', args=[self.post.pk]), {'id': 2}),
+            (reverse('posts:live:follow'), {'id': 3}),
+        ):
+            with self.subTest(url=url):
+                messages = self.get(url, HTTP_LAST_EVENT_ID=str(last))
+                self.assertEqual(
+                    [message['data'] for message in messages
+                     if 'data' in message], [expected])
+
+    def test_errors(self):
+        self.assertEqual(self.client.get(
+            reverse('posts:live:group', args=['dogs'])).status_code, 404)
+        self.assertEqual(self.client.get(
+            reverse('posts:live:post', args=[self.post.pk + 1])
+        ).status_code, 404)
+        self.assertEqual(
+            self.client.get(reverse('posts:live:follow')).status_code, 302)
+        self.assertEqual(
+            self.client.post(reverse('posts:live:feed')).status_code, 405)
+
+    def test_pages_subscribe(self):
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(
+            response, f'data-live-url="{reverse("posts:live:feed")}"')
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk]))
+        self.assertContains(response, 'Новых комментариев')
+
+    @override_settings(LIVE_UPDATES=False)
+    def test_disabled_without_setting(self):
+        """Без LIVE_UPDATES страницы не держат потоки сервера."""
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotContains(response, 'data-live-url')
+        self.assertNotContains(response, 'EventSource')
+        response = self.client.get(reverse('posts:live:feed'))
+        self.assertEqual(response.status_code, 204)
+
+
+@override_settings(**LIVE_SETTINGS)
+class AnnounceTests(TransactionTestCase):
+    def test_signals_publish_after_commit(self):
+        author = User.objects.create_user(username='author')
+        group = Group.objects.create(
+            title='Котики', slug='cats', description='Про котиков')
+        last = broker().last_id()
+        post = Post.objects.create(author=author, text='Пост', group=group)
+        comment = Comment.objects.create(
+            post=post, author=author, text='Комментарий')
+        events, missed = broker().read(last)
+        self.assertFalse(missed)
+        self.assertEqual(
+            [(event.kind, set(event.channels)) for event in events],
+            [('post', {'feed', f'author:{author.pk}', 'group:cats'}),
+             ('comment', {f'post:{post.pk}'})],
+        )
+        self.assertEqual(events[0].data['text'], 'Пост')
+        self.assertEqual(events[1].data['id'], comment.pk)
+        post.text = 'Правка'
+        post.save()
+        self.assertEqual(broker().last_id(), events[-1].id)
+
+
+@override_settings(**dict(LIVE_SETTINGS, LIVE_TIMEOUT=60))
+class AsgiStreamTests(SimpleTestCase):
+    def test_stream_stops_on_disconnect(self):
+        """Под ASGI поток отдаётся из цикла событий до отключения."""
+        event_id = broker().publish(['feed'], 'post', {'id': 1})
+        application = WsgiToAsgi(get_wsgi_application(), max_workers=1)
+        messages = []
+        requests = [{'type': 'http.request', 'body': b''}]
+
+        async def receive():
+            if requests:
+                return requests.pop()
+            await asyncio.sleep(0.2)
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {
+            'type': 'http', 'method': 'GET', 'path': '/live/',
+            'query_string': f'last_event_id={event_id - 1}'.encode(),
+            'headers': [(b'host', b'testserver')],
+        }
+        started = time.monotonic()
+        asyncio.run(application(scope, receive, send))
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(messages[0]['status'], 200)
+        content = b''.join(message.get('body', b'')
+                           for message in messages[1:])
+        self.assertEqual(parse(content)[1]['data'], {'id': 1})
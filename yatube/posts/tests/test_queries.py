@@ -0,0 +1,94 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from core.testing import QueryBudgetMixin
+from posts.models import Comment, Follow, Group, Post
+from posts.utils import COUNT_PAGE_COMMENTS
+
+User = get_user_model()
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.reader)
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def create_posts(self, count):
+        for i in range(count):
+            author = self.user if i % 2 else User.objects.create_user(
+                username=f'author_{count}_{i}')
+            Post.objects.create(author=author, text=str(i), group=self.group)
+
+    def urls(self):
+        return (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:follow_index'),
+            reverse('posts:profile', kwargs={'username': self.user}),
+        )
+
+    def test_views_fit_budget_for_any_page_size(self):
+        """Число запросов не растёт вместе с числом постов на странице.
+
+        Страницы не прогреваются: холодный запрос тоже в бюджете.
+        """
+        for count in (1, 20):
+            self.create_posts(count)
+            for url in self.urls():
+                with self.subTest(url=url, count=count):
+                    cache.clear()
+                    self.assertQueryBudget(self.authorized_client, url)
+
+    def test_profile_shows_only_author_posts(self):
+        """Профиль показывает только посты своего автора."""
+        self.create_posts(4)
+        response = self.authorized_client.get(
+            reverse('posts:profile', kwargs={'username': self.user}))
+        authors = {post.author for post in response.context['page_obj']}
+        self.assertEqual(authors, {self.user})
+        self.assertEqual(len(response.context['page_obj']), 2)
+
+    def test_post_detail_fits_budget_for_any_comment_count(self):
+        """Страница поста не делает запрос на каждый комментарий."""
+        post = Post.objects.create(author=self.user, text='Тестовый пост')
+        url = reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        for count in (1, COUNT_PAGE_COMMENTS + 5):
+            Comment.objects.bulk_create(
+                Comment(post=post, author=User.objects.create_user(
+                    username=f'commentator_{count}_{i}'), text=str(i))
+                for i in range(count)
+            )
+            with self.subTest(count=count):
+                cache.clear()
+                response = self.assertQueryBudget(
+                    self.authorized_client, url)
+                self.assertLessEqual(
+                    len(response.context['comments']), COUNT_PAGE_COMMENTS)
+
+    def test_post_detail_comments_are_paginated(self):
+        """Комментарии выводятся страницами по курсору."""
+        post = Post.objects.create(author=self.user, text='Тестовый пост')
+        Comment.objects.bulk_create(
+            Comment(post=post, author=self.reader, text=str(i))
+            for i in range(COUNT_PAGE_COMMENTS + 3)
+        )
+        url = reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        first_page = self.client.get(url).context['comments']
+        self.assertTrue(first_page.has_next())
+        second_page = self.client.get(
+            url, {'comments': first_page.next_cursor}).context['comments']
+        self.assertEqual(len(second_page), 3)
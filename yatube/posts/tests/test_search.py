@@ -0,0 +1,191 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from core.testing import QueryBudgetMixin
+from posts import search
+from posts.models import Comment, Post, SearchDocument, SearchTerm
+
+User = get_user_model()
+
+
+class StemTests(TestCase):
+    def test_word_forms_share_stem(self):
+        """Формы одного слова сводятся к одной основе."""
+        for forms in (
+            ('котики', 'котиков', 'котика', 'котик'),
+            ('красивая', 'красивые', 'красивого'),
+            ('поиск', 'поиска', 'поиском'),
+            ('ёлка', 'елки'),
+        ):
+            with self.subTest(forms=forms):
+                self.assertEqual(len({search.stem(form) for form in forms}), 1)
+
+    def test_latin_words_are_kept(self):
+        """Слова не на кириллице только приводятся к нижнему регистру."""
+        self.assertEqual(search.terms('Django и Python'),
+                         ['django', 'и', 'python'])
+
+
+class SearchMixin:
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+
+    def create_post(self, text, days_ago=0):
+        post = Post.objects.create(author=self.user, text=text)
+        if days_ago:
+            Post.objects.filter(pk=post.pk).update(
+                pub_date=timezone.now() - timedelta(days=days_ago))
+        return post
+
+    def test_finds_other_word_forms(self):
+        """Поиск находит пост по другой форме слова."""
+        post = self.create_post('Мои котики спят на диване')
+        self.create_post('Собака гуляет во дворе')
+        self.assertEqual(search.search('котик'), [post.pk])
+
+    def test_all_words_are_required(self):
+        """Пост должен содержать все слова запроса."""
+        post = self.create_post('Котики спят на диване')
+        self.create_post('Котики гуляют во дворе')
+        self.assertEqual(search.search('котики диван'), [post.pk])
+
+    def test_last_word_is_prefix(self):
+        """Недописанное последнее слово ищется как префикс."""
+        post = self.create_post('Полнотекстовый поиск')
+        self.assertEqual(search.search('полнотекст'), [post.pk])
+
+    def test_finds_post_by_comment(self):
+        """Пост находится по тексту комментария к нему."""
+        post = self.create_post('Фотография с прогулки')
+        comment = Comment.objects.create(
+            post=post, author=self.user, text='Какой чудесный закат')
+        self.assertEqual(search.search('закаты'), [post.pk])
+        comment.delete()
+        self.assertEqual(search.search('закаты'), [])
+
+    def test_comments_are_indexed_one_by_one(self):
+        """Новый комментарий не перечитывает остальные комментарии поста."""
+        post = self.create_post('Фотография')
+        first = Comment.objects.create(
+            post=post, author=self.user, text='Закат над морем')
+        with CaptureQueriesContext(connection) as queries:
+            second = Comment.objects.create(
+                post=post, author=self.user, text='Ещё один закат')
+        self.assertFalse([
+            query['sql'] for query in queries
+            if 'FROM "posts_comment"' in query['sql']
+        ])
+        self.assertEqual(search.search('морем закат'), [post.pk])
+        second.delete()
+        self.assertEqual(search.search('закат один'), [])
+        self.assertEqual(search.search('закат'), [post.pk])
+        first.delete()
+        self.assertEqual(search.search('закат'), [])
+        self.assertEqual(search.search('фотография'), [post.pk])
+
+    def test_index_follows_edits_and_deletes(self):
+        """Правка и удаление поста сразу видны поиску."""
+        post = self.create_post('Старый текст')
+        post.text = 'Новый текст'
+        post.save()
+        self.assertEqual(search.search('старый'), [])
+        self.assertEqual(search.search('новый'), [post.pk])
+        post.delete()
+        self.assertEqual(search.search('новый'), [])
+
+    def test_post_text_outranks_comments(self):
+        """Слово в тексте поста весит больше, чем в комментарии."""
+        commented = self.create_post('Просто фотография')
+        Comment.objects.create(
+            post=commented, author=self.user, text='Это чайник')
+        titled = self.create_post('Мой чайник')
+        self.assertEqual(search.search('чайник'), [titled.pk, commented.pk])
+
+    def test_fresh_posts_rank_higher(self):
+        """При равной релевантности выше более свежий пост."""
+        old = self.create_post('Новости про чайники', days_ago=90)
+        fresh = self.create_post('Новости про чайники')
+        self.assertEqual(search.search('чайники'), [fresh.pk, old.pk])
+
+    def test_rebuild(self):
+        """rebuild_search строит индекс заново по постам и комментариям."""
+        post = self.create_post('Котики')
+        Comment.objects.create(post=post, author=self.user, text='Закат')
+        search.get_index().clear()
+        self.assertEqual(search.search('котики'), [])
+        out = StringIO()
+        call_command('rebuild_search', stdout=out)
+        self.assertIn('Проиндексировано постов: 1', out.getvalue())
+        self.assertEqual(search.search('котики закат'), [post.pk])
+
+
+class Fts5SearchTests(SearchMixin, TestCase):
+    def test_uses_fts5(self):
+        """В SQLite с FTS5 обратный индекс на таблицах не заполняется."""
+        self.assertIsInstance(search.get_index(), search.Fts5Index)
+        self.create_post('Котики')
+        self.assertFalse(SearchTerm.objects.exists())
+
+
+@override_settings(SEARCH_BACKEND='python')
+class InvertedIndexSearchTests(SearchMixin, TestCase):
+    def test_uses_inverted_index(self):
+        """SEARCH_BACKEND = 'python' включает индекс на таблицах."""
+        self.assertIsInstance(search.get_index(), search.InvertedIndex)
+        post = self.create_post('Котики')
+        self.assertTrue(SearchTerm.objects.filter(post=post).exists())
+
+    def test_comment_changes_match_rebuild(self):
+        """Частоты после правок по одному комментарию — как после rebuild."""
+        post = self.create_post('Котики и закат')
+        Comment.objects.create(post=post, author=self.user, text='Котики!')
+        removed = Comment.objects.create(
+            post=post, author=self.user, text='Закат закат и море')
+        Comment.objects.create(post=post, author=self.user, text='Море')
+        removed.delete()
+
+        def state():
+            return (
+                set(SearchTerm.objects.values_list('term', 'frequency')),
+                SearchDocument.objects.get(post=post).length,
+            )
+
+        incremental = state()
+        search.rebuild()
+        self.assertEqual(incremental, state())
+
+
+class SearchViewTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        for i in range(15):
+            Post.objects.create(author=cls.user, text=f'Котики номер {i}')
+
+    def test_search_page(self):
+        """Страница поиска показывает найденные посты страницами."""
+        url = reverse('posts:search')
+        response = self.assertQueryBudget(
+            self.client, url, data={'q': 'котик'})
+        page_obj = response.context['page_obj']
+        self.assertEqual(len(page_obj), 10)
+        self.assertTrue(all(post.text.startswith('Котики')
+                            for post in page_obj))
+        response = self.client.get(url, {'q': 'котик', 'page': 2})
+        self.assertEqual(len(response.context['page_obj']), 5)
+
+    def test_empty_query(self):
+        """Без запроса страница открывается без результатов."""
+        response = self.client.get(reverse('posts:search'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['page_obj']), 0)
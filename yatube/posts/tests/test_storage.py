@@ -0,0 +1,127 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from posts import storage, thumbnails, variants
+from posts.models import Post
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+User = get_user_model()
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentAddressedStorageTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='author')
+
+    def create_post(self, name='small.gif'):
+        return Post.objects.create(
+            author=self.user, text='Пост',
+            image=SimpleUploadedFile(name, SMALL_GIF, 'image/gif'),
+        )
+
+    def test_duplicates_share_one_file(self):
+        """Одинаковые картинки хранятся одним файлом под хешем."""
+        first = self.create_post('small.gif')
+        second = self.create_post('copy.GIF')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(
+            first.image.name, r'^posts/[0-9a-f]{2}/[0-9a-f]{64}\.gif$')
+        _, files = storage.post_images.listdir(
+            first.image.name.rsplit('/', 1)[0])
+        self.assertEqual(len(files), 1)
+
+    def test_duplicates_share_thumbnail_and_variants(self):
+        """Миниатюра и варианты дубликата не строятся заново."""
+        first = self.create_post()
+        second = self.create_post('copy.gif')
+        thumbnails.schedule(first.pk, first.image.name)
+        self.assertFalse(thumbnails.generate(second.image.name))
+        self.assertEqual(
+            variants.build(second.image.name),
+            variants.loads(Post.objects.get(pk=first.pk).image_variants),
+        )
+
+    def test_release_keeps_referenced_file(self):
+        """Файл удаляется, только когда на него не ссылается ни один пост."""
+        first = self.create_post()
+        second = self.create_post()
+        name = first.image.name
+        thumbnails.schedule(first.pk, name)
+        first.delete()
+        self.assertFalse(storage.release(name, min_age=0))
+        self.assertTrue(storage.post_images.exists(name))
+        second.delete()
+        self.assertTrue(storage.release(name, min_age=0))
+        self.assertFalse(storage.post_images.exists(name))
+        self.assertIsNone(thumbnails.cached_thumbnail(second.image))
+        for variant in variants.names_for(name):
+            self.assertFalse(default_storage.exists(variant))
+
+    def test_release_spares_reuploaded_file(self):
+        """Файл, загруженный заново до коммита своего поста, не удаляется."""
+        post = self.create_post()
+        name = post.image.name
+        Post.objects.filter(pk=post.pk).delete()
+        # Другой пользователь загружает ту же картинку, пост ещё не
+        # сохранён.
+        storage.post_images.save(
+            'posts/copy.gif', ContentFile(SMALL_GIF, 'copy.gif'))
+        self.assertFalse(storage.release(name))
+        self.assertTrue(storage.post_images.exists(name))
+        self.assertFalse(storage.post_images.exists(f'{name}.released'))
+
+    def test_save_after_release_writes_file_again(self):
+        """Дубликат, загруженный после удаления, записывается заново."""
+        post = self.create_post()
+        name = post.image.name
+        Post.objects.filter(pk=post.pk).delete()
+        self.assertTrue(storage.release(name, min_age=0))
+        self.assertEqual(storage.post_images.save(
+            'posts/copy.gif', ContentFile(SMALL_GIF, 'copy.gif')), name)
+        self.assertTrue(storage.post_images.exists(name))
+
+    def test_gc_media_removes_orphans(self):
+        """Команда gc_media удаляет файлы без постов и оставляет нужные."""
+        kept = self.create_post().image.name
+        orphan = storage.post_images.save(
+            'posts/orphan.gif', ContentFile(SMALL_GIF + b'\0'))
+        stray_variant = default_storage.save(
+            f'{variants.DIRECTORY}/stray_320.jpg', ContentFile(b'jpeg'))
+        out = StringIO()
+        call_command('gc_media', '--min-age', '0', stdout=out)
+        self.assertIn('Удалено файлов: 2', out.getvalue())
+        self.assertTrue(storage.post_images.exists(kept))
+        self.assertFalse(storage.post_images.exists(orphan))
+        self.assertFalse(default_storage.exists(stray_variant))
+
+    def test_gc_media_spares_fresh_files(self):
+        """Свежие файлы не удаляются: их пост может быть ещё не сохранён."""
+        orphan = storage.post_images.save(
+            'posts/orphan.gif', ContentFile(SMALL_GIF))
+        call_command('gc_media', stdout=StringIO())
+        self.assertTrue(storage.post_images.exists(orphan))
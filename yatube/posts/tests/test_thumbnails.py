@@ -0,0 +1,162 @@
+import io
+import shutil
+import tempfile
+from concurrent.futures import Future
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from posts import thumbnails, variants
+from posts.cache import get_versions, post_version
+from posts.benchmarks.images import synthetic_photo
+from posts.models import Post
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+User = get_user_model()
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailsTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.user = User.objects.create_user(username='author')
+        self.post = Post.objects.create(
+            author=self.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(
+                name='small.gif', content=SMALL_GIF,
+                content_type='image/gif'),
+        )
+
+    def test_original_is_served_until_thumbnail_is_ready(self):
+        """Пока миниатюры нет, страница показывает исходную картинку."""
+        self.assertIsNone(thumbnails.cached_thumbnail(self.post.image))
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertContains(response, self.post.image.url)
+
+    def test_ready_thumbnail_replaces_original(self):
+        """Готовая миниатюра меняет карточку поста и страницы."""
+        self.guest_client.get(reverse('posts:index'))
+        updated = Post.objects.get(pk=self.post.pk).updated
+        thumbnails.schedule(self.post.pk, self.post.image.name)
+        thumbnail = thumbnails.cached_thumbnail(self.post.image)
+        self.assertIsNotNone(thumbnail)
+        self.assertGreater(Post.objects.get(pk=self.post.pk).updated, updated)
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertContains(response, thumbnail.url)
+        self.assertNotContains(response, self.post.image.url)
+
+    def test_thumbnail_is_built_once(self):
+        """Повторная постановка в очередь не пересобирает миниатюру."""
+        self.assertTrue(thumbnails.generate(self.post.image.name))
+        self.assertFalse(thumbnails.generate(self.post.image.name))
+
+    def test_image_outside_media_root_is_skipped(self):
+        """Путь вне MEDIA_ROOT не роняет генерацию."""
+        image = tempfile.NamedTemporaryFile(suffix='.jpg').name
+        post = Post.objects.create(author=self.user, text='Пост', image=image)
+        self.assertFalse(thumbnails.generate(post.image.name))
+        self.assertIsNone(thumbnails.cached_thumbnail(post.image))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class VariantsTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        buffer = io.BytesIO()
+        synthetic_photo(1200, 800, seed=1).save(buffer, 'JPEG')
+        self.user = User.objects.create_user(username='author')
+        self.post = Post.objects.create(
+            author=self.user,
+            text='Пост с фотографией',
+            image=SimpleUploadedFile(
+                name='photo.jpg', content=buffer.getvalue(),
+                content_type='image/jpeg'),
+        )
+
+    def test_manifest_is_stored_on_post(self):
+        """Варианты всех ширин попадают в манифест поста и на страницу."""
+        thumbnails.schedule(self.post.pk, self.post.image.name)
+        post = Post.objects.get(pk=self.post.pk)
+        manifest = variants.loads(post.image_variants)
+        self.assertEqual(
+            [width for width, _, _ in manifest['sources']['jpeg']],
+            list(variants.WIDTHS),
+        )
+        response = Client().get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}))
+        self.assertContains(response, 'srcset=')
+        self.assertContains(response, ' 320w')
+
+    def test_mobile_client_gets_smaller_file(self):
+        """Телефону достаётся вариант меньше полноразмерного."""
+        manifest = variants.build(self.post.image.name)
+        mobile = variants.pick(manifest, 360)
+        desktop = variants.pick(manifest, 960)
+        self.assertEqual(mobile[0], 480)
+        self.assertEqual(desktop[0], 960)
+        self.assertLess(mobile[2], desktop[2])
+
+    def test_delete_removes_variant_files(self):
+        """delete_for удаляет файлы всех вариантов картинки."""
+        manifest = variants.build(self.post.image.name)
+        variants.delete_for(self.post.image.name)
+        for _, name, _ in manifest['sources']['jpeg']:
+            self.assertFalse(default_storage.exists(name))
+
+    def test_replaced_image_keeps_post_untouched(self):
+        """Манифест старой картинки не попадает в пост с новой."""
+        manifest = variants.build(self.post.image.name)
+        Post.objects.filter(pk=self.post.pk).update(image='posts/new.jpg')
+        with mock.patch.object(thumbnails, 'release') as release:
+            thumbnails._mark_ready(
+                self.post.pk, self.post.image.name, manifest)
+        release.assert_called_once_with(self.post.image.name)
+        self.assertEqual(
+            Post.objects.get(pk=self.post.pk).image_variants, '')
+
+    def test_ready_manifest_bumps_post_version(self):
+        """Готовый манифест сдвигает поколение страниц поста."""
+        name = post_version(self.post.pk)
+        before = get_versions([name])[name]
+        thumbnails._mark_ready(
+            self.post.pk, self.post.image.name,
+            variants.build(self.post.image.name))
+        self.assertNotEqual(get_versions([name])[name], before)
+
+    def test_callback_closes_connection(self):
+        """Колбэк пула закрывает своё соединение, даже с ошибкой."""
+        future = Future()
+        future.set_exception(OSError('битый файл'))
+        with mock.patch.object(thumbnails, 'close_old_connections'), \
+                mock.patch.object(thumbnails, 'connection') as connection:
+            with self.assertLogs('posts.thumbnails', 'ERROR'):
+                thumbnails._finished(
+                    self.post.pk, self.post.image.name, future)
+        connection.close.assert_called_once_with()
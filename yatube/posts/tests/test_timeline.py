@@ -0,0 +1,157 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from posts import timeline
+from posts.models import Follow, Post, TimelineEntry
+
+User = get_user_model()
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def feed_pks(self):
+        return set(
+            timeline.feed(self.reader).values_list('pk', flat=True))
+
+    def test_new_post_is_fanned_out_to_followers(self):
+        """Новый пост попадает в ленты подписчиков."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Тестовый пост')
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=post).exists())
+        self.assertEqual(self.feed_pks(), {post.pk})
+
+    def test_follow_backfills_and_unfollow_drops(self):
+        """Подписка подкладывает старые посты, отписка их убирает."""
+        post = Post.objects.create(author=self.author, text='Тестовый пост')
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.feed_pks(), {post.pk})
+        Follow.objects.filter(user=self.reader, author=self.author).delete()
+        self.assertEqual(self.feed_pks(), set())
+        self.assertFalse(TimelineEntry.objects.exists())
+
+    @override_settings(TIMELINE_LENGTH=3, TIMELINE_TRIM_SLACK=0)
+    def test_timeline_is_bounded(self):
+        """Лента не длиннее TIMELINE_LENGTH и хранит самые новые посты."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        posts = [
+            Post.objects.create(author=self.author, text=str(i))
+            for i in range(5)
+        ]
+        self.assertEqual(
+            self.feed_pks(), {post.pk for post in posts[-3:]})
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_celebrity_posts_are_read_at_request_time(self):
+        """Посты авторов-знаменитостей подмешиваются при чтении."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Тестовый пост')
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.feed_pks(), {post.pk})
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_pages_merge_timeline_and_celebrities(self):
+        """Страницы идут подряд, у знаменитости читается не больше страницы."""
+        celebrity = User.objects.create_user(username='celebrity')
+        fan = User.objects.create_user(username='fan')
+        for user, author in ((self.reader, self.author),
+                             (self.reader, celebrity), (fan, celebrity)):
+            Follow.objects.create(user=user, author=author)
+        posts = [
+            Post.objects.create(author=(self.author, celebrity)[i % 3 == 0],
+                                text=str(i))
+            for i in range(25)
+        ]
+        self.assertFalse(TimelineEntry.objects.filter(
+            post__author=celebrity).exists())
+        seen = []
+        cursor = None
+        while True:
+            paginator = timeline.FeedPaginator(
+                Post.objects.all(), 10, self.reader)
+            with CaptureQueriesContext(connection) as queries:
+                page = paginator.page_by_cursor(cursor)
+            seen.extend(post.pk for post in page)
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        self.assertEqual(seen, [post.pk for post in reversed(posts)])
+        self.assertTrue(any(
+            f'"author_id" = {celebrity.pk}' in query['sql']
+            and 'LIMIT 11' in query['sql']
+            for query in queries.captured_queries))
+        last = timeline.FeedPaginator(
+            Post.objects.all(), 10, self.reader).page_by_number(9)
+        self.assertEqual([post.pk for post in last],
+                         [post.pk for post in reversed(posts[:5])])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_page_queries_do_not_grow_with_celebrities(self):
+        """Посты всех знаменитостей читаются одним запросом."""
+        fan = User.objects.create_user(username='fan')
+        counts = []
+        for number in range(1, 4):
+            celebrity = User.objects.create_user(username=f'star_{number}')
+            for user in (self.reader, fan):
+                Follow.objects.create(user=user, author=celebrity)
+            Post.objects.create(author=celebrity, text=str(number))
+            with CaptureQueriesContext(connection) as queries:
+                page = timeline.FeedPaginator(
+                    Post.objects.all(), 10, self.reader).page_by_cursor(None)
+            self.assertEqual(len(page), number)
+            counts.append(len(queries))
+        self.assertEqual(len(set(counts)), 1, counts)
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_former_celebrity_is_fanned_out(self):
+        """Опустившись до предела, автор снова раскладывается в ленты."""
+        fan = User.objects.create_user(username='fan')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=fan, author=self.author)
+        post = Post.objects.create(author=self.author, text='Тестовый пост')
+        self.assertFalse(TimelineEntry.objects.exists())
+        Follow.objects.filter(user=fan, author=self.author).delete()
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=post).exists())
+        self.assertEqual(self.feed_pks(), {post.pk})
+
+    def test_follow_index_uses_timeline(self):
+        """Страница подписок показывает посты из ленты."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Тестовый пост')
+        self.client.force_login(self.reader)
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']), [post])
+
+    def test_rebuild_timelines_command(self):
+        """Команда восстанавливает ленты по таблице подписок."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Тестовый пост')
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(self.feed_pks(), {post.pk})
+
+    @override_settings(TIMELINE_LENGTH=3)
+    def test_rebuild_keeps_newest_posts_of_all_authors(self):
+        """Пересобранная лента — самые новые посты всех авторов."""
+        other = User.objects.create_user(username='other')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.reader, author=other)
+        posts = [
+            Post.objects.create(author=(self.author, other)[i % 2],
+                                text=str(i))
+            for i in range(6)
+        ]
+        timeline.rebuild()
+        self.assertEqual(
+            self.feed_pks(), {post.pk for post in posts[-3:]})
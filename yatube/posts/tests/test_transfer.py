@@ -0,0 +1,133 @@
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.utils.timezone import make_aware
+from posts import counters, search, transfer
+from posts.models import (Comment, Counter, Follow, Group, Post,
+                          TimelineEntry)
+
+User = get_user_model()
+
+PUB_DATE = make_aware(datetime(2020, 5, 17, 12, 30))
+
+
+class TransferTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(
+            title='Котики', slug='cats', description='Про котиков')
+        self.posts = [
+            Post.objects.create(
+                author=self.author, group=self.group if i % 2 else None,
+                text=f'Пост про котиков {i}')
+            for i in range(5)
+        ]
+        Post.objects.filter(pk=self.posts[0].pk).update(pub_date=PUB_DATE)
+        Comment.objects.create(
+            post=self.posts[0], author=self.reader, text='Закат')
+        Follow.objects.create(user=self.reader, author=self.author)
+
+    def export(self, fmt):
+        call_command('export_data', self.directory, format=fmt,
+                     stdout=StringIO())
+
+    def wipe(self):
+        Post.objects.all().delete()
+        Group.objects.all().delete()
+        Follow.objects.all().delete()
+        User.objects.all().delete()
+        Counter.objects.all().delete()
+
+    def test_round_trip(self):
+        """Выгрузка и загрузка восстанавливают данные и производное."""
+        for fmt in transfer.FORMATS:
+            with self.subTest(fmt=fmt):
+                self.export(fmt)
+                self.wipe()
+                out = StringIO()
+                call_command('import_data', self.directory, format=fmt,
+                             stdout=out)
+                self.assertIn('строк/с', out.getvalue())
+                post = Post.objects.get(pk=self.posts[0].pk)
+                self.assertEqual(post.pub_date, PUB_DATE)
+                self.assertEqual(post.author.username, 'author')
+                self.assertEqual(
+                    Post.objects.filter(group__slug='cats').count(), 2)
+                self.assertEqual(post.comments.get().author.username,
+                                 'reader')
+                reader = User.objects.get(username='reader')
+                author = User.objects.get(username='author')
+                self.assertFalse(reader.has_usable_password())
+                self.assertTrue(Follow.objects.filter(
+                    user=reader, author=author).exists())
+                self.assertEqual(counters.verify(), [])
+                self.assertEqual(counters.get_count(
+                    Counter.AUTHOR_POSTS, author.pk), 5)
+                self.assertEqual(
+                    TimelineEntry.objects.filter(user=reader).count(), 5)
+                self.assertEqual(search.search('закат'), [post.pk])
+                self.assertFalse(os.path.exists(
+                    os.path.join(self.directory, transfer.CHECKPOINT)))
+
+    def test_import_is_idempotent(self):
+        """Повторная загрузка не создаёт дубликатов."""
+        self.export('ndjson')
+        call_command('import_data', self.directory, stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 5)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(Group.objects.count(), 1)
+
+    def test_import_into_populated_database(self):
+        """Занятые чужими постами id — ошибка, а не тихий пропуск."""
+        self.export('ndjson')
+        self.wipe()
+        other = User.objects.create_user(username='other')
+        Post.objects.bulk_create(
+            Post(pk=post.pk, author=other, text='Чужой пост')
+            for post in self.posts[:2]
+        )
+        with self.assertRaisesMessage(
+            CommandError,
+            f'post: id {self.posts[0].pk}, {self.posts[1].pk} уже заняты',
+        ):
+            call_command('import_data', self.directory, stdout=StringIO())
+        # Пачка с конфликтом откатилась целиком, комментарий к чужому
+        # посту не привязан.
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertFalse(Post.objects.exclude(author=other).exists())
+        self.assertFalse(Comment.objects.exists())
+
+    def test_resume_from_checkpoint(self):
+        """Загрузка продолжается со строки из контрольной точки."""
+        self.export('ndjson')
+        self.wipe()
+        checkpoint = transfer.Checkpoint(self.directory)
+        checkpoint.save('post', 3)
+        out = StringIO()
+        call_command('import_data', self.directory, batch_size=2,
+                     stdout=out)
+        self.assertIn('пропущено по контрольной точке 3', out.getvalue())
+        self.assertEqual(
+            set(Post.objects.values_list('pk', flat=True)),
+            {post.pk for post in self.posts[3:]},
+        )
+        # Комментарий относится к посту, которого не загружали.
+        self.assertFalse(Comment.objects.exists())
+
+    def test_restart_ignores_checkpoint(self):
+        self.export('ndjson')
+        self.wipe()
+        transfer.Checkpoint(self.directory).save('post', 5)
+        call_command('import_data', self.directory, restart=True,
+                     stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 5)
@@ -1,3 +1,5 @@
+import base64
+import json
 import shutil
 import tempfile
 from http import HTTPStatus
@@ -7,10 +9,13 @@ from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.db import connection
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from posts.forms import PostForm
-from posts.models import Follow, Group, Post
+from posts.models import Comment, Follow, Group, Post
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -62,6 +67,9 @@ class PostViewsTests(TestCase):
         super().tearDownClass()
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
+    def setUp(self):
+        cache.clear()
+
     def test_index_page_correct_template(self):
         """URL-адрес использует шаблон posts/index.html."""
         post = PostViewsTests.post
@@ -213,6 +221,8 @@ class PaginatorViewsTest(TestCase):
             text=i,
             group=PaginatorViewsTest.group,) for i in range(13)]
         Post.objects.bulk_create(cls.posts)
+
+    def setUp(self):
         cache.clear()
 
     def test_paginator_contains_correct_records(self):
@@ -239,6 +249,76 @@ class PaginatorViewsTest(TestCase):
                                  count_posts_second_page)
                 print(f'Finished with {template} {count_posts_second_page}')
 
+    def test_paginator_cursor_navigation(self):
+        """Курсоры ведут на соседние страницы без пропусков и повторов."""
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        first_page = self.client.get(url).context['page_obj']
+        self.assertTrue(first_page.has_next())
+        self.assertFalse(first_page.has_previous())
+        second_page = self.client.get(
+            url, {'cursor': first_page.next_cursor}).context['page_obj']
+        self.assertEqual(second_page.number, 2)
+        self.assertFalse(second_page.has_next())
+        pks = [post.pk for post in first_page] + [
+            post.pk for post in second_page]
+        self.assertEqual(len(set(pks)), len(self.posts))
+        back_page = self.client.get(
+            url, {'cursor': second_page.previous_cursor}).context['page_obj']
+        self.assertEqual(
+            [post.pk for post in back_page],
+            [post.pk for post in first_page],
+        )
+        self.assertFalse(back_page.has_previous())
+
+    def test_paginator_without_count_query(self):
+        """Страница с курсором не выполняет COUNT(*)."""
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        first_page = self.client.get(url).context['page_obj']
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url, {'cursor': first_page.next_cursor})
+        self.assertFalse(
+            any('COUNT(' in query['sql'] for query in queries.captured_queries)
+        )
+
+    def test_paginator_broken_cursor(self):
+        """Битый курсор открывает первую страницу."""
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        response = self.client.get(url, {'cursor': 'не-курсор'})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.context['page_obj'].number, 1)
+
+    def test_paginator_page_beyond_end(self):
+        """Номер за концом ленты, даже огромный, ведёт на последнюю."""
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        for number in (3, 10 ** 6, 10 ** 30):
+            with self.subTest(number=number):
+                response = self.client.get(url, {'page': number})
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                page = response.context['page_obj']
+                self.assertEqual(page.number, 2)
+                self.assertEqual(len(page), 3)
+                self.assertFalse(page.has_next())
+
+    def test_paginator_forged_cursor(self):
+        """Подделанный курсор открывает первую страницу, а не 500."""
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        date = '2021-01-01T00:00:00+00:00'
+        payloads = (
+            {'d': date, 'i': 10 ** 30},
+            {'d': date, 'i': 0},
+            {'d': date, 'i': -1},
+            {'d': date, 'i': float('inf')},
+            {'d': date, 'i': 1, 'n': float('-inf')},
+            {'d': '2021-01-01T00:00:00', 'i': 1},
+        )
+        for payload in payloads:
+            with self.subTest(payload=payload):
+                cursor = base64.urlsafe_b64encode(
+                    json.dumps(payload).encode()).decode()
+                response = self.client.get(url, {'cursor': cursor})
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertEqual(response.context['page_obj'].number, 1)
+
 
 class FollowTestCase(TestCase):
     @classmethod
@@ -286,3 +366,30 @@ class FollowTestCase(TestCase):
         self.assertEqual(response.status_code, HTTPStatus.OK)
         self.assertContains(response, self.post_2.text)
         self.assertNotContains(response, self.post_1.text)
+
+
+@override_settings(CONCURRENT_LOADERS=2)
+class ConcurrentLoadingTests(TransactionTestCase):
+    """Страницы с параллельной загрузкой частей (core.concurrency)."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Комментарий')
+
+    def test_profile(self):
+        response = self.client.get(reverse('posts:profile',
+                                           args=['author']))
+        self.assertEqual(response.context['count'], 1)
+        self.assertEqual(list(response.context['page_obj']), [self.post])
+
+    def test_post_detail(self):
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk]))
+        self.assertEqual(response.context['post'], self.post)
+        self.assertContains(response, 'Комментарий')
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk + 1]))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
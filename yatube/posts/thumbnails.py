@@ -0,0 +1,160 @@
+"""Фоновая обработка картинок постов: миниатюры и варианты.
+
+Тег `{% thumbnail %}` строит миниатюру прямо во время отрисовки
+страницы, и первый читатель нового поста ждёт декодирование, обрезку
+и сжатие картинки. Здесь миниатюра и варианты разной ширины
+(posts.variants) строятся после сохранения поста в пуле процессов, а
+шаблоны только ищут готовый результат и, пока его нет, показывают
+исходную картинку.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import close_old_connections, connection
+from django.utils import timezone
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from . import variants
+from .storage import post_images, release
+
+logger = logging.getLogger(__name__)
+
+# Размер миниатюры в лентах и на странице поста.
+POST_GEOMETRY = '960x339'
+POST_OPTIONS = {'crop': 'center', 'upscale': True}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _thumbnail_file(image, geometry, options):
+    # Имя файла миниатюры sorl-thumbnail строит из всех опций, включая
+    # значения по умолчанию, — повторяем ThumbnailBackend.get_thumbnail
+    # до обращения к хранилищу ключей.
+    backend = default.backend
+    source = ImageFile(image)
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, geometry, options)
+    return ImageFile(name, default.storage)
+
+
+def cached_thumbnail(image, geometry=POST_GEOMETRY, **options):
+    """Готовая миниатюра или None; сама миниатюра не строится."""
+    if not image:
+        return None
+    options = options or POST_OPTIONS
+    return default.kvstore.get(_thumbnail_file(image, geometry, options))
+
+
+def _in_storage(image_name):
+    try:
+        return post_images.exists(image_name)
+    except SuspiciousFileOperation:
+        # Картинка вне MEDIA_ROOT, например путь из фикстуры.
+        return False
+
+
+def generate(image_name, geometry=POST_GEOMETRY, options=None):
+    """Строит миниатюру; True, если её раньше не было."""
+    options = options or POST_OPTIONS
+    if not _in_storage(image_name):
+        return False
+    # Ключ миниатюры зависит от хранилища исходника: то же, что у поля
+    # Post.image, чтобы шаблон нашёл построенное здесь.
+    source = ImageFile(image_name, post_images)
+    if default.kvstore.get(_thumbnail_file(source, geometry, options)):
+        return False
+    thumbnail = get_thumbnail(source, geometry, **options)
+    return thumbnail.exists()
+
+
+def prepare(image_name):
+    """Работа воркера: миниатюра и варианты картинки (posts.variants)."""
+    if not _in_storage(image_name):
+        return None
+    generate(image_name)
+    return variants.build(image_name)
+
+
+def _setup_worker():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+    import django
+    django.setup()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn: дочерний процесс не наследует соединения с базой
+            # и потоки родителя.
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_setup_worker,
+            )
+        return _executor
+
+
+def _mark_ready(post_id, image_name, manifest):
+    # Проверка картинки и запись манифеста — один UPDATE: между чтением
+    # поста и save() картинку могли успеть заменить. update() не шлёт
+    # post_save, поэтому Post.updated и поколения страниц сдвигаются
+    # здесь — кеши карточки и страниц перестают отдавать оригинал.
+    from .cache import bump_on_commit, post_pages
+    from .models import Post
+    updated = Post.objects.filter(pk=post_id, image=image_name).update(
+        image_variants=variants.dumps(manifest), updated=timezone.now())
+    if not updated:
+        # Пост удалён или картинку успели заменить.
+        release(image_name)
+        return
+    post = Post.objects.filter(pk=post_id).first()
+    if post is not None:
+        bump_on_commit(*post_pages(post))
+
+
+def _finished(post_id, image_name, future):
+    # Колбэк выполняется в служебном потоке пула: соединение с базой
+    # у этого потока своё, и без закрытия оно висит до конца процесса.
+    close_old_connections()
+    try:
+        manifest = future.result()
+        if manifest is not None:
+            _mark_ready(post_id, image_name, manifest)
+    except Exception:
+        logger.exception('Не удалось обработать картинку поста %s', post_id)
+    finally:
+        connection.close()
+
+
+def schedule(post_id, image_name):
+    """Ставит обработку картинки поста в очередь пула процессов.
+
+    При THUMBNAIL_WORKERS = 0 картинка обрабатывается сразу в текущем
+    процессе — так работают тесты.
+    """
+    if not settings.THUMBNAIL_WORKERS:
+        manifest = prepare(image_name)
+        if manifest is not None:
+            _mark_ready(post_id, image_name, manifest)
+        return
+    future = _get_executor().submit(prepare, image_name)
+    future.add_done_callback(
+        lambda future: _finished(post_id, image_name, future))
@@ -0,0 +1,260 @@
+"""Материализованная лента подписок (fan-out on write).
+
+Новый пост сразу раскладывается в ленты подписчиков автора, поэтому
+`follow_index` читает готовый список по индексу вместо соединения
+Follow и Post. Посты авторов с очень большим числом подписчиков в ленты
+не раскладываются: они подмешиваются при чтении (fan-out on read).
+Когда знаменитость снова опускается до TIMELINE_FANOUT_LIMIT
+подписчиков, её посты раскладываются по лентам всех подписчиков.
+
+Страницу ленты собирает `FeedPaginator`: каждый источник читается по
+своему индексу с LIMIT, все источники — одним запросом UNION ALL, а
+сливаются они в памяти.
+"""
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.utils.dateparse import parse_datetime
+
+from . import counters
+from .models import Counter, Follow, Post, TimelineEntry
+from .utils import KeysetPaginator
+
+BATCH_SIZE = 500
+
+
+def is_celebrity(author_id):
+    """Слишком много подписчиков, чтобы раскладывать посты по лентам."""
+    followers = counters.get_count(Counter.FOLLOWERS, author_id)
+    return followers > settings.TIMELINE_FANOUT_LIMIT
+
+
+def _insert(entries):
+    TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+
+
+def fan_out(post):
+    """Добавляет новый пост в ленты всех подписчиков автора."""
+    if is_celebrity(post.author_id):
+        return
+    follower_ids = list(
+        Follow.objects.filter(author_id=post.author_id)
+        .values_list('user_id', flat=True)
+    )
+    _insert(
+        TimelineEntry(user_id=user_id, post_id=post.pk,
+                      pub_date=post.pub_date)
+        for user_id in follower_ids
+    )
+    trim_overflowing(follower_ids)
+
+
+def backfill(user_id, author_id):
+    """Подкладывает в ленту последние посты нового автора подписки."""
+    if is_celebrity(author_id):
+        return
+    posts = (
+        Post.objects.filter(author_id=author_id)
+        .order_by('-pub_date', '-pk')
+        .values_list('pk', 'pub_date')[:settings.TIMELINE_LENGTH]
+    )
+    _insert(
+        TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        for post_id, pub_date in posts
+    )
+    trim([user_id])
+
+
+def followers_dropped(author_id, removed):
+    """Раскладывает посты автора, переставшего быть знаменитостью.
+
+    removed — на сколько подписчиков стало меньше; счётчик к этому
+    времени уже уменьшен.
+    """
+    followers = counters.get_count(Counter.FOLLOWERS, author_id)
+    limit = settings.TIMELINE_FANOUT_LIMIT
+    if not followers <= limit < followers + removed:
+        return
+    posts = list(
+        Post.objects.filter(author_id=author_id)
+        .order_by('-pub_date', '-pk')
+        .values_list('pk', 'pub_date')[:settings.TIMELINE_LENGTH]
+    )
+    follower_ids = list(
+        Follow.objects.filter(author_id=author_id)
+        .values_list('user_id', flat=True)
+    )
+    for user_id in follower_ids:
+        _insert(
+            TimelineEntry(user_id=user_id, post_id=post_id,
+                          pub_date=pub_date)
+            for post_id, pub_date in posts
+        )
+    trim_overflowing(follower_ids)
+
+
+def drop(user_id, author_id):
+    """Убирает из ленты посты автора, от которого отписались."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def trim(user_ids):
+    """Оставляет в каждой ленте не больше TIMELINE_LENGTH записей."""
+    if not user_ids:
+        return
+    newest = (
+        TimelineEntry.objects.filter(user_id=OuterRef('user_id'))
+        .order_by('-pub_date', '-pk')
+        .values('pk')[:settings.TIMELINE_LENGTH]
+    )
+    TimelineEntry.objects.filter(user_id__in=user_ids).exclude(
+        pk__in=Subquery(newest)
+    ).delete()
+
+
+def trim_overflowing(user_ids):
+    """Обрезает только ленты, вышедшие за предел с запасом.
+
+    Запас TIMELINE_TRIM_SLACK превращает обрезку из работы на каждый
+    пост в редкую пакетную операцию.
+    """
+    limit = settings.TIMELINE_LENGTH + settings.TIMELINE_TRIM_SLACK
+    for start in range(0, len(user_ids), BATCH_SIZE):
+        batch = user_ids[start:start + BATCH_SIZE]
+        overflowing = list(
+            TimelineEntry.objects.filter(user_id__in=batch)
+            .order_by()
+            .values('user_id')
+            .annotate(total=Count('pk'))
+            .filter(total__gt=limit)
+            .values_list('user_id', flat=True)
+        )
+        trim(overflowing)
+
+
+def _followed_celebrities(user):
+    celebrities = Counter.objects.filter(
+        kind=Counter.FOLLOWERS,
+        value__gt=settings.TIMELINE_FANOUT_LIMIT,
+    ).values('object_id')
+    return Follow.objects.filter(
+        user=user, author_id__in=celebrities
+    ).order_by().values_list('author_id', flat=True)
+
+
+def feed(user):
+    """Все посты ленты подписок одним запросом.
+
+    Для подсчёта и проверок: OR по двум подзапросам не ложится на
+    индексы, поэтому страницы читает `FeedPaginator`.
+    """
+    materialized = TimelineEntry.objects.filter(user=user).values('post_id')
+    return Post.objects.filter(
+        Q(pk__in=materialized)
+        | Q(author_id__in=_followed_celebrities(user))
+    )
+
+
+def _union(querysets):
+    """Строки (pub_date, pk) нескольких querysets одним запросом.
+
+    Каждая часть UNION ALL обёрнута в SELECT: SQLite не разрешает ORDER
+    BY и LIMIT у частей составного запроса, а без них часть не ляжет
+    на свой индекс.
+    """
+    parts, params = [], []
+    for queryset in querysets:
+        sql, part_params = queryset.query.sql_with_params()
+        parts.append(f'SELECT * FROM ({sql})')
+        params.extend(part_params)
+    connection = connections[querysets[0].db]
+    with connection.cursor() as cursor:
+        cursor.execute(' UNION ALL '.join(parts), params)
+        rows = cursor.fetchall()
+    # Колонки подзапроса SQLite отдаёт без типа, то есть строкой.
+    return {
+        (parse_datetime(pub_date) if isinstance(pub_date, str)
+         else pub_date, pk)
+        for pub_date, pk in rows
+    }
+
+
+class FeedPaginator(KeysetPaginator):
+    """Страницы ленты подписок user.
+
+    Ключи (pub_date, pk) страницы берутся из записей ленты по индексу
+    timeline_user_date_idx и из постов каждой подписанной знаменитости
+    по post_author_date_idx — из каждого источника не больше нужного
+    страницы, всё одним запросом. Сами посты затем читаются по pk из
+    object_list: число запросов не зависит от числа знаменитостей.
+    """
+
+    def __init__(self, object_list, per_page, user, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.user = user
+
+    def _total(self):
+        return feed(self.user).count()
+
+    def _fetch(self, descending, key=None, offset=0):
+        limit = offset + self.per_page + 1
+        prefix = '-' if descending else ''
+        entries = TimelineEntry.objects.filter(user=self.user)
+        if key is not None:
+            entries = entries.filter(
+                self._seek(key, older=descending, pk_field='post_id'))
+        sources = [
+            entries.order_by(prefix + 'pub_date', prefix + 'post_id')
+            .values_list('pub_date', 'post_id')[:limit]
+        ]
+        for author_id in _followed_celebrities(self.user):
+            posts = Post.objects.filter(author_id=author_id)
+            if key is not None:
+                posts = posts.filter(self._seek(key, older=descending))
+            sources.append(
+                posts.order_by(prefix + 'pub_date', prefix + 'pk')
+                .values_list('pub_date', 'pk')[:limit]
+            )
+        keys = sorted(_union(sources), reverse=descending)[offset:limit]
+        if not keys:
+            return []
+        posts = self.object_list.order_by().in_bulk(
+            [pk for _, pk in keys])
+        return [posts[pk] for _, pk in keys if pk in posts]
+
+
+def rebuild(user_ids=None):
+    """Строит ленты заново по таблице подписок.
+
+    Лента каждого читателя собирается одним запросом: последние
+    TIMELINE_LENGTH постов всех его авторов, кроме знаменитостей, — так
+    обрезать ленты потом не нужно.
+    """
+    entries = TimelineEntry.objects.all()
+    follows = Follow.objects.all()
+    if user_ids is not None:
+        entries = entries.filter(user_id__in=user_ids)
+        follows = follows.filter(user_id__in=user_ids)
+    entries.delete()
+    celebrities = Counter.objects.filter(
+        kind=Counter.FOLLOWERS,
+        value__gt=settings.TIMELINE_FANOUT_LIMIT,
+    ).values('object_id')
+    readers = list(
+        follows.order_by('user_id').values_list('user_id', flat=True)
+        .distinct()
+    )
+    for user_id in readers:
+        authors = Follow.objects.filter(user_id=user_id).exclude(
+            author_id__in=celebrities).values('author_id')
+        posts = (
+            Post.objects.filter(author_id__in=authors)
+            .order_by('-pub_date', '-pk')
+            .values_list('pk', 'pub_date')[:settings.TIMELINE_LENGTH]
+        )
+        _insert(
+            TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for post_id, pub_date in posts
+        )
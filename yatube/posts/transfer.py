@@ -0,0 +1,329 @@
+"""Перенос групп, постов, комментариев и подписок между окружениями.
+
+Каждая модель пишется в свой файл (group.ndjson, post.csv, ...) в
+порядке первичного ключа через iterator(), поэтому выгрузка идёт с
+постоянным расходом памяти. Пользователи и группы в файлах указаны
+по username и slug; у постов и комментариев сохраняются id, чтобы
+ссылки вида /posts/<id>/ остались прежними.
+
+Загрузка идёт пачками через bulk_create(ignore_conflicts=True): уже
+существующие строки пропускаются, так что пачку можно безопасно
+повторить. Пост или комментарий считается уже загруженным, только
+если в базе под его id та же строка (тот же автор, дата и пост); если
+id занят другой строкой, загрузка останавливается с ImportConflict,
+а не пропускает её молча и не вешает комментарии на чужой пост.
+После каждой пачки номер последней загруженной строки
+записывается в файл контрольной точки, и прерванная загрузка
+продолжается с него. bulk_create не посылает сигналов, поэтому
+счётчики, ленты, поисковый индекс и кеш страниц после загрузки
+строятся заново (`rebuild_derived`).
+"""
+import csv
+import json
+import os
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+
+from . import counters, search, timeline
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ImportConflict(Exception):
+    """id из файла уже заняты в базе другими строками."""
+
+    def __init__(self, name, ids):
+        self.name = name
+        self.ids = ids
+        shown = ', '.join(map(str, ids[:10]))
+        more = f' и ещё {len(ids) - 10}' if len(ids) > 10 else ''
+        super().__init__(
+            f'{name}: id {shown}{more} уже заняты другими строками. '
+            'Загрузка с сохранением id возможна только в базу без них.'
+        )
+
+
+BATCH_SIZE = 2000
+CHECKPOINT = '.import-checkpoint.json'
+FORMATS = ('ndjson', 'csv')
+
+# Порядок важен для загрузки: посты ссылаются на группы, комментарии —
+# на посты. Для каждой модели — поля файла и соответствующие им
+# выражения values_list.
+EXPORTS = {
+    'group': (Group, (
+        ('slug', 'slug'),
+        ('title', 'title'),
+        ('description', 'description'),
+    )),
+    'post': (Post, (
+        ('id', 'id'),
+        ('author', 'author__username'),
+        ('group', 'group__slug'),
+        ('text', 'text'),
+        ('image', 'image'),
+        ('pub_date', 'pub_date'),
+    )),
+    'comment': (Comment, (
+        ('id', 'id'),
+        ('post', 'post_id'),
+        ('author', 'author__username'),
+        ('text', 'text'),
+        ('pub_date', 'pub_date'),
+    )),
+    'follow': (Follow, (
+        ('user', 'user__username'),
+        ('author', 'author__username'),
+        ('pub_date', 'pub_date'),
+    )),
+}
+
+
+def file_name(name, fmt):
+    return f'{name}.{fmt}'
+
+
+def fields(name):
+    return [field for field, _ in EXPORTS[name][1]]
+
+
+def export_rows(name, chunk_size=BATCH_SIZE):
+    """Строки модели словарями, от меньшего pk к большему."""
+    model, columns = EXPORTS[name]
+    rows = model.objects.order_by('pk').values_list(
+        *(lookup for _, lookup in columns))
+    for values in rows.iterator(chunk_size=chunk_size):
+        yield {
+            field: value.isoformat() if hasattr(value, 'isoformat')
+            else value
+            for field, value in zip(fields(name), values)
+        }
+
+
+def write_rows(name, rows, stream, fmt):
+    """Пишет строки в поток; возвращает их число."""
+    total = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=fields(name))
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            total += 1
+        return total
+    for row in rows:
+        stream.write(json.dumps(row, ensure_ascii=False) + '\n')
+        total += 1
+    return total
+
+
+def read_rows(stream, fmt):
+    """Строки файла словарями; в CSV пустая строка значит None."""
+    if fmt == 'csv':
+        for row in csv.DictReader(stream):
+            yield {key: value if value != '' else None
+                   for key, value in row.items()}
+        return
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def _user_ids(usernames):
+    """{username: id}; недостающие пользователи создаются без пароля."""
+    usernames = set(usernames) - {None}
+    ids = dict(User.objects.filter(username__in=usernames).values_list(
+        'username', 'pk'))
+    missing = usernames - set(ids)
+    if missing:
+        User.objects.bulk_create(
+            (User(username=username, password=make_password(None))
+             for username in missing),
+            ignore_conflicts=True,
+        )
+        ids.update(User.objects.filter(username__in=missing).values_list(
+            'username', 'pk'))
+    return ids
+
+
+def _date(value):
+    return parse_datetime(value) if value else None
+
+
+def _check_conflicts(name, model, fields, expected):
+    """Падает, если id из файла занят в базе строкой с другими fields.
+
+    expected — {id: значения fields из файла}.
+    """
+    existing = model.objects.filter(pk__in=expected).values_list(
+        'pk', *fields)
+    conflicts = sorted(
+        pk for pk, *values in existing if tuple(values) != expected[pk])
+    if conflicts:
+        raise ImportConflict(name, conflicts)
+
+
+def _import_groups(rows):
+    Group.objects.bulk_create(
+        (Group(slug=row['slug'], title=row['title'],
+               description=row['description'] or '')
+         for row in rows),
+        ignore_conflicts=True,
+    )
+
+
+def _import_posts(rows):
+    authors = _user_ids(row['author'] for row in rows)
+    groups = dict(Group.objects.filter(
+        slug__in={row['group'] for row in rows}
+    ).values_list('slug', 'pk'))
+    _check_conflicts('post', Post, ('author_id', 'pub_date'), {
+        int(row['id']): (authors[row['author']], _date(row['pub_date']))
+        for row in rows
+    })
+    Post.objects.bulk_create(
+        (Post(id=int(row['id']), author_id=authors[row['author']],
+              group_id=groups.get(row['group']), text=row['text'],
+              image=row['image'] or '', pub_date=_date(row['pub_date']))
+         for row in rows),
+        ignore_conflicts=True,
+    )
+
+
+def _import_comments(rows):
+    authors = _user_ids(row['author'] for row in rows)
+    # Комментарии к постам, которых нет в базе, пропускаются.
+    posts = set(Post.objects.filter(
+        pk__in={int(row['post']) for row in rows}
+    ).values_list('pk', flat=True))
+    _check_conflicts(
+        'comment', Comment, ('post_id', 'author_id', 'pub_date'), {
+            int(row['id']): (int(row['post']), authors[row['author']],
+                             _date(row['pub_date']))
+            for row in rows if int(row['post']) in posts
+        })
+    Comment.objects.bulk_create(
+        (Comment(id=int(row['id']), post_id=int(row['post']),
+                 author_id=authors[row['author']], text=row['text'],
+                 pub_date=_date(row['pub_date']))
+         for row in rows if int(row['post']) in posts),
+        ignore_conflicts=True,
+    )
+
+
+def _import_follows(rows):
+    users = _user_ids(
+        username for row in rows for username in (row['user'], row['author'])
+    )
+    Follow.objects.bulk_create(
+        (Follow(user_id=users[row['user']], author_id=users[row['author']],
+                pub_date=_date(row['pub_date']))
+         for row in rows if row['user'] != row['author']),
+        ignore_conflicts=True,
+    )
+
+
+IMPORTERS = {
+    'group': _import_groups,
+    'post': _import_posts,
+    'comment': _import_comments,
+    'follow': _import_follows,
+}
+
+
+@contextmanager
+def keep_dates():
+    """Даты из файла вместо auto_now/auto_now_add на время загрузки."""
+    date_fields = [
+        field for model in (Post, Comment, Follow)
+        for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False)
+        or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field.auto_now, field.auto_now_add) for field in date_fields]
+    for field in date_fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(date_fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Checkpoint:
+    """Сколько строк каждого файла уже загружено."""
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, CHECKPOINT)
+        self.done = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding='utf-8') as stream:
+                self.done = json.load(stream)
+
+    def get(self, name):
+        return self.done.get(name, 0)
+
+    def save(self, name, rows):
+        self.done[name] = rows
+        # Через временный файл: падение посреди записи не испортит точку.
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as stream:
+            json.dump(self.done, stream)
+        os.replace(temporary, self.path)
+
+    def clear(self):
+        self.done = {}
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def import_file(name, stream, fmt, checkpoint, batch_size=BATCH_SIZE):
+    """Загружает файл модели пачками с места контрольной точки.
+
+    Возвращает (загружено строк сейчас, пропущено по контрольной точке).
+    """
+    skip = checkpoint.get(name)
+    done = 0
+    batch = []
+    with keep_dates():
+        for row in read_rows(stream, fmt):
+            done += 1
+            if done <= skip:
+                continue
+            batch.append(row)
+            if len(batch) == batch_size:
+                _import_batch(name, batch, checkpoint, done)
+                batch = []
+        if batch:
+            _import_batch(name, batch, checkpoint, done)
+    return max(done - skip, 0), min(skip, done)
+
+
+def _import_batch(name, batch, checkpoint, done):
+    with transaction.atomic():
+        IMPORTERS[name](batch)
+    checkpoint.save(name, done)
+
+
+def reset_sequences():
+    """Сдвигает последовательности id после вставки с явными id."""
+    statements = connection.ops.sequence_reset_sql(
+        no_style(), [Post, Comment])
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def rebuild_derived():
+    """Счётчики, ленты, поисковый индекс и кеш страниц заново."""
+    reset_sequences()
+    counters.rebuild()
+    timeline.rebuild()
+    search.rebuild()
+    cache.clear()
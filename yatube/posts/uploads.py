@@ -0,0 +1,144 @@
+"""Приём картинок постов.
+
+`ImageUploadHandler` стоит первым в FILE_UPLOAD_HANDLERS и смотрит на
+поток загрузки по кускам, ничего не буферизуя сам: считает байты и по
+первым килобайтам читает заголовок картинки, чтобы узнать её размер без
+декодирования. Слишком большой файл дальше не принимается, а форма
+получает вместо него `RejectedUpload` с причиной отказа.
+
+`sanitize_image` вызывается из PostForm: убирает EXIF (с геометкой
+и данными камеры), поворачивает картинку по ориентации из EXIF и
+уменьшает оригиналы больше POST_IMAGE_MAX_SIDE.
+"""
+import io
+import warnings
+
+from django.conf import settings
+from django.core.files.uploadedfile import InMemoryUploadedFile, UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# Сколько байт начала файла читать в поисках заголовка картинки.
+SNIFF_LIMIT = 256 * 1024
+
+ORIENTATION = 0x0112
+
+SAVE_OPTIONS = {
+    'JPEG': {'quality': 90, 'optimize': True},
+    'PNG': {'optimize': True},
+    'WEBP': {'quality': 90},
+}
+
+
+def too_large_message():
+    megabytes = settings.POST_IMAGE_MAX_BYTES / 1024 / 1024
+    return f'Файл больше {megabytes:g} МБ.'
+
+
+def too_many_pixels_message():
+    return (
+        'Картинка слишком большая: не больше '
+        f'{settings.POST_IMAGE_MAX_PIXELS / 1e6:g} млн точек.'
+    )
+
+
+def sniff_size(header):
+    """Размер картинки по началу файла или None, если заголовок неполон.
+
+    Image.open читает только заголовок; пиксели не декодируются.
+    Картинку больше Image.MAX_IMAGE_PIXELS вдвое Pillow не открывает
+    вовсе и выбрасывает DecompressionBombError.
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+        try:
+            return Image.open(io.BytesIO(header)).size
+        except (UnidentifiedImageError, OSError, SyntaxError):
+            return None
+
+
+class RejectedUpload(UploadedFile):
+    """Пустой файл на месте отклонённой загрузки."""
+
+    def __init__(self, name, content_type, error):
+        super().__init__(io.BytesIO(), name, content_type, 0)
+        self.upload_error = error
+
+
+class ImageUploadHandler(FileUploadHandler):
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.header = b''
+        self.sniffing = True
+        self.error = None
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.error is not None:
+            # Остаток отклонённого файла дочитываем и выбрасываем.
+            return None
+        self.received += len(raw_data)
+        if self.received > settings.POST_IMAGE_MAX_BYTES:
+            self.error = too_large_message()
+            return None
+        if self.sniffing:
+            self._sniff(raw_data)
+        return None if self.error else raw_data
+
+    def _sniff(self, raw_data):
+        self.header += raw_data
+        try:
+            size = sniff_size(self.header)
+        except Image.DecompressionBombError:
+            self.error = too_many_pixels_message()
+            return
+        if size is None and len(self.header) < SNIFF_LIMIT:
+            return
+        # Размер известен или это не картинка — тогда её отвергнет
+        # проверка формы.
+        self.sniffing = False
+        self.header = b''
+        if size and size[0] * size[1] > settings.POST_IMAGE_MAX_PIXELS:
+            self.error = too_many_pixels_message()
+
+    def file_complete(self, file_size):
+        if self.error is None:
+            return None
+        return RejectedUpload(self.file_name, self.content_type, self.error)
+
+
+def sanitize_image(upload):
+    """Картинка без EXIF и не больше POST_IMAGE_MAX_SIDE по стороне.
+
+    Если менять нечего, возвращается исходный файл без перекодирования.
+    """
+    upload.seek(0)
+    image = Image.open(upload)
+    image_format = image.format
+    max_side = settings.POST_IMAGE_MAX_SIDE
+    exif = image.getexif()
+    oversize = max(image.size) > max_side
+    if (
+        getattr(image, 'is_animated', False)
+        or image_format not in SAVE_OPTIONS
+        or not (exif or oversize)
+    ):
+        upload.seek(0)
+        return upload
+    if oversize and image_format == 'JPEG':
+        # JPEG умеет декодироваться сразу в уменьшенном масштабе.
+        image.draft(image.mode, (max_side, max_side))
+    if exif.get(ORIENTATION, 1) != 1:
+        image = ImageOps.exif_transpose(image)
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    # PNG берёт EXIF из image.info, если его не передать явно.
+    image.info.pop('exif', None)
+    options = dict(SAVE_OPTIONS[image_format])
+    if image.info.get('icc_profile'):
+        options['icc_profile'] = image.info['icc_profile']
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, **options)
+    return InMemoryUploadedFile(
+        buffer, getattr(upload, 'field_name', None), upload.name,
+        upload.content_type, buffer.tell(), upload.charset,
+    )
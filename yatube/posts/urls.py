@@ -1,15 +1,37 @@
-from django.urls import path
+from django.urls import include, path
 
-from . import views
+from . import api, live, views
 
 app_name = 'posts'
 
+api_urlpatterns = [
+    path('posts/', api.post_list, name='post_list'),
+    path('posts/<int:post_id>/', api.post_item, name='post'),
+    path('posts/<int:post_id>/comments/', api.comment_list,
+         name='comment_list'),
+    path('groups/<slug:slug>/posts/', api.group_posts, name='group_posts'),
+    path('profiles/<str:username>/', api.profile, name='profile'),
+    path('profiles/<str:username>/posts/', api.profile_posts,
+         name='profile_posts'),
+    path('profiles/<str:username>/follow/', api.profile_follow,
+         name='profile_follow'),
+    path('follow/', api.follow_feed, name='follow_feed'),
+]
+
+live_urlpatterns = [
+    path('', live.feed, name='feed'),
+    path('group/<slug:slug>/', live.group, name='group'),
+    path('follow/', live.follow, name='follow'),
+    path('posts/<int:post_id>/', live.post, name='post'),
+]
+
 urlpatterns = [
     path('', views.index, name='index'),
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
     path('profile/<str:username>/', views.profile, name='profile'),
     path('posts/<post_id>/', views.post_detail, name='post_detail'),
     path('create/', views.create_post, name='create'),
+    path('search/', views.search_posts, name='search'),
     path('posts/<post_id>/edit/', views.post_edit, name='post_edit'),
     path('posts/<int:post_id>/comment/',
          views.add_comment, name='add_comment'),
@@ -24,4 +46,6 @@ urlpatterns = [
         views.profile_unfollow,
         name='profile_unfollow'
     ),
+    path('api/v1/', include((api_urlpatterns, 'api'))),
+    path('live/', include((live_urlpatterns, 'live'))),
 ]
@@ -1,9 +1,182 @@
-from django.core.paginator import Paginator
+import base64
+import binascii
+import json
 
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 
-def paginator(request, post_list):
-    count_page_objects = 10
-    paginator = Paginator(post_list, count_page_objects)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    return page_obj
+COUNT_PAGE_OBJECTS = 10
+COUNT_PAGE_COMMENTS = 20
+
+# Целые в SQL — знаковые 64-битные: больше не бывает ни pk, ни OFFSET.
+MAX_SQL_INTEGER = 2 ** 63 - 1
+
+
+class KeysetPaginator(Paginator):
+    """Паджинатор по ключу (pub_date, pk) вместо LIMIT/OFFSET.
+
+    Следующая страница выбирается условием «строго старше последнего
+    поста текущей страницы», поэтому стоимость запроса не зависит от
+    глубины листания, а запрос COUNT(*) не выполняется вовсе.
+
+    Паджинатор живёт один запрос и отдаёт одну страницу: `count` и
+    `num_pages` описывают только её окрестность (есть ли соседние
+    страницы), чтобы стандартный `Page` работал без подсчёта строк.
+    Ссылки на соседние страницы лежат в `page.next_cursor` и
+    `page.previous_cursor`.
+
+    Строки выбирает `_fetch`: подкласс может собирать страницу не
+    одним запросом к object_list (как posts.timeline.FeedPaginator).
+    """
+
+    date_field = 'pub_date'
+
+    def page_by_cursor(self, cursor):
+        """Возвращает страницу по непрозрачному курсору.
+
+        Битый или пустой курсор означает первую страницу.
+        """
+        position = self.decode_cursor(cursor) if cursor else None
+        if position is None:
+            return self._page_after(None, 1)
+        pub_date, pk, number, reverse = position
+        if reverse:
+            return self._page_before((pub_date, pk), number)
+        return self._page_after((pub_date, pk), number)
+
+    def page_by_number(self, number):
+        """Совместимость со старыми ссылками вида ?page=N.
+
+        Номер страницы превращается в OFFSET без подсчёта количества,
+        а ссылки дальше уже строятся на курсорах. Номер за концом ленты
+        ведёт на последнюю страницу: только тогда строки и считаются.
+        """
+        try:
+            number = max(int(number), 1)
+        except (TypeError, ValueError):
+            number = 1
+        if number * self.per_page + 1 > MAX_SQL_INTEGER:
+            number = self._last_number()
+        rows = self._rows_at(number)
+        if not rows and number > 1:
+            number = self._last_number()
+            rows = self._rows_at(number)
+        return self._build_page(
+            rows[:self.per_page], number,
+            has_next=len(rows) > self.per_page,
+            has_previous=number > 1,
+        )
+
+    def _rows_at(self, number):
+        return self._fetch(
+            descending=True, offset=(number - 1) * self.per_page)
+
+    def _last_number(self):
+        return max(-(-self._total() // self.per_page), 1)
+
+    def _total(self):
+        return self.object_list.count()
+
+    def _fetch(self, descending, key=None, offset=0):
+        """per_page + 1 строк после key (раньше него при descending)."""
+        queryset = self._ordered(descending)
+        if key is not None:
+            queryset = queryset.filter(self._seek(key, older=descending))
+        return list(queryset[offset:offset + self.per_page + 1])
+
+    def _ordered(self, descending):
+        prefix = '-' if descending else ''
+        return self.object_list.order_by(
+            prefix + self.date_field, prefix + 'pk'
+        )
+
+    def _seek(self, key, older, pk_field='pk'):
+        pub_date, pk = key
+        lookup = 'lt' if older else 'gt'
+        return (
+            Q(**{f'{self.date_field}__{lookup}': pub_date})
+            | Q(**{self.date_field: pub_date, f'{pk_field}__{lookup}': pk})
+        )
+
+    def _page_after(self, key, number):
+        rows = self._fetch(descending=True, key=key)
+        return self._build_page(
+            rows[:self.per_page], number,
+            has_next=len(rows) > self.per_page,
+            has_previous=key is not None,
+        )
+
+    def _page_before(self, key, number):
+        rows = self._fetch(descending=False, key=key)
+        has_previous = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        rows.reverse()
+        return self._build_page(
+            rows, number, has_next=True, has_previous=has_previous,
+        )
+
+    def _build_page(self, rows, number, has_next, has_previous):
+        # Номер страницы только для отображения: если со времени
+        # выдачи курсора лента сдвинулась, подгоняем его под факт.
+        if not has_previous:
+            number = 1
+        elif number < 2:
+            number = 2
+        self.__dict__['count'] = (
+            (number - 1) * self.per_page + len(rows) + int(has_next)
+        )
+        self.__dict__['num_pages'] = number + int(has_next)
+        page = Page(rows, number, self)
+        page.next_cursor = (
+            self.encode_cursor(rows[-1], number + 1, reverse=False)
+            if has_next and rows else None
+        )
+        page.previous_cursor = (
+            self.encode_cursor(rows[0], number - 1, reverse=True)
+            if has_previous and rows else None
+        )
+        return page
+
+    def encode_cursor(self, obj, number, reverse):
+        payload = {
+            'd': getattr(obj, self.date_field).isoformat(),
+            'i': obj.pk,
+            'n': number,
+        }
+        if reverse:
+            payload['r'] = 1
+        raw = json.dumps(payload, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        padding = '=' * (-len(cursor) % 4)
+        try:
+            raw = base64.urlsafe_b64decode(cursor + padding)
+            payload = json.loads(raw)
+            pub_date = parse_datetime(payload['d'])
+            pk = int(payload['i'])
+            number = int(payload.get('n', 1))
+        except (binascii.Error, ValueError, KeyError, TypeError,
+                OverflowError):
+            return None
+        # Курсор приходит от клиента: pk вне диапазона целых SQL или
+        # дата без часового пояса до базы дойти не должны.
+        if not 0 < pk <= MAX_SQL_INTEGER:
+            return None
+        if pub_date is None or timezone.is_naive(pub_date):
+            return None
+        return pub_date, pk, number, bool(payload.get('r'))
+
+
+def paginator(request, post_list, per_page=COUNT_PAGE_OBJECTS,
+              cursor_param='cursor', page_param='page',
+              paginator_class=KeysetPaginator):
+    paginator = paginator_class(post_list, per_page)
+    cursor = request.GET.get(cursor_param)
+    page_number = request.GET.get(page_param)
+    if page_number and not cursor:
+        return paginator.page_by_number(page_number)
+    return paginator.page_by_cursor(cursor)
@@ -0,0 +1,159 @@
+"""Картинки постов в нескольких ширинах и форматах.
+
+Для каждой картинки строится набор вариантов с пропорциями миниатюры
+960x339: ширины WIDTHS в каждом формате, который умеет сохранять
+установленный Pillow (AVIF и WebP — если собраны, JPEG — всегда).
+Описание вариантов (манифест) хранится в Post.image_variants. Тег
+`post_sources` отдаёт по нему srcset каждого формата, шаблон
+includes/post_image.html выводит из них <picture>, и браузер сам
+выбирает наименьший подходящий файл.
+"""
+import io
+import json
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+WIDTHS = (320, 480, 640, 800, 960)
+ASPECT = (960, 339)
+DIRECTORY = 'posts/variants'
+
+# (ключ манифеста, формат Pillow, MIME-тип, расширение, параметры
+# сохранения) в порядке предпочтения браузером.
+FORMATS = (
+    ('avif', 'AVIF', 'image/avif', 'avif', {'quality': 60}),
+    ('webp', 'WEBP', 'image/webp', 'webp', {'quality': 75, 'method': 6}),
+    ('jpeg', 'JPEG', 'image/jpeg', 'jpg',
+     {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+
+
+def supported_formats():
+    """Форматы, которые может сохранить установленный Pillow."""
+    Image.init()
+    return [fmt for fmt in FORMATS if fmt[1] in Image.SAVE]
+
+
+def _height(width):
+    return round(width * ASPECT[1] / ASPECT[0])
+
+
+def _widths(source_width):
+    # Увеличивать картинку нет смысла: браузер растянет её сам.
+    widths = [width for width in WIDTHS if width <= source_width]
+    return widths or [WIDTHS[0]]
+
+
+def variant_name(image_name, width, extension):
+    # Картинки хранятся под хешем содержимого (posts.storage), поэтому
+    # имя варианта однозначно и общее для всех постов с этой картинкой.
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    return f'{DIRECTORY}/{stem}_{width}.{extension}'
+
+
+def names_for(image_name):
+    """Все возможные имена вариантов картинки."""
+    return [
+        variant_name(image_name, width, fmt[3])
+        for fmt in FORMATS for width in WIDTHS
+    ]
+
+
+def names_in(manifest):
+    return [
+        name
+        for sources in (manifest or {}).get('sources', {}).values()
+        for _, name, _ in sources
+    ]
+
+
+def _crop(image):
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    size = ASPECT if image.width >= ASPECT[0] else (
+        image.width, _height(image.width))
+    return ImageOps.fit(image, size, Image.LANCZOS)
+
+
+def build(image_name, storage=default_storage):
+    """Строит недостающие варианты картинки и возвращает манифест.
+
+    Уже построенные для этой картинки варианты (например, у дубликата)
+    переиспользуются без декодирования.
+    """
+    manifest = {'width': ASPECT[0], 'height': ASPECT[1], 'sources': {}}
+    with storage.open(image_name) as source:
+        image = ImageOps.exif_transpose(Image.open(source))
+        cropped = None
+        for key, pil_format, _, extension, params in supported_formats():
+            sources = []
+            for width in _widths(min(image.width, ASPECT[0])):
+                name = variant_name(image_name, width, extension)
+                if storage.exists(name):
+                    sources.append([width, name, storage.size(name)])
+                    continue
+                if cropped is None:
+                    cropped = _crop(image)
+                resized = cropped.resize(
+                    (width, _height(width)), Image.LANCZOS)
+                buffer = io.BytesIO()
+                resized.save(buffer, pil_format, **params)
+                content = buffer.getvalue()
+                name = storage.save(name, ContentFile(content))
+                sources.append([width, name, len(content)])
+            manifest['sources'][key] = sources
+    return manifest
+
+
+def dumps(manifest):
+    return json.dumps(manifest, separators=(',', ':')) if manifest else ''
+
+
+def loads(raw):
+    # Испорченный манифест равносилен отсутствию вариантов.
+    try:
+        manifest = json.loads(raw) if raw else None
+    except ValueError:
+        return None
+    return manifest if isinstance(manifest, dict) else None
+
+
+def delete_for(image_name, storage=default_storage):
+    """Удаляет все варианты картинки."""
+    for name in names_for(image_name):
+        storage.delete(name)
+
+
+def srcsets(manifest, storage=default_storage):
+    """[(MIME-тип, srcset), ...] в порядке предпочтения форматов."""
+    if not manifest:
+        return []
+    result = []
+    for key, _, mime, _, _ in FORMATS:
+        sources = manifest['sources'].get(key)
+        if sources:
+            result.append((mime, ', '.join(
+                f'{storage.url(name)} {width}w'
+                for width, name, _ in sources
+            )))
+    return result
+
+
+def pick(manifest, css_width, dpr=1.0, accept=('image/jpeg',)):
+    """Вариант, который выберет браузер: (ширина, имя, байты).
+
+    Первый формат из манифеста, который понимает клиент, и наименьшая
+    ширина не меньше css_width * dpr (или наибольшая из имеющихся).
+    """
+    needed = css_width * dpr
+    for key, _, mime, _, _ in FORMATS:
+        sources = manifest['sources'].get(key)
+        if not sources or mime not in accept:
+            continue
+        for source in sources:
+            if source[0] >= needed:
+                return tuple(source)
+        return tuple(sources[-1])
+    return None
@@ -1,18 +1,36 @@
+from functools import partial
+
+from core.concurrency import gather
+from core.query_budget import query_budget
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
+from django.core.paginator import Paginator
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
-from django.views.decorators.cache import cache_page
 
+from . import counters, follows, search, timeline
+from .cache import (FEED, author_version, conditional_versioned,
+                    group_version, post_versions)
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post
-from .utils import paginator
+from .models import Comment, Counter, Group, Post
+from .personal import shared_page
+from .utils import COUNT_PAGE_COMMENTS, COUNT_PAGE_OBJECTS, paginator
+
 
+def conditional_page(versions):
+    """ETag и Cache-Control страницы: шапка своя у каждого пользователя."""
+    return conditional_versioned(
+        versions, personal=True,
+        shared_max_age=settings.PAGE_SHARED_MAX_AGE)
 
-@cache_page(20)
+
+@query_budget(4)
+@conditional_page(lambda request: [FEED])
+@shared_page(lambda request: [FEED], stale_while_revalidate=True)
 def index(request):
     template = 'posts/index.html'
-    post_list = Post.objects.all()
+    post_list = Post.objects.select_related('author', 'group')
     page_obj = paginator(request, post_list)
     context = {
         'page_obj': page_obj,
@@ -20,85 +38,112 @@ def index(request):
     return render(request, template, context)
 
 
+@query_budget(5)
+@conditional_page(lambda request, slug: [group_version(slug)])
+@shared_page(lambda request, slug: [group_version(slug)])
 def group_posts(request, slug):
     template = 'posts/group_list.html'
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    post_list = group.posts.all()
+    post_list = group.posts.select_related('author', 'group')
     page_obj = paginator(request, post_list)
     context = {
-        'posts': posts,
         'group': group,
         'page_obj': page_obj,
     }
     return render(request, template, context)
 
 
+@query_budget(7)
+@conditional_page(lambda request, username: [author_version(username)])
+@shared_page(lambda request, username: [author_version(username)])
 def profile(request, username):
     template = 'posts/profile.html'
     author = get_object_or_404(User, username=username)
-    posts_of_author = Post.objects.select_related('author')
-    # posts_of_author = Post.objects.filter(author=author)
-    page_obj = paginator(request, posts_of_author)
-    count_posts_of_author = len(posts_of_author)
-    if request.user.is_authenticated:
-        following = Follow.objects.filter(
-            user=request.user, author=author
-        ).exists()
-    else:
-        following = False
+    post_list = author.posts.select_related('author', 'group')
+    page_obj, counts = gather(
+        lambda: paginator(request, post_list),
+        lambda: counters.get_many([
+            (Counter.AUTHOR_POSTS, author.pk),
+            (Counter.FOLLOWERS, author.pk),
+            (Counter.FOLLOWING, author.pk),
+        ]),
+    )
     context = {
-        'posts': posts_of_author,
-        'count': count_posts_of_author,
+        'count': counts[Counter.AUTHOR_POSTS, author.pk],
+        'followers_count': counts[Counter.FOLLOWERS, author.pk],
+        'following_count': counts[Counter.FOLLOWING, author.pk],
         'author': author,
         'page_obj': page_obj,
-        'following': following,
     }
     return render(request, template, context)
 
 
-@cache_page(10 * 2)
+@query_budget(6)
+@conditional_page(lambda request, post_id: post_versions(post_id))
+@shared_page(lambda request, post_id: post_versions(post_id))
 def post_detail(request, post_id):
-    template = 'posts/post_detail.html'
-    posts = Post.objects.filter(pk=post_id)
-    post = get_object_or_404(Post, id=post_id)
-    comments = post.comments.filter(post=post_id)
-    post_author = Post.objects.get(pk=post_id)
-    count = post_author.author.posts.count()
     if request.method == 'POST':
-        add_comment(request, post_id)
-    else:
-        form = CommentForm()
+        return add_comment(request, post_id)
+    template = 'posts/post_detail.html'
+    # Комментарии выбираются по post_id, не дожидаясь самого поста.
+    post, comments = gather(
+        lambda: get_object_or_404(
+            Post.objects.select_related('author', 'group'), pk=post_id),
+        lambda: paginator(
+            request,
+            Comment.objects.filter(post_id=post_id).select_related('author'),
+            per_page=COUNT_PAGE_COMMENTS,
+            cursor_param='comments',
+            page_param='comments_page',
+        ),
+    )
     context = {
-        'posts': posts,
-        'count': count,
+        # Список из одного поста оставлен для совместимости контекста.
+        'posts': [post],
+        'count': counters.get_count(Counter.AUTHOR_POSTS, post.author_id),
         'post': post,
-        'form': form,
+        'form': CommentForm(),
         'comments': comments,
     }
+    return render(request, template, context)
+
 
+@query_budget(5)
+def search_posts(request):
+    template = 'posts/search.html'
+    query = request.GET.get('q', '').strip()
+    # Результатов не больше SEARCH_RESULTS, поэтому обычные страницы
+    # по номеру; из базы читаются только посты текущей страницы.
+    page_obj = Paginator(
+        search.search(query) if query else [], COUNT_PAGE_OBJECTS
+    ).get_page(request.GET.get('page'))
+    posts = Post.objects.select_related('author', 'group').in_bulk(
+        page_obj.object_list)
+    page_obj.object_list = [
+        posts[post_id] for post_id in page_obj.object_list
+        if post_id in posts
+    ]
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+    }
     return render(request, template, context)
 
 
 @login_required
 def create_post(request):
     template = 'posts/create_post.html'
-    form = PostForm()
-    context = {
-        'form': form,
-    }
-    if request.method != "POST":
-        return render(request, template, context)
     form = PostForm(request.POST or None,
                     files=request.FILES or None
                     )
-    if form.is_valid() is False or None:
-        return render(request, template, context)
-    if form.is_valid():
-        post = form.save(commit=False)
-        post.author = request.user
-        post.save()
-        return redirect('posts:profile', request.user)
+    # Ошибки формы (в том числе отклонённой картинки) показываем
+    # на той же странице.
+    if request.method != "POST" or not form.is_valid():
+        return render(request, template, {'form': form})
+    post = form.save(commit=False)
+    post.author = request.user
+    post.save()
+    return redirect('posts:profile', request.user)
 
 
 @login_required
@@ -137,11 +182,17 @@ def add_comment(request, post_id):
     return redirect('posts:post_detail', post_id=post_id)
 
 
+# Подписки на знаменитостей, ключи страницы из всех источников и посты —
+# три запроса (timeline.FeedPaginator) при любом числе знаменитостей.
+@query_budget(5)
 @login_required
+@conditional_page(
+    lambda request: [FEED, author_version(request.user.username)])
 def follow_index(request):
-    posts_follow_authors = Post.objects.filter(
-        author__following__user=request.user)
-    page_obj = paginator(request, posts_follow_authors)
+    page_obj = paginator(
+        request, Post.objects.select_related('author', 'group'),
+        paginator_class=partial(timeline.FeedPaginator, user=request.user),
+    )
     context = {
         'page_obj': page_obj,
     }
@@ -152,9 +203,8 @@ def follow_index(request):
 def profile_follow(request, username):
     user = request.user
     author = get_object_or_404(User, username=username)
-    is_follower = Follow.objects.filter(user=user, author=author)
-    if user != author and not is_follower.exists():
-        Follow.objects.create(user=user, author=author)
+    # Повторная и параллельная подписки ничего не меняют (posts.follows).
+    follows.follow(user.pk, author.pk)
     return redirect(reverse('posts:profile', args=[username]))
 
 
@@ -162,5 +212,5 @@ def profile_follow(request, username):
 def profile_unfollow(request, username):
     user = request.user
     author = get_object_or_404(User, username=username)
-    Follow.objects.filter(user=user, author=author).delete()
+    follows.unfollow(user.pk, author.pk)
     return redirect('posts:profile', username=user)
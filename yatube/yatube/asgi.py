@@ -0,0 +1,23 @@
+"""
+ASGI config for yatube project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+
+Django 2.2 has no ASGI support of its own: requests are handed to the
+regular WSGI application in a thread pool (core.asgi.WsgiToAsgi).
+Run with any ASGI server, e.g. ``uvicorn yatube.asgi:application``.
+Live updates (posts.live) are enabled here: streams wait for events in
+the event loop instead of holding a worker thread.
+"""
+
+import os
+
+from core.asgi import WsgiToAsgi
+from django.conf import settings
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+os.environ.setdefault('YATUBE_LIVE_UPDATES', '1')
+
+application = WsgiToAsgi(
+    get_wsgi_application(), max_workers=settings.ASGI_THREADS)
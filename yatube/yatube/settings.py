@@ -11,10 +11,15 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import sys
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
+# Запуск под manage.py test или pytest.
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/2.2/howto/deployment/checklist/
@@ -52,6 +57,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.QueryCountMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -65,6 +71,9 @@ INTERNAL_IPS = [
     '127.0.0.1',
 ]
 
+# Отдавать число SQL-запросов и их время в заголовках X-DB-*.
+QUERY_COUNT_HEADERS = DEBUG
+
 ROOT_URLCONF = 'yatube.urls'
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
@@ -86,6 +95,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'core.context_processors.year.year',
+                'core.context_processors.live.live',
             ],
         },
     },
@@ -93,6 +103,37 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
+# Сколько view одновременно выполняет ASGI-приложение (yatube.asgi).
+ASGI_THREADS = 32
+
+# Брокер событий живых лент (posts.live). MemoryBroker видит события
+# только своего процесса; нескольким воркерам на одной машине нужен
+# общий core.pubsub.SQLiteBroker с LOCATION — путём к файлу, в
+# продакшене — Redis.
+LIVE_BROKER = {
+    'BACKEND': 'core.pubsub.MemoryBroker',
+    'OPTIONS': {
+        'BACKLOG': 1000,
+    },
+}
+
+# Поток живой ленты держит соединение LIVE_TIMEOUT секунд, под WSGI —
+# вместе с потоком сервера на каждую открытую вкладку. Поэтому живые
+# ленты включает yatube.asgi, а под WSGI — только явная переменная
+# окружения YATUBE_LIVE_UPDATES=1. Воркеры с общим кешем страниц должны
+# настраиваться одинаково: от настройки зависит разметка страниц.
+LIVE_UPDATES = os.environ.get('YATUBE_LIVE_UPDATES') == '1'
+
+# Пинг живой ленты при отсутствии событий и время жизни потока, сек.
+LIVE_HEARTBEAT = 15
+LIVE_TIMEOUT = 60 * 5
+
+# Потоки для параллельной загрузки независимых частей страницы
+# (core.concurrency.gather); 0 — загружать по очереди. Окупается с
+# сетевой базой: запросы к локальной SQLite быстрее передачи в поток
+# (manage.py bench_concurrency).
+CONCURRENT_LOADERS = 0
+
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
@@ -104,11 +145,61 @@ DATABASES = {
     }
 }
 
+# Общий для всех воркеров кеш (core.cache.SQLiteCache) и LRU процесса
+# перед ним. Локально держатся только неизменяемые ключи: страницы и
+# фрагменты, в ключ которых входят поколения. В продакшене алиас
+# 'shared' заменяется на memcached или Redis. Файл общего кеша задаёт
+# переменная окружения YATUBE_CACHE_PATH: у каждого развёртывания он
+# свой. Тесты очищают кеш, поэтому у них кеш в памяти своего процесса.
 CACHES = {
     'default': {
+        'BACKEND': 'core.cache.TwoLevelCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'LOCAL_PREFIXES': ['page:', 'anonymous:', 'post_fragment:',
+                               'personal:'],
+            'LOCAL_MAX_ENTRIES': 1000,
+            'LOCAL_TIMEOUT': 60 * 5,
+        },
+    },
+    'shared': {
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.environ.get(
+            'YATUBE_CACHE_PATH',
+            os.path.join(tempfile.gettempdir(), 'yatube.cache'),
+        ),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+if TESTING:
+    CACHES['shared'] = {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'yatube-tests',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
     }
-}
+
+# Страницы инвалидируются сигналами моделей (posts.cache), так что срок
+# жизни кеша страниц ограничивает только расход памяти.
+PAGE_CACHE_TIMEOUT = 60 * 60
+
+# Сколько секунд прокси может отдавать анонимную страницу без сверки
+# с сервером (s-maxage). Браузеры сверяются по ETag при каждом заходе.
+PAGE_SHARED_MAX_AGE = 60
+
+# HTML карточки поста (posts.templatetags.post_fragments). Ключ меняется
+# при правке поста, поэтому срок жизни нужен только для вытеснения.
+FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Лента подписок: длина материализованной ленты, запас перед обрезкой
+# и число подписчиков, после которого посты автора не раскладываются
+# по лентам, а подмешиваются при чтении.
+TIMELINE_LENGTH = 500
+TIMELINE_TRIM_SLACK = 50
+TIMELINE_FANOUT_LIMIT = 1000
 
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 
@@ -168,6 +259,34 @@ LOGGING = {
         'django.db.backends': {
             'level': 'DEBUG',
             'handlers': ['console'],
-        }
+        },
+        'core.queries': {
+            'level': 'INFO',
+            'handlers': ['console'],
+        },
     },
 }
+
+# Загрузка картинок постов (posts.uploads): предел размера файла и
+# числа точек, проверяемые по ходу загрузки, и наибольшая сторона
+# сохраняемого оригинала. Файлы больше FILE_UPLOAD_MAX_MEMORY_SIZE
+# пишутся во временный файл по кускам.
+POST_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 40 * 1000 * 1000
+POST_IMAGE_MAX_SIDE = 2560
+FILE_UPLOAD_HANDLERS = [
+    'posts.uploads.ImageUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+# Миниатюры картинок постов строятся в пуле процессов (posts.thumbnails).
+# В тестах — синхронно: дочерние процессы не видят тестовую базу.
+THUMBNAIL_WORKERS = 0 if TESTING else 2
+
+# Полнотекстовый поиск (posts.search): 'auto' выбирает FTS5, если он
+# есть в SQLite, иначе обратный индекс на таблицах ('python'). Бонус
+# свежести убывает вдвое каждые SEARCH_HALF_LIFE_DAYS дней.
+SEARCH_BACKEND = 'auto'
+SEARCH_HALF_LIFE_DAYS = 30
+SEARCH_RESULTS = 50